@@ -1,5 +1,6 @@
 """Configuration settings for the exchange rate application."""
 
+import os
 from pathlib import Path
 from typing import Dict, Any
 
@@ -10,6 +11,16 @@ RATES_DIR = PROJECT_ROOT / "rates" / "data"
 CACHE_FILE = DATA_DIR / "rates_cache.json"
 SAMPLE_CACHE = DATA_DIR / "sample_cache.json"
 LOG_FILE = RATES_DIR / "update.log"
+# the --daemon process keeps its own log so one-shot runs never share its open file
+DAEMON_LOG_FILE = RATES_DIR / "update-daemon.log"
+HOLIDAYS_FILE = DATA_DIR / "holidays.json"
+
+# Rate alerts (see rates.alerts): rules file, JSON-lines alert log, debounce state
+ALERTS_FILE = DATA_DIR / "alerts.json"
+ALERT_LOG_FILE = DATA_DIR / "alerts.log"
+ALERT_STATE_FILE = DATA_DIR / "alerts_state.json"
+# optional: POST each alert to this URL (e.g. a local relay for LINE / mail)
+ALERT_WEBHOOK_URL = os.environ.get("RATES_ALERT_WEBHOOK_URL")
 
 # Application settings
 APP_CONFIG = {
@@ -21,6 +32,20 @@ APP_CONFIG = {
     "default_decimals": 0,
 }
 
+# Business-calendar refresh schedule per cache segment (see rates.trading_calendar).
+# Boards only move during banking hours, so refreshes run on business days only:
+# every session_interval seconds inside the session, plus once at the close.
+# Holidays are read from HOLIDAYS_FILE: {"holidays": ["2026-01-01", ...]}
+SCHEDULE_CONFIG = {
+    "session": ("09:00", "16:00"),
+    "jobs": {
+        "fx": {"session_interval": 600, "at_close": True},
+        "banks_usd": {"session_interval": 600, "at_close": True},
+        "gold": {"session_interval": 600, "at_close": True},
+        "usd_deposit": {"session_interval": None, "at_open": True, "at_close": False},
+    },
+}
+
 # Streamlit server settings
 SERVER_CONFIG = {
     "port": 8501,
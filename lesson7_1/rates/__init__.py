@@ -3,9 +3,13 @@
 
 from .crawler import fetch_rates
 from .normalize import normalize_rates
-from .storage import read_cache, write_cache, is_expired
+from .storage import read_cache, write_cache, is_expired, read_segment, write_segment, is_segment_expired
 from .scheduler import Scheduler
+from .async_scheduler import AsyncScheduler
+from .trading_calendar import TradingCalendar, CalendarRule
 from .usd_deposit import fetch_usd_deposit_rates
+from .sources import refresh_segment
+from .cache import TieredCache
 
 __all__ = [
     "fetch_rates",
@@ -13,6 +17,14 @@ __all__ = [
     "read_cache",
     "write_cache",
     "is_expired",
+    "read_segment",
+    "write_segment",
+    "is_segment_expired",
+    "refresh_segment",
+    "TieredCache",
     "Scheduler",
+    "AsyncScheduler",
+    "TradingCalendar",
+    "CalendarRule",
     "fetch_usd_deposit_rates",
 ]
@@ -0,0 +1,428 @@
+"""Incremental rate alerts evaluated on every segment commit.
+
+Rules look like ``"USD sell < 31.2"`` or ``"GOLD spread > 60"``. Each
+(key, field, operator) keeps its thresholds sorted, so a tick only visits
+the rules whose threshold lies between the old and the new value — a
+bisect per changed number instead of a scan over every rule::
+
+    engine = AlertEngine([FileNotifier("data/alerts.log")], state_path="data/alerts_state.json")
+    engine.add_rule(AlertRule.parse("USD sell < 31.2", debounce_seconds=600))
+    engine.catch_up()  # evaluate every commit appended to the event log since the last call
+
+The engine reads the change-event log (see ``rates.events``) rather than
+hooking the writes of one process, so commits by any writer (the updater,
+a Streamlit background refresh, a restore) are evaluated exactly once:
+the log offset it stopped at is persisted in ``state_path`` and advanced
+under a file lock. If that offset has been compacted out of the log, the
+checkpoint served in its place only reseeds the last-known values; it never
+fires a rule.
+
+Alerts are edge-triggered: a rule fires when the value crosses into the
+condition, not on every refresh while it stays there. ``debounce_seconds``
+additionally suppresses re-fires of a rule that flaps around its threshold.
+
+Keys: board currencies by ISO code (``USD``, ``JPY``), ``GOLD``, and
+per-bank USD quotes as ``USD@<bank>``. Fields: ``buy``, ``sell`` and the
+derived ``spread`` (sell - buy).
+"""
+
+import bisect
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .events import Event, Key, flatten_segment
+from .locking import FileLock
+from .storage import CORE_SEGMENTS, events_offset, read_events, read_segment
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = ("<", "<=", ">", ">=")
+FIELDS = ("buy", "sell", "spread")
+
+
+class AlertRule:
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        key: str,
+        field: str,
+        op: str,
+        threshold: float,
+        debounce_seconds: float = 0.0,
+        rule_id: Optional[str] = None,
+        message: Optional[str] = None,
+    ):
+        if op not in OPERATORS:
+            raise ValueError(f"unknown operator: {op}")
+        if field not in FIELDS:
+            raise ValueError(f"unknown field: {field}")
+        self.key = key
+        self.field = field
+        self.op = op
+        self.threshold = float(threshold)
+        self.debounce_seconds = float(debounce_seconds)
+        self.rule_id = rule_id or f"rule-{next(self._ids)}"
+        self.message = message
+        self.last_fired: Optional[float] = None
+
+    @classmethod
+    def parse(cls, text: str, **kwargs) -> "AlertRule":
+        """``"USD sell < 31.2"`` -> AlertRule."""
+        parts = text.split()
+        if len(parts) != 4:
+            raise ValueError(f"expected '<key> <field> <op> <threshold>', got {text!r}")
+        key, field, op, threshold = parts
+        return cls(key, field, op, float(threshold), **kwargs)
+
+    def matches(self, value: float) -> bool:
+        if self.op == "<":
+            return value < self.threshold
+        if self.op == "<=":
+            return value <= self.threshold
+        if self.op == ">":
+            return value > self.threshold
+        return value >= self.threshold
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.rule_id,
+            "rule": f"{self.key} {self.field} {self.op} {self.threshold:g}",
+            "debounce_seconds": self.debounce_seconds,
+            "message": self.message,
+        }
+
+    def __repr__(self) -> str:
+        return f"AlertRule({self.rule_id!r}: {self.key} {self.field} {self.op} {self.threshold:g})"
+
+
+class _ThresholdIndex:
+    """Rules for one (key, field, op), sorted by threshold."""
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.rules: List[AlertRule] = []
+
+    def add(self, rule: AlertRule) -> None:
+        i = bisect.bisect_right(self.thresholds, rule.threshold)
+        self.thresholds.insert(i, rule.threshold)
+        self.rules.insert(i, rule)
+
+    def remove(self, rule: AlertRule) -> None:
+        i = bisect.bisect_left(self.thresholds, rule.threshold)
+        while i < len(self.rules) and self.rules[i] is not rule:
+            i += 1
+        if i < len(self.rules):
+            del self.thresholds[i]
+            del self.rules[i]
+
+    def crossed(self, op: str, old: Optional[float], new: float) -> List[AlertRule]:
+        """Rules whose condition is false for ``old`` and true for ``new``.
+
+        With no previous value every rule that ``new`` satisfies counts.
+        """
+        t = self.thresholds
+        if op == "<":      # new < x <= old
+            lo = bisect.bisect_right(t, new)
+            hi = len(t) if old is None else bisect.bisect_right(t, old)
+        elif op == "<=":   # new <= x < old
+            lo = bisect.bisect_left(t, new)
+            hi = len(t) if old is None else bisect.bisect_left(t, old)
+        elif op == ">":    # old <= x < new
+            lo = 0 if old is None else bisect.bisect_left(t, old)
+            hi = bisect.bisect_left(t, new)
+        else:              # old < x <= new
+            lo = 0 if old is None else bisect.bisect_right(t, old)
+            hi = bisect.bisect_right(t, new)
+        return self.rules[lo:hi] if lo < hi else []
+
+
+class AlertEngine:
+    def __init__(
+        self,
+        notifiers: Iterable[Callable[[Dict[str, Any]], None]] = (),
+        clock: Callable[[], float] = time.time,
+        state_path: Optional[str] = None,
+    ):
+        self.notifiers = list(notifiers)
+        self.clock = clock
+        # persisted so debouncing and the event-log position survive one-shot updater runs:
+        # last fire time per rule id, log offset, last buy/sell per key (for spreads)
+        self.state_path = state_path
+        self._last_fired: Dict[str, float] = {}
+        self.offset: Optional[int] = None
+        self._values: Dict[str, Dict[str, float]] = {}
+        self._load_state()
+        self._lock = threading.Lock()
+        self._rules: Dict[str, AlertRule] = {}
+        self._index: Dict[Tuple[str, str, str], _ThresholdIndex] = {}
+        self.stats = {"ticks": 0, "values_changed": 0, "rules_visited": 0, "fired": 0, "debounced": 0}
+
+    def _load_state(self) -> None:
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if "last_fired" not in state:
+                state = {"last_fired": state}  # older files held only the fire times
+            self._last_fired = {k: float(v) for k, v in state["last_fired"].items()}
+            self.offset = state.get("offset")
+            self._values = state.get("values") or {}
+        except (OSError, ValueError, AttributeError, TypeError):
+            pass
+
+    def _save_state(self) -> None:
+        fired = dict(self._last_fired)
+        fired.update({rule_id: rule.last_fired for rule_id, rule in self._rules.items() if rule.last_fired is not None})
+        state = {"last_fired": fired, "offset": self.offset, "values": self._values}
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    # -- rules -------------------------------------------------------------
+
+    def add_rule(self, rule: AlertRule) -> AlertRule:
+        with self._lock:
+            old = self._rules.pop(rule.rule_id, None)
+            if old is not None:
+                self._index[(old.key, old.field, old.op)].remove(old)
+            if rule.last_fired is None:
+                rule.last_fired = self._last_fired.get(rule.rule_id)
+            self._rules[rule.rule_id] = rule
+            self._index.setdefault((rule.key, rule.field, rule.op), _ThresholdIndex()).add(rule)
+        return rule
+
+    def remove_rule(self, rule_id: str) -> bool:
+        with self._lock:
+            rule = self._rules.pop(rule_id, None)
+            if rule is None:
+                return False
+            self._index[(rule.key, rule.field, rule.op)].remove(rule)
+            return True
+
+    def rules(self) -> List[AlertRule]:
+        with self._lock:
+            return list(self._rules.values())
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "AlertEngine":
+        """Build an engine from a JSON rule file; a missing file yields no rules.
+
+        Format::
+
+            [{"id": "usd-cheap", "rule": "USD sell < 31.2", "debounce_seconds": 600}]
+        """
+        engine = cls(**kwargs)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return engine
+        for entry in entries:
+            engine.add_rule(AlertRule.parse(
+                entry["rule"],
+                debounce_seconds=entry.get("debounce_seconds", 0),
+                rule_id=entry.get("id"),
+                message=entry.get("message"),
+            ))
+        return engine
+
+    # -- evaluation --------------------------------------------------------
+
+    def evaluate(
+        self,
+        old: Dict[Key, float],
+        new: Dict[Key, float],
+        source_time: Optional[str] = None,
+        save: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Fire rules crossed between two flattened snapshots; returns the alerts sent."""
+        fired = []
+        now = self.clock()
+        with self._lock:
+            self.stats["ticks"] += 1
+            for (key, field), value in new.items():
+                previous = old.get((key, field))
+                if previous == value:
+                    continue
+                self.stats["values_changed"] += 1
+                for op in OPERATORS:
+                    index = self._index.get((key, field, op))
+                    if index is None:
+                        continue
+                    for rule in index.crossed(op, previous, value):
+                        self.stats["rules_visited"] += 1
+                        if rule.last_fired is not None and now - rule.last_fired < rule.debounce_seconds:
+                            self.stats["debounced"] += 1
+                            continue
+                        rule.last_fired = now
+                        fired.append(self._alert(rule, previous, value, source_time, now))
+            self.stats["fired"] += len(fired)
+            if fired and save and self.state_path:
+                self._save_state()
+        for alert in fired:
+            self._notify(alert)
+        return fired
+
+    # -- event log ---------------------------------------------------------
+
+    def catch_up(self, batch_size: int = 5000) -> List[Dict[str, Any]]:
+        """Evaluate the commits appended to the event log since the last call.
+
+        Without saved state the engine starts at the end of the log (no
+        alerts for old history) and takes the current values from the
+        segments. Returns the alerts sent.
+        """
+        if not self.state_path:
+            return self._catch_up(batch_size)
+        with FileLock(f"{self.state_path}.lock"):
+            # another process may have advanced the offset (and fired rules) since we loaded
+            self._load_state()
+            with self._lock:
+                for rule in self._rules.values():
+                    fired = self._last_fired.get(rule.rule_id)
+                    if fired is not None and (rule.last_fired is None or fired > rule.last_fired):
+                        rule.last_fired = fired
+            alerts = self._catch_up(batch_size)
+            self._save_state()
+            return alerts
+
+    def _catch_up(self, batch_size: int) -> List[Dict[str, Any]]:
+        end = events_offset()
+        if self.offset is None or end < self.offset:
+            # first run, or the log was replaced: start from the current data
+            self.offset = end
+            self._values = {}
+            for name in CORE_SEGMENTS:
+                envelope = read_segment(name) or {}
+                for (key, field), value in flatten_segment(name, envelope.get("data"), derived=False).items():
+                    self._values.setdefault(key, {})[field] = value
+            return []
+        alerts: List[Dict[str, Any]] = []
+        while self.offset < end:
+            events, offset = read_events(self.offset, limit=batch_size)
+            if not events:
+                break
+            if events[0].get("checkpoint"):
+                # our offset was compacted away: the commits in between are gone, so the
+                # checkpoint only tells us the values in force where the log now starts
+                logger.warning("alert engine fell behind the event log (offset %s); reseeding", self.offset)
+                self._seed([e for e in events if e.get("checkpoint")])
+                events = [e for e in events if not e.get("checkpoint")]
+            for _, commit in groupby(events, key=lambda e: (e.get("segment"), e.get("version"))):
+                alerts.extend(self._evaluate_commit(list(commit)))
+            self.offset = offset
+        return alerts
+
+    def _seed(self, events: List[Event]) -> None:
+        """Take last-known values from checkpoint events without evaluating any rule."""
+        for event in events:
+            key, field = event.get("currency") or "", event.get("field")
+            if field not in ("buy", "sell"):
+                continue
+            values = self._values.setdefault(key, {})
+            if event.get("new") is None:
+                values.pop(field, None)
+            else:
+                values[field] = float(event["new"])
+
+    def _evaluate_commit(self, events: List[Event]) -> List[Dict[str, Any]]:
+        """One commit's events -> old/new values (with derived spreads) for the keys it touched."""
+        old: Dict[Key, float] = {}
+        new: Dict[Key, float] = {}
+        touched = set()
+        for event in events:
+            key, field = event.get("currency") or "", event.get("field")
+            if field not in ("buy", "sell"):
+                continue
+            touched.add(key)
+            values = self._values.setdefault(key, {})
+            if event.get("old") is not None:
+                old[(key, field)] = float(event["old"])
+            if event.get("new") is None:
+                values.pop(field, None)
+            else:
+                values[field] = new[(key, field)] = float(event["new"])
+        for key in touched:
+            values = self._values.get(key, {})
+            for side in ("buy", "sell"):
+                # the side that did not change keeps its value on both sides of the commit
+                if side in values and (key, side) not in new:
+                    old.setdefault((key, side), values[side])
+                    new[(key, side)] = values[side]
+            if (key, "buy") in old and (key, "sell") in old:
+                old[(key, "spread")] = round(old[(key, "sell")] - old[(key, "buy")], 6)
+            if (key, "buy") in new and (key, "sell") in new:
+                new[(key, "spread")] = round(new[(key, "sell")] - new[(key, "buy")], 6)
+        if not new:
+            return []
+        return self.evaluate(old, new, events[0].get("source_time"), save=False)
+
+    def _alert(self, rule: AlertRule, old: Optional[float], new: float, source_time: Optional[str], now: float) -> Dict[str, Any]:
+        return {
+            "rule_id": rule.rule_id,
+            "rule": rule.to_dict()["rule"],
+            "message": rule.message,
+            "key": rule.key,
+            "field": rule.field,
+            "old": old,
+            "new": new,
+            "source_time": source_time,
+            "fired_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        }
+
+    def _notify(self, alert: Dict[str, Any]) -> None:
+        for notifier in self.notifiers:
+            try:
+                notifier(alert)
+            except Exception:
+                logger.exception("alert notifier %r failed", notifier)
+
+
+# -- notifiers ---------------------------------------------------------------
+
+class FileNotifier:
+    """Append each alert as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, alert: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(os.fspath(self.path)) or ".", exist_ok=True)
+        line = json.dumps(alert, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class WebhookNotifier:
+    """POST each alert as JSON to ``url`` (e.g. a local relay for chat or mail)."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, alert: Dict[str, Any]) -> None:
+        body = json.dumps(alert, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+__all__ = [
+    "AlertRule",
+    "AlertEngine",
+    "FileNotifier",
+    "WebhookNotifier",
+    "flatten_segment",
+]
@@ -0,0 +1,281 @@
+"""asyncio variant of Scheduler: coroutine jobs on one long-lived event loop.
+
+The loop runs in its own thread (or on a loop the caller already owns), so
+blocking rate fetchers (through a thread pool) and async crawlers such as
+crawl4ai can share it instead of creating a new loop per tick::
+
+    sched = AsyncScheduler()
+    sched.add_blocking_job("gold", lambda: refresh_segment("gold"), 600, timeout=30)
+    sched.add_job("stocks", fetch_stocks, 60, timeout=120)  # any coroutine function
+    sched.start()
+    ...
+    sched.stop(grace_seconds=5)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .metrics import JobMetrics, write_metrics
+from .scheduler import FIXED_RATE, FIXED_DELAY, METRICS_FILE
+from .trading_calendar import CalendarRule
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncJob:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        mode: str = FIXED_RATE,
+        timeout: Optional[float] = None,
+        run_immediately: bool = False,
+        rule: Optional[CalendarRule] = None,
+    ):
+        if mode not in (FIXED_RATE, FIXED_DELAY):
+            raise ValueError(f"unknown mode: {mode}")
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.mode = mode
+        self.timeout = timeout
+        self.run_immediately = run_immediately
+        self.rule = rule
+        self.rule_target = None
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.metrics = JobMetrics()
+
+    @property
+    def period(self) -> float:
+        if self.rule is not None and self.rule.session_interval:
+            return self.rule.session_interval
+        return self.interval
+
+    def __repr__(self) -> str:
+        return f"AsyncJob({self.name!r}, interval={self.interval}, mode={self.mode}, timeout={self.timeout})"
+
+
+class AsyncScheduler:
+    """Run periodic coroutine jobs on a single event loop.
+
+    Each job is one task that sleeps until its next monotonic deadline
+    (``loop.time()``), awaits the job with an optional per-job timeout and
+    loops. ``stop()`` lets in-flight runs finish for ``grace_seconds`` and
+    then cancels whatever is left.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._jobs: Dict[str, AsyncJob] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+
+    # -- job registry ------------------------------------------------------
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval_seconds: float,
+        mode: str = FIXED_RATE,
+        timeout: Optional[float] = None,
+        run_immediately: bool = False,
+        rule: Optional[CalendarRule] = None,
+    ) -> AsyncJob:
+        """Register a coroutine function to run every ``interval_seconds`` (or per ``rule``)."""
+        job = AsyncJob(name, func, interval_seconds, mode, timeout, run_immediately, rule)
+        old = self._jobs.get(name)
+        self._jobs[name] = job
+        if self.loop is not None:
+            self._call_soon(self._replace_task, old, job)
+        return job
+
+    def add_blocking_job(self, name: str, func: Callable[[], Any], interval_seconds: float, **kwargs) -> AsyncJob:
+        """Register a plain (blocking) function; it runs on the scheduler's thread pool."""
+        async def run():
+            return await self.run_blocking(func)
+        return self.add_job(name, run, interval_seconds, **kwargs)
+
+    def remove_job(self, name: str) -> bool:
+        job = self._jobs.pop(name, None)
+        if job is None:
+            return False
+        if self.loop is not None and job.task is not None:
+            self.loop.call_soon_threadsafe(job.task.cancel)
+        return True
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+    # -- shared-loop helpers -----------------------------------------------
+
+    async def run_blocking(self, func: Callable[..., Any], *args) -> Any:
+        """Await a blocking call on the scheduler's thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Run a one-off coroutine on the scheduler loop from any thread."""
+        if self.loop is None:
+            raise RuntimeError("AsyncScheduler is not running")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _call_soon(self, func: Callable[..., Any], *args) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    # -- job loop ----------------------------------------------------------
+
+    def _replace_task(self, old: Optional[AsyncJob], job: AsyncJob) -> None:
+        if old is not None and old.task is not None:
+            old.task.cancel()
+        job.task = self.loop.create_task(self._job_loop(job), name=f"job-{job.name}")
+
+    async def _sleep_until(self, deadline: float) -> bool:
+        """Sleep until ``deadline``; return False if the scheduler started closing."""
+        delay = deadline - self.loop.time()
+        if delay <= 0:
+            return not self._closing.is_set()
+        try:
+            await asyncio.wait_for(self._closing.wait(), timeout=delay)
+            return False
+        except asyncio.TimeoutError:
+            return True
+
+    async def _run_once(self, job: AsyncJob) -> None:
+        job.running = True
+        job.metrics.started()
+        start = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(job.func(), timeout=job.timeout)
+        except asyncio.TimeoutError as e:
+            error = e
+            job.metrics.count("timeouts")
+            logger.warning("scheduled job %s timed out after %ss", job.name, job.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+            logger.exception("scheduled job %s failed", job.name)
+        finally:
+            job.running = False
+            job.metrics.record(time.perf_counter() - start, job.period, error)
+
+    def _rule_deadline(self, job: AsyncJob) -> float:
+        job.rule_target, delay = job.rule.next_delay(job.rule_target)
+        return self.loop.time() + delay
+
+    async def _job_loop(self, job: AsyncJob) -> None:
+        if job.rule is not None and not job.run_immediately:
+            deadline = self._rule_deadline(job)
+        else:
+            deadline = self.loop.time() + (0.0 if job.run_immediately else job.interval)
+        while await self._sleep_until(deadline):
+            await self._run_once(job)
+            now = self.loop.time()
+            if job.rule is not None:
+                deadline = self._rule_deadline(job)
+                continue
+            if job.mode == FIXED_DELAY:
+                deadline = now + job.interval
+                continue
+            deadline += job.interval
+            while deadline <= now:
+                # skip ticks that passed while the job was running
+                deadline += job.interval
+                job.metrics.count("missed")
+
+    # -- metrics -----------------------------------------------------------
+
+    def inspect(self) -> Dict[str, Dict[str, Any]]:
+        """Per-job configuration, state and run metrics."""
+        out = {}
+        for job in self.jobs():
+            out[job.name] = {
+                "interval": job.interval,
+                "mode": job.mode,
+                "timeout": job.timeout,
+                "calendar": job.rule is not None,
+                "running": job.running,
+            }
+            out[job.name].update(job.metrics.to_dict())
+        return out
+
+    def dump_metrics(self, path: str = METRICS_FILE) -> None:
+        write_metrics(path, self.inspect())
+
+    def enable_metrics_dump(self, path: str = METRICS_FILE, interval_seconds: float = 60) -> AsyncJob:
+        """Write ``inspect()`` to ``path`` every ``interval_seconds`` (on the thread pool)."""
+        return self.add_blocking_job("_metrics_dump", lambda: self.dump_metrics(path), interval_seconds, mode=FIXED_DELAY)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def run(self) -> None:
+        """Run all jobs on the current loop until ``stop()`` is called."""
+        self.loop = asyncio.get_running_loop()
+        self._closing = asyncio.Event()
+        self._stopped = asyncio.Event()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="async-scheduler")
+        for job in self._jobs.values():
+            self._replace_task(None, job)
+        self._ready.set()
+        # wait for shutdown() to finish draining, not just for it to start
+        await self._stopped.wait()
+
+    def start(self) -> None:
+        """Start a dedicated loop thread and run the jobs on it."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="async-scheduler", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    async def shutdown(self, grace_seconds: float = 5.0) -> None:
+        """Stop scheduling, give in-flight runs ``grace_seconds`` to finish, cancel the rest."""
+        if self._closing is None:
+            return
+        self._closing.set()
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._stopped.set()
+
+    def stop(self, grace_seconds: float = 5.0) -> None:
+        """Thread-safe graceful shutdown for a scheduler started with ``start()``."""
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.submit(self.shutdown(grace_seconds)).result(timeout=grace_seconds + 2)
+        except Exception:
+            logger.exception("async scheduler shutdown did not complete cleanly")
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.loop = None
+
+
+__all__ = ["AsyncScheduler", "AsyncJob"]
@@ -0,0 +1,80 @@
+"""Per-bank USD comparison, computed once per snapshot with NumPy.
+
+For every bank in ``all_banks_usd``:
+
+- ``spread_pct``: (sell - buy) / buy * 100, the round-trip loss (匯損比例)
+- ``buy_rank``: 1 for the bank paying the most TWD for your USD
+- ``sell_rank``: 1 for the bank charging the least TWD for its USD
+- ``buy_vs_ref`` / ``sell_vs_ref``: difference from ``REFERENCE_BANK``
+
+Rows are ordered by spread, lowest first, with unquoted banks last.
+Missing quotes are NaN and get no rank (NaN).
+"""
+
+from typing import Any, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+REFERENCE_BANK = "臺灣銀行"
+
+
+def _values(rows: List[Mapping[str, Any]], field: str) -> np.ndarray:
+    out = np.full(len(rows), np.nan)
+    for i, row in enumerate(rows):
+        value = row.get(field)
+        if isinstance(value, (int, float)) and value > 0:
+            out[i] = value
+    return out
+
+
+def _rank(score: np.ndarray) -> np.ndarray:
+    """1-based rank by ascending ``score``; ties share the better rank, NaN stays NaN."""
+    rank = np.full(len(score), np.nan)
+    valid = ~np.isnan(score)
+    if valid.any():
+        ordered = np.sort(score[valid])
+        rank[valid] = np.searchsorted(ordered, score[valid], side="left") + 1
+    return rank
+
+
+class BankComparison:
+    """Read-only columns (NumPy arrays, plus ``bank`` as a tuple) for the USD comparison table."""
+
+    def __init__(self, rows: Iterable[Mapping[str, Any]] = (), reference: str = REFERENCE_BANK):
+        rows = list(rows or ())
+        banks = np.array([row.get("bank", "") for row in rows], dtype=object)
+        buy = _values(rows, "buy")
+        sell = _values(rows, "sell")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread_pct = (sell - buy) / buy * 100
+
+        ref = np.flatnonzero(banks == reference)
+        ref_buy = buy[ref[0]] if len(ref) else np.nan
+        ref_sell = sell[ref[0]] if len(ref) else np.nan
+
+        columns = {
+            "buy": buy,
+            "sell": sell,
+            "spread_pct": spread_pct,
+            "buy_rank": _rank(-buy),
+            "sell_rank": _rank(sell),
+            "buy_vs_ref": buy - ref_buy,
+            "sell_vs_ref": sell - ref_sell,
+        }
+        # lowest spread first; NaN spreads sort last, ties keep the source order
+        order = np.argsort(np.where(np.isnan(spread_pct), np.inf, spread_pct), kind="stable")
+        self.reference = reference
+        self.bank: Tuple[str, ...] = tuple(banks[order])
+        for name, values in columns.items():
+            values = values[order]
+            values.setflags(write=False)
+            setattr(self, name, values)
+
+    def __len__(self) -> int:
+        return len(self.bank)
+
+    def __repr__(self) -> str:
+        return f"BankComparison(banks={len(self.bank)}, reference={self.reference!r})"
+
+
+__all__ = ["BankComparison", "REFERENCE_BANK"]
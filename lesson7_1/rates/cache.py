@@ -0,0 +1,284 @@
+"""Two-tier (memory + disk) cache with stale-while-revalidate semantics.
+
+Tier 1 is an in-process LRU of segment envelopes; tier 2 is the segment
+files written by ``rates.storage``. Each segment has a soft and a hard TTL:
+
+- younger than soft TTL: served as-is (from memory unless another process
+  has since rewritten the segment file, which costs one ``stat`` to notice)
+- between soft and hard TTL: served immediately, refreshed in the background
+- older than hard TTL (or missing): the caller blocks on a refresh, unless
+  it asked for ``block=False`` (then it gets whatever exists and the
+  refresh runs in the background)
+
+``BackgroundRefresher`` is one thread per process that keeps the core
+segments fresh, so page renders never have to wait on the network.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .locking import single_flight
+from .storage import (
+    CORE_SEGMENTS,
+    SEGMENT_TTLS,
+    envelope_age,
+    is_segment_expired,
+    merge_segments,
+    peek_segment,
+    read_segment,
+)
+
+logger = logging.getLogger(__name__)
+
+# hard TTL defaults to this multiple of the soft TTL
+HARD_TTL_FACTOR = 6
+
+
+def _default_refresher(name: str) -> bool:
+    # imported lazily: sources pulls in the network crawlers
+    from .sources import refresh_segment
+    return refresh_segment(name)
+
+
+class TieredCache:
+    """In-memory LRU over the on-disk segment cache.
+
+    ``refresher(name)`` fetches a source and writes its segment; it defaults
+    to ``rates.sources.refresh_segment``. Refreshes are single-flight both
+    within the process and across processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        soft_ttls: Optional[Dict[str, float]] = None,
+        hard_ttls: Optional[Dict[str, float]] = None,
+        refresher: Optional[Callable[[str], bool]] = None,
+        block_wait_seconds: float = 5.0,
+    ):
+        self.max_entries = max_entries
+        self.soft_ttls = dict(SEGMENT_TTLS)
+        self.soft_ttls.update(soft_ttls or {})
+        self.hard_ttls = {name: ttl * HARD_TTL_FACTOR for name, ttl in self.soft_ttls.items()}
+        self.hard_ttls.update(hard_ttls or {})
+        self.refresher = refresher or _default_refresher
+        self.block_wait_seconds = block_wait_seconds
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: set = set()
+        self._merged: Optional[tuple] = None
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stale_serves": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "evictions": 0,
+        }
+
+    # -- memory tier -------------------------------------------------------
+
+    def _mem_get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            env = self._memory.get(name)
+            if env is not None:
+                self._memory.move_to_end(name)
+            return env
+
+    def _mem_put(self, name: str, env: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[name] = env
+            self._memory.move_to_end(name)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] += 1
+
+    # -- refresh -----------------------------------------------------------
+
+    def _refresh(self, name: str, wait_seconds: float, force: bool = False) -> None:
+        soft = self.soft_ttls[name]
+        with single_flight(
+            wait_seconds=wait_seconds,
+            is_stale=None if force else (lambda: is_segment_expired(name, soft)),
+            name=f"refresh_{name}",
+        ) as should_fetch:
+            if not should_fetch:
+                return
+            try:
+                # only count refreshes that actually wrote the segment
+                if self.refresher(name):
+                    self._count("refreshes")
+            except Exception:
+                self._count("refresh_errors")
+                logger.exception("error refreshing segment %s", name)
+
+    def _claim(self, name: str) -> bool:
+        with self._lock:
+            if name in self._inflight:
+                return False
+            self._inflight.add(name)
+            return True
+
+    def _refresh_claimed(self, name: str, force: bool = False) -> None:
+        try:
+            self._refresh(name, wait_seconds=0, force=force)
+            env = read_segment(name)
+            if env is not None:
+                self._mem_put(name, env)
+        finally:
+            with self._lock:
+                self._inflight.discard(name)
+
+    def _refresh_in_background(self, name: str) -> None:
+        if self._claim(name):
+            threading.Thread(target=self._refresh_claimed, args=(name,), name=f"refresh-{name}", daemon=True).start()
+
+    def refresh(self, name: str, force: bool = False) -> None:
+        """Refresh ``name`` in the calling thread unless a refresh is already running.
+
+        ``force`` fetches even when the segment is still fresh (a manual "refresh now").
+        """
+        if self._claim(name):
+            self._refresh_claimed(name, force)
+
+    # -- public API --------------------------------------------------------
+
+    def get(self, name: str, block: bool = True) -> Optional[Dict[str, Any]]:
+        """Return the segment envelope for ``name``, refreshing per the TTL rules.
+
+        With ``block=False`` a missing or hard-expired segment is returned
+        as-is (possibly None) and refreshed in the background instead.
+        """
+        soft, hard = self.soft_ttls[name], self.hard_ttls[name]
+
+        env = self._mem_get(name)
+        age = envelope_age(env)
+        # another process (the updater daemon, another server) may have committed since:
+        # the memoized disk read is the same object while the file is unchanged
+        disk_env = peek_segment(name)
+        disk_age = envelope_age(disk_env)
+        from_disk = disk_env is not env and disk_age is not None and (age is None or disk_age < age)
+        if from_disk:
+            env, age = disk_env, disk_age
+            self._mem_put(name, env)
+        if age is not None and age < soft:
+            self._count("disk_hits" if from_disk else "hits")
+            return env
+
+        if age is not None and age < hard:
+            self._count("stale_serves")
+            self._refresh_in_background(name)
+            return env
+
+        self._count("misses")
+        if not block:
+            self._refresh_in_background(name)
+            return env
+        self._refresh(name, wait_seconds=self.block_wait_seconds)
+        fresh = read_segment(name)
+        if fresh is not None:
+            self._mem_put(name, fresh)
+            return fresh
+        return env
+
+    def get_merged(self, segments: Iterable[str] = CORE_SEGMENTS, block: bool = True) -> Optional[Dict[str, Any]]:
+        """Fetch several segments and merge them into the legacy payload shape.
+
+        The merged dict is reused while no segment version changed; treat it as read-only.
+        """
+        envelopes = {name: self.get(name, block) for name in segments}
+        key = tuple((name, env.get("version"), env.get("updated_at")) for name, env in envelopes.items() if env)
+        merged = self._merged
+        if merged is not None and merged[0] == key:
+            return merged[1]
+        payload = merge_segments(envelopes)
+        self._merged = (key, payload)
+        return payload
+
+    def refreshing(self) -> bool:
+        with self._lock:
+            return bool(self._inflight)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counters)
+            out["entries"] = len(self._memory)
+            out["inflight"] = sorted(self._inflight)
+        lookups = out["hits"] + out["disk_hits"] + out["stale_serves"] + out["misses"]
+        out["hit_ratio"] = (out["hits"] + out["disk_hits"]) / lookups if lookups else 0.0
+        return out
+
+
+class BackgroundRefresher:
+    """One daemon thread that refreshes soft-expired segments of a TieredCache.
+
+    Each pass checks the segment ages on disk, so when the updater daemon
+    (or another process) keeps them fresh this thread never fetches. The
+    cross-process single-flight lock keeps it from racing other refreshers.
+    ``poke()`` requests a pass right away; ``poke(force=True)`` also refetches
+    segments that are still fresh (the page's "refresh now" button).
+    """
+
+    def __init__(self, cache: TieredCache, segments: Iterable[str] = CORE_SEGMENTS, interval_seconds: float = 30.0):
+        self.cache = cache
+        self.segments = tuple(segments)
+        self.interval = interval_seconds
+        self._wake = threading.Event()
+        self._force = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_pass_at: Optional[float] = None
+
+    def start(self) -> "BackgroundRefresher":
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="rates-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def poke(self, force: bool = False) -> None:
+        """Run a pass now; ``force`` refetches every segment even if still fresh."""
+        if force:
+            self._force.set()
+        self._wake.set()
+
+    def run_once(self, force: bool = False) -> None:
+        for name in self.segments:
+            if self._stopped.is_set():
+                return
+            if force or is_segment_expired(name, self.cache.soft_ttls[name]):
+                self.cache.refresh(name, force=force)
+        self.last_pass_at = time.time()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            force = self._force.is_set()
+            self._force.clear()
+            try:
+                self.run_once(force)
+            except Exception:
+                logger.exception("background refresh failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+__all__ = ["TieredCache", "BackgroundRefresher", "HARD_TTL_FACTOR"]
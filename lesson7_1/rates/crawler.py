@@ -1,7 +1,24 @@
+import os
 import requests
 import pandas as pd
 from bs4 import BeautifulSoup
 from typing import List, Dict, Any
+from urllib.parse import urlsplit
+
+
+def upstream_url(url: str) -> str:
+    """Route a rate-site URL through RATES_UPSTREAM_BASE when it is set.
+
+    ``https://rate.bot.com.tw/xrt?Lang=zh-TW`` becomes
+    ``{base}/rate.bot.com.tw/xrt?Lang=zh-TW``, so one local stand-in server
+    (see scripts/load_test.py) can answer for every site.
+    """
+    base = os.environ.get("RATES_UPSTREAM_BASE")
+    if not base:
+        return url
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{base.rstrip('/')}/{parts.netloc}{parts.path}{query}"
 
 
 def _count_cjk(text: str) -> int:
@@ -42,7 +59,7 @@ def fetch_rates(url: str = "https://rate.bot.com.tw/xrt?Lang=zh-TW") -> tuple[Li
 
     Returns tuple of (rates_list, update_time).
     """
-    resp = requests.get(url, timeout=15)
+    resp = requests.get(upstream_url(url), timeout=15)
     resp.raise_for_status()
     content = resp.content
     # Try several likely encodings and pick the one with the most CJK chars in currency column
@@ -84,146 +101,144 @@ def fetch_rates(url: str = "https://rate.bot.com.tw/xrt?Lang=zh-TW") -> tuple[Li
 
 
 def fetch_usd_rates_all_banks() -> List[Dict[str, Any]]:
-    """Fetch USD rates for all banks from findrate.tw"""
+    """Fetch USD rates for all banks from findrate.tw
+
+    Raises on network or layout errors (like ``fetch_rates``) so the caller
+    records a failed fetch instead of an empty one.
+    """
     url = "https://www.findrate.tw/USD/"
-    try:
-        dfs = pd.read_html(url)
-        if len(dfs) < 2:
-            return []
-        df = dfs[1] # Table 1 is usually the main table
-        
-        rates = []
-        for _, row in df.iterrows():
-            bank_name = row.get("銀行名稱", "")
-            buy = row.get("即期買入", "")
-            sell = row.get("即期賣出", "")
-            
-            # Convert to float or None
-            try:
-                buy = float(buy)
-            except:
-                buy = None
-            try:
-                sell = float(sell)
-            except:
-                sell = None
-                
-            rates.append({
-                "bank": bank_name,
-                "buy": buy,
-                "sell": sell
-            })
-        return rates
-    except Exception as e:
-        print(f"Error fetching all banks: {e}")
-        return []
+    dfs = pd.read_html(upstream_url(url))
+    if len(dfs) < 2:
+        raise ValueError(f"findrate page has {len(dfs)} tables, expected the bank rate table")
+    df = dfs[1] # Table 1 is usually the main table
+
+    rates = []
+    for _, row in df.iterrows():
+        bank_name = row.get("銀行名稱", "")
+        buy = row.get("即期買入", "")
+        sell = row.get("即期賣出", "")
+
+        # Convert to float or None
+        try:
+            buy = float(buy)
+        except:
+            buy = None
+        try:
+            sell = float(sell)
+        except:
+            sell = None
+
+        rates.append({
+            "bank": bank_name,
+            "buy": buy,
+            "sell": sell
+        })
+    return rates
 
 
 def fetch_gold_price() -> Dict[str, Any]:
-    """Fetch gold price from Taiwan Bank"""
+    """Fetch gold price from Taiwan Bank
+
+    Raises on network or layout errors; ``buy``/``sell`` are None only when
+    the page itself shows no price (trading suspended).
+    """
     url = "https://rate.bot.com.tw/gold?Lang=zh-TW"
-    try:
-        resp = requests.get(url, timeout=15)
-        resp.raise_for_status()
-        
-        # 抓取更新時間
-        resp.encoding = 'utf-8'
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        update_time = None
-        time_div = soup.find('div', class_='pull-left')
-        if time_div:
-            import re
-            time_text = time_div.get_text(strip=True)
-            # 提取時間格式: 2025/12/17 12:49
-            time_match = re.search(r'(\d{4}/\d{1,2}/\d{1,2}\s+\d{1,2}:\d{2})', time_text)
-            if time_match:
-                update_time = time_match.group(1)
-        
-        # 使用 pandas 讀取表格
-        from io import StringIO
+    resp = requests.get(upstream_url(url), timeout=15)
+    resp.raise_for_status()
+
+    # 抓取更新時間
+    resp.encoding = 'utf-8'
+    soup = BeautifulSoup(resp.text, 'html.parser')
+    update_time = None
+    time_div = soup.find('div', class_='pull-left')
+    if time_div:
         import re
-        dfs = pd.read_html(StringIO(resp.text))
-        
-        if not dfs:
-            return {"buy": None, "sell": None, "update_time": update_time}
-        
-        # 第一個表格就是黃金存摺價格表
-        df = dfs[0]
-
-        # 嘗試從表格中的「時間」欄抓最後一筆時間 (例如 15:19)
-        try:
-            time_col = None
-            for col in df.columns:
-                if isinstance(col, str) and '時間' in col:
-                    time_col = col
+        time_text = time_div.get_text(strip=True)
+        # 提取時間格式: 2025/12/17 12:49
+        time_match = re.search(r'(\d{4}/\d{1,2}/\d{1,2}\s+\d{1,2}:\d{2})', time_text)
+        if time_match:
+            update_time = time_match.group(1)
+
+    # 使用 pandas 讀取表格
+    from io import StringIO
+    import re
+    dfs = pd.read_html(StringIO(resp.text))
+
+    if not dfs:
+        raise ValueError("gold page has no price table")
+
+    # 第一個表格就是黃金存摺價格表
+    df = dfs[0]
+
+    # 嘗試從表格中的「時間」欄抓最後一筆時間 (例如 15:19)
+    try:
+        time_col = None
+        for col in df.columns:
+            if isinstance(col, str) and '時間' in col:
+                time_col = col
+                break
+        table_last_time = None
+        if time_col is None:
+            # 有些網站會用第一欄作為時間顯示
+            first_col = df.columns[0]
+            if isinstance(first_col, str) and '時間' in first_col:
+                time_col = first_col
+
+        if time_col is not None:
+            # 取出最後一個非空、符合 HH:MM 的欄位值
+            for v in reversed(df[time_col].tolist()):
+                if pd.isna(v):
+                    continue
+                s = str(v).strip()
+                m = re.search(r'(\d{1,2}:\d{2})', s)
+                if m:
+                    table_last_time = m.group(1)
                     break
-            table_last_time = None
-            if time_col is None:
-                # 有些網站會用第一欄作為時間顯示
-                first_col = df.columns[0]
-                if isinstance(first_col, str) and '時間' in first_col:
-                    time_col = first_col
-
-            if time_col is not None:
-                # 取出最後一個非空、符合 HH:MM 的欄位值
-                for v in reversed(df[time_col].tolist()):
-                    if pd.isna(v):
-                        continue
-                    s = str(v).strip()
-                    m = re.search(r'(\d{1,2}:\d{2})', s)
-                    if m:
-                        table_last_time = m.group(1)
-                        break
-
-            # 若原先未從頁面文字取得日期時間，且表格有時間，則以今天日期補成 YYYY/MM/DD HH:MM
-            if update_time is None and table_last_time:
-                from datetime import datetime
-                today = datetime.now().strftime('%Y/%m/%d')
-                update_time = f"{today} {table_last_time}"
-        except Exception:
-            # best-effort, 不要讓解析錯誤影響價格擷取
-            pass
-        
-        buy_price = None
-        sell_price = None
-        
-        # 遍歷每一行，找到包含「本行賣出」和「本行買進」的行
-        for idx, row in df.iterrows():
-            # 將整行轉成字串檢查
-            row_str = ' '.join([str(v) for v in row.values])
-            
-            # 找到「本行賣出」那一行，取得第三欄 (1 公克價格)
-            if '本行賣出' in row_str:
-                if len(row) >= 3:
-                    val = str(row.iloc[2])
-                    if pd.notna(val) and val != 'nan':
-                        try:
-                            # 從字串中提取第一個數字 (例如 "4407  買進" -> 4407)
-                            match = re.search(r'\d+', val)
-                            if match:
-                                sell_price = float(match.group())
-                        except Exception as e:
-                            pass
-            
-            # 找到「本行買進」那一行，取得第三欄 (1 公克價格)
-            if '本行買進' in row_str:
-                if len(row) >= 3:
-                    val = str(row.iloc[2])
-                    if pd.notna(val) and val != 'nan':
-                        try:
-                            # 從字串中提取第一個數字 (例如 "4359  回售" -> 4359)
-                            match = re.search(r'\d+', val)
-                            if match:
-                                buy_price = float(match.group())
-                        except Exception as e:
-                            pass
-        
-        return {"buy": buy_price, "sell": sell_price, "update_time": update_time}
-    except Exception as e:
-        print(f"Error fetching gold price: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"buy": None, "sell": None, "update_time": None}
-
-
-__all__ = ["fetch_rates", "fetch_usd_rates_all_banks", "fetch_gold_price"]
+
+        # 若原先未從頁面文字取得日期時間，且表格有時間，則以今天日期補成 YYYY/MM/DD HH:MM
+        if update_time is None and table_last_time:
+            from datetime import datetime
+            today = datetime.now().strftime('%Y/%m/%d')
+            update_time = f"{today} {table_last_time}"
+    except Exception:
+        # best-effort, 不要讓解析錯誤影響價格擷取
+        pass
+
+    buy_price = None
+    sell_price = None
+
+    # 遍歷每一行，找到包含「本行賣出」和「本行買進」的行
+    for idx, row in df.iterrows():
+        # 將整行轉成字串檢查
+        row_str = ' '.join([str(v) for v in row.values])
+
+        # 找到「本行賣出」那一行，取得第三欄 (1 公克價格)
+        if '本行賣出' in row_str:
+            if len(row) >= 3:
+                val = str(row.iloc[2])
+                if pd.notna(val) and val != 'nan':
+                    try:
+                        # 從字串中提取第一個數字 (例如 "4407  買進" -> 4407)
+                        match = re.search(r'\d+', val)
+                        if match:
+                            sell_price = float(match.group())
+                    except Exception as e:
+                        pass
+
+        # 找到「本行買進」那一行，取得第三欄 (1 公克價格)
+        if '本行買進' in row_str:
+            if len(row) >= 3:
+                val = str(row.iloc[2])
+                if pd.notna(val) and val != 'nan':
+                    try:
+                        # 從字串中提取第一個數字 (例如 "4359  回售" -> 4359)
+                        match = re.search(r'\d+', val)
+                        if match:
+                            buy_price = float(match.group())
+                    except Exception as e:
+                        pass
+
+    return {"buy": buy_price, "sell": sell_price, "update_time": update_time}
+
+
+__all__ = ["fetch_rates", "fetch_usd_rates_all_banks", "fetch_gold_price", "upstream_url"]
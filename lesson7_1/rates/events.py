@@ -0,0 +1,423 @@
+"""Change events for cache commits.
+
+Every ``write_segment`` diffs the old and new data and appends one event
+per changed number to an append-only JSON-lines log::
+
+    {"offset": 1234, "version": 42, "segment": "fx", "currency": "USD",
+     "field": "sell", "old": 31.6, "new": 31.55, "source_time": "...", "ts": "..."}
+
+``offset`` is the event's byte position in the log, so a consumer that
+remembers where it stopped can seek straight there instead of re-reading
+and diffing the whole cache. Within the writing process the same events
+are also published to in-process subscribers.
+
+The log is kept in segments so it never grows without bound. Once
+``events.log`` passes ``EVENT_SEGMENT_BYTES`` it moves to
+``events/<offset>.log`` and a new one starts; offsets keep counting across
+segments (the new file's first line records where it starts). Each roll
+also writes ``events/<offset>.checkpoint.json``, every current value as
+of that offset, so old segments can be dropped (after
+``EVENT_RETENTION_DAYS`` or beyond ``EVENT_SEGMENTS_MAX``): a consumer
+whose offset fell off the log gets the checkpoint first, then the events
+after it.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+EVENTS_FILE = os.path.join(ROOT, "data", "events.log")
+
+# roll the active file over at this size; drop rolled segments older than the retention or beyond the count
+EVENT_SEGMENT_BYTES = 8 * 1024 * 1024
+EVENT_RETENTION_DAYS = 3 * 365
+EVENT_SEGMENTS_MAX = 64
+
+_SEGMENT_NAME = re.compile(r"^(\d{20})\.log$")
+_CHECKPOINT_NAME = re.compile(r"^(\d{20})\.checkpoint\.json$")
+
+Key = Tuple[str, str]  # (currency/instrument, field)
+Event = Dict[str, Any]
+
+
+def _spread(buy: Optional[float], sell: Optional[float]) -> Optional[float]:
+    if buy is None or sell is None:
+        return None
+    return round(sell - buy, 6)
+
+
+def flatten_segment(name: str, data: Any, derived: bool = True) -> Dict[Key, float]:
+    """Canonical segment data -> {(key, field): value}.
+
+    Keys are board currency codes (``USD``), ``GOLD`` and per-bank USD
+    quotes as ``USD@<bank>``; fields are ``buy``, ``sell`` and, with
+    ``derived``, ``spread`` (sell - buy).
+    """
+    out: Dict[Key, float] = {}
+
+    def put(key: str, buy: Any, sell: Any) -> None:
+        values = [("buy", buy), ("sell", sell)]
+        if derived:
+            values.append(("spread", _spread(buy, sell)))
+        for field, value in values:
+            if isinstance(value, (int, float)):
+                out[(key, field)] = float(value)
+
+    if not data:
+        return out
+    if name == "fx":
+        for row in data:
+            put(row.get("code", ""), row.get("buy"), row.get("sell"))
+    elif name == "banks_usd":
+        for row in data:
+            put(f"USD@{row.get('bank', '')}", row.get("buy"), row.get("sell"))
+    elif name == "gold":
+        put("GOLD", data.get("buy"), data.get("sell"))
+    return out
+
+
+def diff_segment(name: str, old_data: Any, new_data: Any, version: int, source_time: Optional[str]) -> List[Event]:
+    """One event per value that appeared, changed or disappeared (``new`` = None)."""
+    old = flatten_segment(name, old_data, derived=False)
+    new = flatten_segment(name, new_data, derived=False)
+    ts = datetime.now(timezone.utc).isoformat()
+    events = []
+    for key in list(new) + [k for k in old if k not in new]:
+        before, after = old.get(key), new.get(key)
+        if before == after:
+            continue
+        events.append({
+            "version": version,
+            "segment": name,
+            "currency": key[0],
+            "field": key[1],
+            "old": before,
+            "new": after,
+            "source_time": source_time,
+            "ts": ts,
+        })
+    return events
+
+
+def _read_header(f) -> Tuple[int, int]:
+    """(first offset, header length) of an open segment; files without a header start at 0."""
+    f.seek(0)
+    first = f.readline()
+    if first.startswith(b'{"base":') and first.endswith(b"\n"):
+        try:
+            return int(json.loads(first)["base"]), len(first)
+        except (ValueError, KeyError, TypeError):
+            pass
+    return 0, 0
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class EventLog:
+    """Append-only JSON-lines event log addressed by offsets, kept in segments.
+
+    ``append`` must be called under the cache's exclusive lock so events
+    land in commit order (rolling and compaction happen there too); reads
+    need no lock because segment files are only ever appended to, renamed
+    whole or deleted.
+    """
+
+    def __init__(self, path: Optional[str] = None, checkpoint: Optional[Callable[[], List[Event]]] = None,
+                 segment_bytes: int = EVENT_SEGMENT_BYTES, retention_days: float = EVENT_RETENTION_DAYS,
+                 max_segments: int = EVENT_SEGMENTS_MAX):
+        self.path = path
+        # returns every current value as events (old=None), written at each roll
+        self.checkpoint = checkpoint
+        self.segment_bytes = segment_bytes
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self._headers: Dict[str, Tuple[Tuple[int, int, int], int, int]] = {}
+
+    def _path(self) -> str:
+        # resolved per call so tests and tools can repoint EVENTS_FILE
+        return self.path or EVENTS_FILE
+
+    def _dir(self) -> str:
+        return os.path.splitext(self._path())[0]
+
+    def _listing(self, pattern: "re.Pattern[str]") -> List[Tuple[int, str]]:
+        directory = self._dir()
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(directory, name)))
+        return sorted(found)
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        """Rolled segments, oldest first, as (first offset, path)."""
+        return self._listing(_SEGMENT_NAME)
+
+    def _checkpoints(self) -> List[Tuple[int, str]]:
+        return self._listing(_CHECKPOINT_NAME)
+
+    def _span(self, path: str) -> Optional[Tuple[int, int]]:
+        """(first offset, end offset) of a segment file, or None if it does not exist.
+
+        One ``stat`` while the file is unchanged: its header is memoized per inode.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_dev, st.st_ino, st.st_ctime_ns)
+        cached = self._headers.get(path)
+        if cached is not None and cached[0] == key:
+            base, header = cached[1], cached[2]
+        else:
+            try:
+                with open(path, "rb") as f:
+                    base, header = _read_header(f)
+            except OSError:
+                return None
+            self._headers[path] = (key, base, header)
+        return base, base + st.st_size - header
+
+    def start_offset(self) -> int:
+        """Offset of the oldest event still kept."""
+        segments = self._segments()
+        if segments:
+            return segments[0][0]
+        span = self._span(self._path())
+        return span[0] if span else 0
+
+    def end_offset(self) -> int:
+        span = self._span(self._path())
+        if span is None:
+            # between the two renames of a roll (or before the first write)
+            segments = self._segments()
+            span = self._span(segments[-1][1]) if segments else None
+        return span[1] if span else 0
+
+    def append(self, events: List[Event]) -> None:
+        """Stamp each event with its offset and append the batch in one write."""
+        if not events:
+            return
+        path = self._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            end = self.end_offset()
+            if end:
+                _write_atomic(path, self._header(end))
+        with open(path, "a+b") as f:
+            base, header = _read_header(f)
+            size = f.seek(0, os.SEEK_END)
+            offset = base + size - header
+            chunks = []
+            for event in events:
+                event["offset"] = offset
+                line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+                chunks.append(line)
+                offset += len(line)
+                size += len(line)
+            f.write(b"".join(chunks))
+        if size - header >= self.segment_bytes:
+            self._roll(base, offset)
+
+    @staticmethod
+    def _header(base: int) -> bytes:
+        return (json.dumps({"base": base}) + "\n").encode("utf-8")
+
+    def _roll(self, base: int, end: int) -> None:
+        """Move the full active file to ``events/<base>.log`` and start a new one at ``end``."""
+        path = self._path()
+        os.makedirs(self._dir(), exist_ok=True)
+        try:
+            if self.checkpoint is not None:
+                data = {"offset": end, "ts": datetime.now(timezone.utc).isoformat(), "events": self.checkpoint()}
+                _write_atomic(os.path.join(self._dir(), f"{end:020d}.checkpoint.json"),
+                              json.dumps(data, ensure_ascii=False).encode("utf-8"))
+            os.replace(path, os.path.join(self._dir(), f"{base:020d}.log"))
+            _write_atomic(path, self._header(end))
+        except OSError:
+            # e.g. Windows refuses to rename a file a reader has open: try again on the next append
+            logger.warning("could not roll the event log at offset %s", end, exc_info=True)
+            return
+        self._compact()
+
+    def _compact(self) -> None:
+        """Drop the oldest segments past the retention or count, then checkpoints nobody can reach."""
+        segments = self._segments()
+        cutoff = time.time() - self.retention_days * 86400
+        excess = len(segments) - self.max_segments
+        try:
+            for i, (_, path) in enumerate(segments):
+                if i >= excess and os.path.getmtime(path) >= cutoff:
+                    break
+                os.remove(path)
+                self._headers.pop(path, None)
+            start = self.start_offset()
+            for offset, path in self._checkpoints():
+                if offset < start:
+                    os.remove(path)
+        except OSError:
+            logger.warning("could not compact the event log", exc_info=True)
+
+    def read_checkpoint(self, offset: int) -> List[Event]:
+        """Every value in force at ``offset`` (a segment start) as events with ``old`` None.
+
+        Empty when no checkpoint was written there, e.g. at offset 0.
+        """
+        path = os.path.join(self._dir(), f"{offset:020d}.checkpoint.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                events = json.load(f).get("events", [])
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, AttributeError):
+            logger.warning("skipping unreadable event checkpoint %s", path, exc_info=True)
+            return []
+        for event in events:
+            event["offset"] = offset
+            event["checkpoint"] = True
+        return events
+
+    def window_start(self, since: float) -> int:
+        """Earliest segment start after which every event is newer than ``since`` (epoch seconds).
+
+        Reading from there, seeded with ``read_checkpoint`` of the same
+        offset, covers everything from ``since`` on without reading older segments.
+        """
+        start = self.start_offset()
+        best = start
+        for offset, path in self._checkpoints():
+            try:
+                written = os.path.getmtime(path)
+            except OSError:
+                continue
+            if offset > best and written <= since:
+                best = offset
+        return best
+
+    def read(self, offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Event], int]:
+        """Events at or after ``offset`` and the offset to resume from next time.
+
+        If ``offset`` was dropped by compaction, the checkpoint at the
+        oldest kept event comes first (not counted against ``limit``).
+        """
+        events: List[Event] = []
+        start = self.start_offset()
+        if offset < start:
+            events.extend(self.read_checkpoint(start))
+            offset = start
+        wanted = None if limit is None else limit + len(events)
+        # a roll between listing the segments and opening the active file is retried once with a fresh listing
+        for _ in range(2):
+            paths = [path for _, path in self._segments()] + [self._path()]
+            for path in paths:
+                span = self._span(path)
+                if span is None or (span[1] <= offset and path != paths[-1]):
+                    continue
+                if offset < span[0]:
+                    break  # the segment holding ``offset`` was rolled after the listing
+                offset = self._read_file(path, offset, events, wanted)
+                if wanted is not None and len(events) >= wanted:
+                    return events, offset
+            else:
+                return events, offset
+        return events, offset
+
+    @staticmethod
+    def _read_file(path: str, offset: int, events: List[Event], wanted: Optional[int]) -> int:
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return offset
+        with f:
+            base, header = _read_header(f)
+            if offset < base:
+                # replaced by a roll since it was listed; the next read picks the archived copy up
+                return offset
+            f.seek(header + offset - base)
+            while wanted is None or len(events) < wanted:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # end of file, or a line still being written: resume from its start
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    logger.warning("skipping corrupt event at offset %s", offset - len(line))
+        return offset
+
+
+class EventBus:
+    """In-process pub/sub over the event log."""
+
+    def __init__(self, log: EventLog):
+        self.log = log
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Tuple[Callable[[List[Event]], None], List[int]]] = {}
+        self._next_id = 0
+
+    def subscribe(self, callback: Callable[[List[Event]], None], from_offset: Optional[int] = None) -> Callable[[], None]:
+        """Deliver batches of new events to ``callback``; returns an unsubscribe function.
+
+        With ``from_offset`` the backlog since that offset is delivered first,
+        so a consumer that stored its last offset misses nothing.
+        """
+        with self._lock:
+            sub_id = self._next_id
+            self._next_id += 1
+            position = [self.log.end_offset()]
+            if from_offset is not None:
+                backlog, position[0] = self.log.read(from_offset)
+                if backlog:
+                    callback(backlog)
+            self._subscribers[sub_id] = (callback, position)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers.pop(sub_id, None)
+
+        return unsubscribe
+
+    def publish(self, events: List[Event]) -> None:
+        if not events:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, position in subscribers:
+            fresh = [e for e in events if e["offset"] >= position[0]]
+            if not fresh:
+                continue
+            position[0] = fresh[-1]["offset"] + 1
+            try:
+                callback(fresh)
+            except Exception:
+                logger.exception("event subscriber %r failed", callback)
+
+
+__all__ = [
+    "EVENTS_FILE",
+    "EVENT_SEGMENT_BYTES",
+    "EVENT_RETENTION_DAYS",
+    "EVENT_SEGMENTS_MAX",
+    "EventLog",
+    "EventBus",
+    "diff_segment",
+    "flatten_segment",
+]
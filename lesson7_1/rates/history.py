@@ -0,0 +1,176 @@
+"""Rate history from the change-event log, downsampled for charting.
+
+Every commit appends one event per changed number to ``data/events.log``
+(see ``rates.events``), so the log already holds the full minute-level
+history of every board rate and of gold. ``HistoryStore`` folds those
+events into per-series timestamp/value arrays, reading only what was
+appended since its last call, and answers range queries with a binary
+search plus ``lttb``: Largest-Triangle-Three-Buckets keeps the points
+that carry the visual shape, so a multi-year series goes to the browser
+as a fixed ``HISTORY_POINTS`` points.
+
+The first load starts at the log segment covering the last
+``HISTORY_WINDOW_DAYS``, seeded with that segment's checkpoint, rather
+than at the beginning of the log.
+"""
+
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .events import Event, Key
+from .storage import events_offset, events_window_start, read_checkpoint, read_events
+
+# points sent to the browser per series, whatever the range
+HISTORY_POINTS = 500
+# how far back the first load reads (the longest finite range the app offers)
+HISTORY_WINDOW_DAYS = 3 * 365
+
+# segments and fields that have a history (per-bank USD quotes are skipped)
+HISTORY_SEGMENTS = ("fx", "gold")
+HISTORY_FIELDS = ("buy", "sell")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling of a series sorted by ``x``.
+
+    Keeps the first and last points and, from each of ``threshold - 2``
+    equal-count buckets in between, the point forming the largest triangle
+    with the point kept before it and the mean of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def _event_time(event: Dict[str, Any]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(event["ts"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class _Series:
+    """Append-only (timestamp, value) columns; ``array`` keeps them compact and zero-copy for NumPy."""
+
+    __slots__ = ("ts", "values")
+
+    def __init__(self):
+        self.ts = array("d")
+        self.values = array("d")
+
+    def append(self, ts: float, value: float) -> None:
+        # events arrive in commit order; clamp clock skew so the columns stay sorted
+        if self.ts and ts < self.ts[-1]:
+            ts = self.ts[-1]
+        self.ts.append(ts)
+        self.values.append(value)
+
+
+class HistoryStore:
+    """Per-series rate history, folded incrementally from the event log."""
+
+    def __init__(self, window_days: float = HISTORY_WINDOW_DAYS):
+        self.window_seconds = window_days * 86400
+        self._lock = threading.Lock()
+        self.offset: Optional[int] = None  # None until the first load
+        self._series: Dict[Key, _Series] = {}
+
+    def _fold(self, events: List[Event]) -> int:
+        added = 0
+        for event in events:
+            key = event.get("currency") or ""
+            field = event.get("field")
+            value = event.get("new")
+            if (event.get("segment") not in HISTORY_SEGMENTS or "@" in key
+                    or field not in HISTORY_FIELDS or value is None):
+                continue
+            ts = _event_time(event)
+            if ts is None:
+                continue
+            series = self._series.get((key, field))
+            if series is None:
+                series = self._series[(key, field)] = _Series()
+            series.append(ts, float(value))
+            added += 1
+        return added
+
+    def catch_up(self) -> int:
+        """Fold in events committed since the last call; returns the points added.
+
+        O(1) when nothing new was committed.
+        """
+        with self._lock:
+            end = events_offset()
+            if end == self.offset:
+                return 0
+            added = 0
+            if self.offset is None or end < self.offset:
+                # first load, or the event log was replaced: start at the window, with the values in force there
+                self._series = {}
+                self.offset = events_window_start(time.time() - self.window_seconds)
+                added += self._fold(read_checkpoint(self.offset))
+            while True:
+                events, offset = read_events(self.offset, limit=5000)
+                if not events:
+                    break
+                added += self._fold(events)
+                self.offset = offset
+            return added
+
+    def keys(self) -> List[str]:
+        """Instruments with any history (board currency codes and ``GOLD``)."""
+        with self._lock:
+            return sorted({key for key, _ in self._series})
+
+    def count(self, key: str, field: str) -> int:
+        series = self._series.get((key, field))
+        return len(series.ts) if series else 0
+
+    def series(self, key: str, field: str, start: Optional[float] = None, end: Optional[float] = None,
+               points: int = HISTORY_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, values) of ``key``/``field`` over ``[start, end]``, at most ``points`` long.
+
+        Rates are step functions (an event is written only on change), so
+        the value in force at ``start`` is carried to the range start and
+        the latest value is extended to ``end``.
+        """
+        end = time.time() if end is None else end
+        with self._lock:
+            series = self._series.get((key, field))
+            if series is None or not series.ts:
+                return np.empty(0), np.empty(0)
+            # an array cannot grow while NumPy views of it exist: copy the slice and drop the views under the lock
+            ts = np.frombuffer(series.ts, dtype=float)
+            values = np.frombuffer(series.values, dtype=float)
+            lo = 0 if start is None else int(np.searchsorted(ts, start, side="right"))
+            hi = int(np.searchsorted(ts, end, side="right"))
+            x, y = ts[lo:hi].copy(), values[lo:hi].copy()
+            before = float(values[lo - 1]) if lo > 0 else None
+            del ts, values
+        if before is not None:
+            x, y = np.concatenate(([start], x)), np.concatenate(([before], y))
+        if len(y) and x[-1] < end:
+            x, y = np.concatenate((x, [end])), np.concatenate((y, [y[-1]]))
+        return lttb(x, y, points)
+
+
+__all__ = ["HistoryStore", "lttb", "HISTORY_POINTS", "HISTORY_WINDOW_DAYS"]
@@ -0,0 +1,170 @@
+"""Shared JSON-lines logging for the rates tools.
+
+Records go through a ``QueueHandler``; a ``QueueListener`` thread does the
+file I/O, so callers never block on disk. The file rotates by size and at
+local midnight, keeping ``backup_count`` numbered generations::
+
+    setup_json_logging(LOG_FILE)             # everything under the "rates" logger
+    logger = logging.getLogger("rates.update")
+    logger.info("更新完成", extra={"stage": "fx", "duration_ms": 812.4})
+
+Several processes may append to the same file, so rotation happens under
+a ``FileLock`` next to it; a process that finds the file already rotated
+by someone else just reopens it.
+
+Every line is one JSON object: ``ts``, ``level``, ``logger``, ``msg`` plus
+any ``extra=`` fields (``stage``, ``duration_ms``, ``status``, ...).
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from .locking import FileLock
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 7
+
+# attributes every LogRecord has; anything else came from extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _JsonQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback as its own field instead of
+    folding it into ``msg`` (the stock ``prepare`` formats it into the text)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+class SizeAndDailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that also rolls over when the local date changes.
+
+    Rotation is coordinated across processes through ``<file>.lock``.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self._rollover_at = self._next_midnight(self._opened_at())
+
+    def _opened_at(self) -> float:
+        try:
+            return os.path.getmtime(self.baseFilename)
+        except OSError:
+            return time.time()
+
+    @staticmethod
+    def _next_midnight(t: float) -> float:
+        day = datetime.fromtimestamp(t).date() + timedelta(days=1)
+        return datetime(day.year, day.month, day.day).timestamp()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if record.created >= self._rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def _rotated_elsewhere(self) -> bool:
+        """True when the path no longer names the file this handler has open."""
+        if self.stream is None:
+            return False
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except OSError:
+            return True
+        opened = os.fstat(self.stream.fileno())
+        return (on_disk.st_dev, on_disk.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def doRollover(self) -> None:
+        with FileLock(self.baseFilename + ".lock"):
+            if self._rotated_elsewhere():
+                # another process already rotated: write to the new file instead of rotating it again
+                self.stream.close()
+                self.stream = self._open()
+            else:
+                super().doRollover()
+        self._rollover_at = self._next_midnight(time.time())
+
+
+def setup_json_logging(
+    path: str,
+    name: str = "rates",
+    level: int = logging.INFO,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backup_count: int = DEFAULT_BACKUP_COUNT,
+) -> logging.Logger:
+    """Attach a queue-backed JSON-lines file handler to logger ``name``.
+
+    Child loggers (``rates.update``, ``rates.scheduler``, ...) propagate to
+    it. Idempotent per name; the listener is flushed and stopped at exit.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    if name in _listeners:
+        return logger
+    os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+    file_handler = SizeAndDailyRotatingFileHandler(os.fspath(path), max_bytes, backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+    listener.start()
+    logger.addHandler(_JsonQueueHandler(records))
+    _listeners[name] = listener
+    atexit.register(shutdown_json_logging, name)
+    return logger
+
+
+def shutdown_json_logging(name: Optional[str] = None) -> None:
+    """Flush and stop one listener (or all of them)."""
+    names = [name] if name is not None else list(_listeners)
+    for n in names:
+        listener = _listeners.pop(n, None)
+        if listener is None:
+            continue
+        listener.stop()
+        logger = logging.getLogger(n)
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                logger.removeHandler(handler)
+        for handler in listener.handlers:
+            handler.close()
+
+
+__all__ = [
+    "JsonFormatter",
+    "SizeAndDailyRotatingFileHandler",
+    "setup_json_logging",
+    "shutdown_json_logging",
+]
@@ -0,0 +1,133 @@
+"""Leader election for the updater daemon.
+
+Only the leader fetches; every other instance is a follower that just
+watches the cache. Two backends share one interface:
+
+- ``SQLiteLease``: a row in a SQLite database with an expiry time. A
+  crashed leader loses the lease after ``ttl_seconds`` and the holder's
+  identity is visible to everyone (useful for health output).
+- ``FileLease``: an exclusive lock on a lock file held for the life of the
+  process. The OS releases it when the process dies.
+"""
+
+import os
+import socket
+import sqlite3
+import time
+from typing import Optional
+
+from .locking import DATA_DIR, FileLock
+
+LEASE_DB = os.path.join(DATA_DIR, "leader.sqlite3")
+LEASE_LOCK_FILE = os.path.join(DATA_DIR, ".leader.lock")
+
+
+def default_identity() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SQLiteLease:
+    def __init__(self, name: str = "updater", path: str = LEASE_DB, ttl_seconds: float = 60, identity: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self.ttl = ttl_seconds
+        self.identity = identity or default_identity()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lease ("
+                " name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None + explicit BEGIN IMMEDIATE: take the write lock up front
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if we hold it."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT holder, expires_at FROM lease WHERE name = ?", (self.name,)).fetchone()
+            if row is None or row[0] == self.identity or row[1] < now:
+                conn.execute(
+                    "INSERT OR REPLACE INTO lease (name, holder, expires_at) VALUES (?, ?, ?)",
+                    (self.name, self.identity, now + self.ttl),
+                )
+                conn.execute("COMMIT")
+                return True
+            conn.execute("ROLLBACK")
+            return False
+        except sqlite3.OperationalError:
+            # database busy: treat as "not leader this round"
+            return False
+        finally:
+            conn.close()
+
+    renew = acquire
+
+    def release(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM lease WHERE name = ? AND holder = ?", (self.name, self.identity))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.close()
+
+    def holder(self) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT holder, expires_at FROM lease WHERE name = ?", (self.name,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            conn.close()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+
+class FileLease:
+    def __init__(self, path: str = LEASE_LOCK_FILE, identity: Optional[str] = None):
+        self.path = path
+        self.identity = identity or default_identity()
+        self._lock = FileLock(path, shared=False)
+
+    def acquire(self) -> bool:
+        if self._lock.locked:
+            return True
+        if not self._lock.acquire(timeout=0):
+            return False
+        # record who holds it; followers read this for health output
+        self._lock._fh.seek(0)
+        self._lock._fh.truncate()
+        self._lock._fh.write(self.identity)
+        self._lock._fh.flush()
+        return True
+
+    renew = acquire
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def holder(self) -> Optional[str]:
+        if self._lock.locked:
+            return self.identity
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+
+def make_lease(kind: str = "sqlite", ttl_seconds: float = 60):
+    if kind == "sqlite":
+        return SQLiteLease(ttl_seconds=ttl_seconds)
+    if kind == "lock":
+        return FileLease()
+    raise ValueError(f"unknown lease backend: {kind}")
+
+
+__all__ = ["SQLiteLease", "FileLease", "make_lease", "default_identity"]
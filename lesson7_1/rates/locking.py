@@ -0,0 +1,156 @@
+"""Advisory file locks for the rates cache.
+
+The updater script, the backup script, the in-app Scheduler and every
+Streamlit session touch the same cache files. Readers take a shared lock,
+writers take an exclusive one, and refreshes go through a single-flight
+lock so only one process hits the network when the cache expires.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.path.join(ROOT, "data")
+CACHE_LOCK_FILE = os.path.join(DATA_DIR, ".rates_cache.lock")
+
+DEFAULT_TIMEOUT = 10.0
+POLL_INTERVAL = 0.05
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a lock cannot be acquired within the wait timeout."""
+
+
+class FileLock:
+    """Shared/exclusive advisory lock on a lock file.
+
+    Uses ``fcntl.flock`` on POSIX. On Windows ``msvcrt`` only offers
+    exclusive locks, so shared requests degrade to exclusive there.
+    """
+
+    def __init__(self, path: str, shared: bool = False, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.path = path
+        self.shared = shared
+        self.timeout = timeout
+        self._fh = None
+
+    def _try_lock(self) -> bool:
+        if fcntl is not None:
+            mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(self._fh.fileno(), mode | fcntl.LOCK_NB)
+                return True
+            except (BlockingIOError, PermissionError):
+                return False
+        if msvcrt is not None:
+            try:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                return False
+        # no locking primitive available: behave as before (uncoordinated)
+        return True
+
+    def _unlock(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Acquire the lock, waiting up to ``timeout`` seconds.
+
+        ``timeout=None`` uses the instance default, ``0`` tries once.
+        Returns False instead of raising so callers can choose.
+        """
+        if self._fh is not None:
+            return True
+        if timeout is None:
+            timeout = self.timeout
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fh = open(self.path, "a+")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._try_lock():
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                self._fh.close()
+                self._fh = None
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        try:
+            self._unlock()
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fh is not None
+
+    def __enter__(self) -> "FileLock":
+        if not self.acquire():
+            kind = "shared" if self.shared else "exclusive"
+            raise LockTimeout(f"timed out after {self.timeout}s waiting for {kind} lock on {self.path}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+def cache_lock(shared: bool = False, timeout: Optional[float] = DEFAULT_TIMEOUT) -> FileLock:
+    """Lock guarding the cache files: shared for readers, exclusive for writers."""
+    return FileLock(CACHE_LOCK_FILE, shared=shared, timeout=timeout)
+
+
+@contextmanager
+def single_flight(
+    wait_seconds: float = 5.0,
+    is_stale: Optional[Callable[[], bool]] = None,
+    name: str = "refresh",
+) -> Iterator[bool]:
+    """Coordinate refreshes so exactly one process fetches.
+
+    Yields True when the caller holds the refresh lock and should fetch.
+    Yields False when another process is (or just was) refreshing: the
+    caller waited up to ``wait_seconds`` for it and should now read the
+    cache, which is either fresh or stale-but-usable.
+
+    ``is_stale`` is re-checked after taking the lock so a process that
+    queued behind a finished refresh does not fetch a second time.
+    ``name`` selects the lock file, so different sources refresh independently.
+    """
+    lock = FileLock(os.path.join(DATA_DIR, f".{name}.lock"), shared=False)
+    if not lock.acquire(timeout=0):
+        # someone else is refreshing; wait briefly for them to finish
+        if lock.acquire(timeout=wait_seconds):
+            lock.release()
+        yield False
+        return
+    try:
+        if is_stale is not None and not is_stale():
+            yield False
+        else:
+            yield True
+    finally:
+        lock.release()
+
+
+__all__ = ["FileLock", "LockTimeout", "cache_lock", "single_flight"]
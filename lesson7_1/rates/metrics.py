@@ -0,0 +1,102 @@
+"""Per-job run metrics for Scheduler and AsyncScheduler."""
+
+import bisect
+import json
+import os
+import threading
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence
+
+# upper bounds (seconds) of the run-duration histogram buckets; the last bucket is open-ended
+DURATION_BUCKETS: Sequence[float] = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+
+class JobMetrics:
+    """Durations, failures, overruns and missed ticks for one scheduled job."""
+
+    def __init__(self, buckets: Sequence[float] = DURATION_BUCKETS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.histogram = [0] * (len(self.buckets) + 1)
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.timeouts = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.missed = 0
+        self.last_duration: Optional[float] = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_started_at: Optional[str] = None
+        self.last_finished_at: Optional[str] = None
+        self.last_success_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_traceback: Optional[str] = None
+
+    def started(self) -> None:
+        self.last_started_at = datetime.now(timezone.utc).isoformat()
+
+    def record(self, duration: float, interval: Optional[float] = None, error: Optional[BaseException] = None) -> None:
+        """Record one finished run; ``interval`` is the period used to flag overruns."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self.runs += 1
+            self.last_duration = duration
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            self.histogram[bisect.bisect_left(self.buckets, duration)] += 1
+            if interval and duration > interval:
+                self.overruns += 1
+            self.last_finished_at = now
+            if error is None:
+                self.consecutive_failures = 0
+                self.last_success_at = now
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+                self.last_traceback = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+
+    def count(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    @property
+    def avg_duration(self) -> Optional[float]:
+        return self.total_duration / self.runs if self.runs else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+            return {
+                "runs": self.runs,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "timeouts": self.timeouts,
+                "overruns": self.overruns,
+                "skipped": self.skipped,
+                "missed": self.missed,
+                "last_duration": self.last_duration,
+                "avg_duration": self.total_duration / self.runs if self.runs else None,
+                "max_duration": self.max_duration,
+                "histogram": dict(zip(labels, self.histogram)),
+                "last_started_at": self.last_started_at,
+                "last_finished_at": self.last_finished_at,
+                "last_success_at": self.last_success_at,
+                "last_error": self.last_error,
+                "last_traceback": self.last_traceback,
+            }
+
+
+def write_metrics(path: str, payload: Dict[str, Any]) -> None:
+    """Atomically write a metrics snapshot as indented JSON (meant for humans and dashboards)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+__all__ = ["JobMetrics", "DURATION_BUCKETS", "write_metrics"]
@@ -1,5 +1,7 @@
 from typing import List, Dict, Any, Optional
 
+from .schema import make_rate, split_label
+
 
 def _parse_value(text: str) -> Optional[float]:
     if text is None:
@@ -18,26 +20,31 @@ def _parse_value(text: str) -> Optional[float]:
 
 
 def normalize_rates(raw_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Normalize extracted rows into consistent dicts.
+    """Normalize extracted rows into the canonical rate rows (see rates.schema).
 
     Each row will contain:
-      - currency: str
+      - currency: str (Chinese name, e.g. "美金")
+      - name: str (board label, e.g. "美金 (USD)")
+      - code: str (ISO code)
       - buy: Optional[float]
       - sell: Optional[float]
       - trade: bool (True if both buy and sell present)
-      - raw: original row dict
     """
     out = []
     if not raw_rows:
         return out
     for r in raw_rows:
         currency = r.get("幣別") or r.get("currency") or ""
+        if not currency.strip():
+            continue
         buy_text = r.get("本行即期買入") or r.get("本行現金買入") or r.get("buy") or ""
         sell_text = r.get("本行即期賣出") or r.get("本行現金賣出") or r.get("sell") or ""
-        buy = _parse_value(buy_text)
-        sell = _parse_value(sell_text)
-        trade = (buy is not None) and (sell is not None)
-        out.append({"currency": currency.strip(), "buy": buy, "sell": sell, "trade": trade, "raw": r})
+        buy = _parse_value(str(buy_text))
+        sell = _parse_value(str(sell_text))
+        name, code = split_label(currency)
+        row = make_rate(code, buy, sell, name)
+        row["trade"] = (buy is not None) and (sell is not None)
+        out.append(row)
     return out
 
 
@@ -0,0 +1,360 @@
+"""Rolling historical percentiles of board rates, kept as streaming sketches.
+
+Each instrument (board currency code or ``GOLD``) has a ``RollingSketch``:
+a few P² histograms (Jain & Chlamtac's P² algorithm generalised to
+``cells`` equal-probability cells), one per slice of the rolling window.
+Adding a sample or asking where a value falls is O(cells) regardless of
+how much history went in, and the whole state is a few hundred numbers.
+
+``PercentileStore`` feeds the sketches from the change-event log (see
+``rates.events``): it remembers the byte offset it stopped at, folds in
+only the new commits, and persists sketches and offset to
+``PERCENTILES_FILE``.
+
+Events only say when a rate changed, so they are not sampled directly
+(a commit that changes nothing writes no event, and a busy day would
+outweigh a quiet one). Instead the store keeps the mid price
+(buy + sell) / 2 in force for each instrument and samples it on a clock,
+once every ``SAMPLE_SECONDS``: the distribution is time-weighted, a rate
+that stood all day counts 24 times as much as one that stood an hour.
+Stretches with no writer running are filled with the last known rate.
+"""
+
+import bisect
+import json
+import os
+import threading
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .locking import FileLock
+from .storage import events_offset, read_events
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+PERCENTILES_FILE = os.path.join(ROOT, "data", "rate_percentiles.json")
+
+# segments whose instruments get a distribution (per-bank USD quotes are skipped)
+TRACKED_SEGMENTS = ("fx", "gold")
+# the rates in force are sampled once per this many seconds (on multiples of it)
+SAMPLE_SECONDS = 3600
+# below this many samples a percentile says little; callers fall back to fixed ranges
+MIN_SAMPLES = 30
+
+
+class P2Histogram:
+    """Streaming equal-probability histogram (generalised P² estimator).
+
+    Tracks ``cells + 1`` markers whose heights approximate the quantiles
+    0, 1/cells, ..., 1 of everything added so far.
+    """
+
+    def __init__(self, cells: int = 20):
+        if cells < 2:
+            raise ValueError("cells must be at least 2")
+        self.cells = cells
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions: List[float] = []
+
+    @property
+    def _markers(self) -> int:
+        return self.cells + 1
+
+    def add(self, x: float) -> None:
+        m = self._markers
+        self.count += 1
+        if self.count <= m:
+            bisect.insort(self.heights, x)
+            if self.count == m:
+                self.positions = [float(i + 1) for i in range(m)]
+            return
+
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[-1]:
+            q[-1] = x
+            k = m - 2
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        for i in range(k + 1, m):
+            n[i] += 1
+
+        for i in range(1, m - 1):
+            desired = 1 + (self.count - 1) * i / self.cells
+            d = desired - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                candidate = self._parabolic(i, s)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = candidate
+                n[i] += s
+
+    def _parabolic(self, i: int, s: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + s / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def cdf(self, x: float) -> Optional[float]:
+        """Estimated fraction of samples <= ``x`` (None when empty)."""
+        if not self.count:
+            return None
+        q = self.heights
+        if self.count <= self._markers:
+            # still exact: heights are the sorted samples
+            return bisect.bisect_right(q, x) / len(q)
+        if x < q[0]:
+            return 0.0
+        if x >= q[-1]:
+            return 1.0
+        n = self.positions
+        i = bisect.bisect_right(q, x) - 1
+        span = q[i + 1] - q[i]
+        rank = n[i] + ((x - q[i]) / span if span else 0.0) * (n[i + 1] - n[i])
+        return min(1.0, max(0.0, rank / self.count))
+
+    def quantile(self, p: float) -> Optional[float]:
+        if not self.count:
+            return None
+        q = self.heights
+        if self.count <= self._markers:
+            return q[min(len(q) - 1, int(p * len(q)))]
+        n = self.positions
+        rank = 1 + p * (self.count - 1)
+        i = min(max(bisect.bisect_right(n, rank) - 1, 0), len(n) - 2)
+        span = n[i + 1] - n[i]
+        return q[i] + (rank - n[i]) / span * (q[i + 1] - q[i]) if span else q[i]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"cells": self.cells, "count": self.count, "heights": self.heights, "positions": self.positions}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "P2Histogram":
+        sketch = cls(int(data.get("cells", 20)))
+        sketch.count = int(data.get("count", 0))
+        sketch.heights = [float(v) for v in data.get("heights", [])]
+        sketch.positions = [float(v) for v in data.get("positions", [])]
+        return sketch
+
+
+class RollingSketch:
+    """P² histograms over a rolling window, one per ``window / generations`` slice.
+
+    New samples go to the newest slice; slices older than the window are
+    dropped, so the distribution follows the last ``window_seconds``.
+    """
+
+    def __init__(self, window_seconds: float = 365 * 86400, generations: int = 4, cells: int = 20):
+        self.window = window_seconds
+        self.generations = generations
+        self.cells = cells
+        self.slices: List[Tuple[float, P2Histogram]] = []  # (slice start, sketch), oldest first
+
+    @property
+    def _slice_seconds(self) -> float:
+        return self.window / self.generations
+
+    def _expire(self, now: float) -> None:
+        # a slice leaves the window once even its newest possible sample is too old
+        cutoff = now - self.window
+        self.slices = [(start, s) for start, s in self.slices if start + self._slice_seconds > cutoff]
+
+    def add(self, x: float, ts: Optional[float] = None) -> None:
+        ts = time.time() if ts is None else ts
+        self._expire(ts)
+        if not self.slices or ts >= self.slices[-1][0] + self._slice_seconds:
+            self.slices.append((ts, P2Histogram(self.cells)))
+        self.slices[-1][1].add(x)
+
+    @property
+    def count(self) -> int:
+        return sum(s.count for _, s in self.slices)
+
+    def percentile(self, x: float) -> Optional[float]:
+        """Where ``x`` falls in the window, 0-100 (count-weighted across slices)."""
+        total = self.count
+        if not total:
+            return None
+        return 100 * sum(s.cdf(x) * s.count for _, s in self.slices if s.count) / total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window,
+            "generations": self.generations,
+            "cells": self.cells,
+            "slices": [{"start": start, "sketch": s.to_dict()} for start, s in self.slices],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RollingSketch":
+        sketch = cls(float(data["window_seconds"]), int(data["generations"]), int(data["cells"]))
+        sketch.slices = [(float(s["start"]), P2Histogram.from_dict(s["sketch"])) for s in data.get("slices", [])]
+        return sketch
+
+
+def _event_time(event: Dict[str, Any]) -> float:
+    try:
+        return datetime.fromisoformat(event["ts"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class PercentileStore:
+    """Per-instrument rolling sketches fed incrementally from the event log."""
+
+    def __init__(self, path: Optional[str] = None, window_days: float = 365, generations: int = 4, cells: int = 20,
+                 sample_seconds: float = SAMPLE_SECONDS):
+        self.path = path or PERCENTILES_FILE
+        self.window_seconds = window_days * 86400
+        self.generations = generations
+        self.cells = cells
+        self.sample_seconds = sample_seconds
+        self._lock = threading.Lock()
+        self._file_key: Optional[Tuple[int, int]] = None
+        self.offset = 0
+        self.sampled_at: Optional[float] = None  # last clock tick sampled
+        self.last: Dict[str, Dict[str, float]] = {}
+        self.sketches: Dict[str, RollingSketch] = {}
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self) -> None:
+        key = self._stat()
+        if key is None or key == self._file_key:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if "sampled_at" not in data:
+                raise ValueError("sampled per commit by an older version")
+            self.offset = int(data.get("offset", 0))
+            self.sampled_at = data["sampled_at"]
+            self.last = data.get("last", {})
+            self.sketches = {k: RollingSketch.from_dict(v) for k, v in data.get("sketches", {}).items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error reading percentiles, rebuilding from the event log: {e}")
+            self.offset, self.sampled_at, self.last, self.sketches = 0, None, {}, {}
+        self._file_key = key
+
+    def _save(self) -> None:
+        payload = {
+            "offset": self.offset,
+            "sampled_at": self.sampled_at,
+            "last": self.last,
+            "sketches": {k: s.to_dict() for k, s in sorted(self.sketches.items())},
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self._file_key = self._stat()
+
+    # -- updates -----------------------------------------------------------
+
+    def _sample_until(self, t: float) -> int:
+        """Sample the rates in force at every clock tick after ``sampled_at`` up to ``t``."""
+        step = self.sample_seconds
+        # ticks older than the window would be expired straight away
+        tick = math.ceil(max(self.sampled_at + step, t - self.window_seconds) / step) * step
+        mids = [
+            (key, (quote["buy"] + quote["sell"]) / 2)
+            for quotes in self.last.values()
+            for key, quote in quotes.items()
+            if "buy" in quote and "sell" in quote
+        ]
+        added = 0
+        while tick <= t:
+            for key, mid in mids:
+                sketch = self.sketches.get(key)
+                if sketch is None:
+                    sketch = self.sketches[key] = RollingSketch(self.window_seconds, self.generations, self.cells)
+                sketch.add(mid, tick)
+            added += len(mids)
+            self.sampled_at = tick
+            tick += step
+        self.sampled_at = max(self.sampled_at, math.floor(t / step) * step)
+        return added
+
+    def _apply(self, events: List[Dict[str, Any]]) -> int:
+        """Fold events in, sampling the previous rates at the clock ticks each one passes."""
+        added = 0
+        for event in events:
+            key = event.get("currency") or ""
+            if (event.get("segment") not in TRACKED_SEGMENTS or "@" in key
+                    or event.get("field") not in ("buy", "sell")):
+                continue
+            ts = _event_time(event)
+            if self.sampled_at is None:
+                # history starts at the first rate seen
+                self.sampled_at = math.floor(ts / self.sample_seconds) * self.sample_seconds
+            else:
+                added += self._sample_until(ts)
+            quote = self.last.setdefault(event["segment"], {}).setdefault(key, {})
+            if event.get("new") is None:
+                quote.pop(event["field"], None)
+            else:
+                quote[event["field"]] = float(event["new"])
+        return added
+
+    def catch_up(self) -> int:
+        """Fold in new events and sample up to now; returns the samples added.
+
+        O(1) when nothing was committed and no clock tick has passed. Safe
+        to call from several processes: the fold runs under a file lock and
+        re-reads the state another process may have saved first.
+        """
+        with self._lock:
+            end = events_offset()
+            now = time.time()
+            if end == self.offset and (self.sampled_at is None or now < self.sampled_at + self.sample_seconds):
+                return 0
+            with FileLock(f"{self.path}.lock"):
+                self._load()
+                if end < self.offset:
+                    # the event log was replaced (rotated or deleted): read the new one from the
+                    # start; events before ``sampled_at`` only update the rates, they add no samples
+                    self.offset = 0
+                state = (self.offset, self.sampled_at)
+                added = 0
+                while True:
+                    events, offset = read_events(self.offset, limit=5000)
+                    if not events:
+                        break
+                    added += self._apply(events)
+                    self.offset = offset
+                if self.sampled_at is not None:
+                    added += self._sample_until(now)
+                if (self.offset, self.sampled_at) != state:
+                    self._save()
+                return added
+
+    # -- queries -----------------------------------------------------------
+
+    def count(self, key: str) -> int:
+        sketch = self.sketches.get(key)
+        return sketch.count if sketch else 0
+
+    def percentile(self, key: str, value: float, min_samples: int = MIN_SAMPLES) -> Optional[float]:
+        """0-100 position of ``value`` in ``key``'s rolling history, or None if history is too thin."""
+        sketch = self.sketches.get(key)
+        if sketch is None or sketch.count < min_samples:
+            return None
+        return sketch.percentile(value)
+
+
+__all__ = ["P2Histogram", "RollingSketch", "PercentileStore", "PERCENTILES_FILE", "MIN_SAMPLES", "SAMPLE_SECONDS"]
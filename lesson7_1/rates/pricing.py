@@ -0,0 +1,97 @@
+"""Any-to-any cross rates for one snapshot, computed with NumPy broadcasting.
+
+Every board currency (and gold, per gram) is quoted against TWD: the bank
+buys one unit at ``buy`` and sells one at ``sell``. With TWD itself as the
+``1.0 / 1.0`` leg, the whole N x N table is two vector ops:
+
+- ``bid[i, j] = buy[i] / sell[j]``: units of ``j`` received for one ``i``
+- ``ask[i, j] = sell[i] / buy[j]``: units of ``j`` paid for one ``i``
+
+Missing legs are NaN; the diagonal is 1.0 (same currency, no conversion).
+``cross_rates_for(snapshot)`` builds the table once per data version.
+"""
+
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .quotes import CurrencyIndex, Quote
+
+GOLD_CODE = "GOLD"
+GOLD_NAME = "黃金"
+
+
+def _gold_row(gold_price: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    if gold_price and gold_price.get("buy") and gold_price.get("sell"):
+        return {"code": GOLD_CODE, "currency": GOLD_NAME, "buy": gold_price["buy"], "sell": gold_price["sell"]}
+    return None
+
+
+def _leg(values: List[Optional[float]]) -> np.ndarray:
+    return np.array([v if v else np.nan for v in values], dtype=float)
+
+
+class CrossRates:
+    """Read-only bid/ask matrices over TWD, the tradeable currencies and gold."""
+
+    def __init__(self, rows: Any = (), gold_price: Optional[Mapping[str, Any]] = None, version: str = ""):
+        rows = list(rows or ())
+        gold = _gold_row(gold_price or {})
+        if gold is not None:
+            rows.append(gold)
+        self.version = version
+        self.index = CurrencyIndex(rows)
+        self.quotes: Tuple[Quote, ...] = tuple(self.index.quotes(include_twd=True))
+        self.codes: Tuple[str, ...] = tuple(q.code for q in self.quotes)
+        self._pos = {code: i for i, code in enumerate(self.codes)}
+
+        self.buy = _leg([q.buy for q in self.quotes])
+        self.sell = _leg([q.sell for q in self.quotes])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.bid = self.buy[:, None] / self.sell[None, :]
+            self.ask = self.sell[:, None] / self.buy[None, :]
+        np.fill_diagonal(self.bid, 1.0)
+        np.fill_diagonal(self.ask, 1.0)
+        for arr in (self.buy, self.sell, self.bid, self.ask):
+            arr.setflags(write=False)
+
+    def position(self, label: str) -> Optional[int]:
+        quote = self.index.lookup(label)
+        return None if quote is None else self._pos.get(quote.code)
+
+    def quote(self, label: str) -> Optional[Quote]:
+        return self.index.lookup(label)
+
+    def rate(self, source_label: str, target_label: str) -> Optional[float]:
+        """Units of target received per unit of source, or None when a leg is missing."""
+        i, j = self.position(source_label), self.position(target_label)
+        if i is None or j is None:
+            return None
+        value = float(self.bid[i, j])
+        return None if np.isnan(value) else value
+
+    def __len__(self) -> int:
+        return len(self.quotes)
+
+    def __repr__(self) -> str:
+        return f"CrossRates(version={self.version!r}, n={len(self.quotes)})"
+
+
+_memo_lock = threading.Lock()
+_memo: Dict[str, CrossRates] = {}
+
+
+def cross_rates_for(snapshot: Any) -> CrossRates:
+    """The cross-rate table for ``snapshot`` (a ``RatesSnapshot``), built once per version."""
+    with _memo_lock:
+        cross = _memo.get("current")
+        if cross is not None and cross.version == snapshot.version:
+            return cross
+    cross = CrossRates(snapshot.tradeable, snapshot.gold_price, snapshot.version)
+    with _memo_lock:
+        _memo["current"] = cross
+    return cross
+
+
+__all__ = ["CrossRates", "cross_rates_for", "GOLD_CODE", "GOLD_NAME"]
@@ -0,0 +1,98 @@
+"""Currency quotes indexed by every label the UI uses.
+
+The converter's options are Chinese names (``"美金"``), the cache rows
+carry board labels (``"美金 (USD)"``) and codes (``"USD"``). A
+``CurrencyIndex`` maps all three (plus New Taiwan Dollar) to one
+``Quote`` so lookups are a dict hit instead of a scan with string
+matching. Label parsing lives here and in ``schema.split_label`` only.
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional
+
+from .schema import CURRENCY_NAMES, split_label
+
+TWD_CODE = "TWD"
+TWD_NAME = "新台幣"
+
+
+class Quote(NamedTuple):
+    code: str
+    name: str
+    label: str
+    buy: Optional[float]
+    sell: Optional[float]
+
+    @property
+    def is_twd(self) -> bool:
+        return self.code == TWD_CODE
+
+
+# the home currency: 1 TWD buys and sells at 1 TWD
+TWD_QUOTE = Quote(TWD_CODE, TWD_NAME, f"{TWD_NAME} ({TWD_CODE})", 1.0, 1.0)
+
+
+def is_twd(label: str) -> bool:
+    return TWD_NAME in (label or "") or TWD_CODE in (label or "")
+
+
+def base_name(label: str) -> str:
+    """``"美金 (USD)"`` -> ``"美金"``; any TWD label -> ``"新台幣"``."""
+    if is_twd(label):
+        return TWD_NAME
+    return split_label(label)[0]
+
+
+def quote_from_row(row: Mapping[str, Any]) -> Quote:
+    code = row.get("code")
+    if code:
+        name = row.get("currency") or CURRENCY_NAMES.get(code, code)
+    else:
+        name, code = split_label(row.get("name") or row.get("currency") or "")
+    return Quote(code, name, f"{name} ({code})", row.get("buy"), row.get("sell"))
+
+
+class CurrencyIndex:
+    """Label / Chinese name / ISO code -> Quote, built once per snapshot."""
+
+    def __init__(self, rows: Iterable[Mapping[str, Any]] = ()):
+        self._quotes: List[Quote] = []
+        self._by_key: Dict[str, Quote] = {}
+        self._add(TWD_QUOTE)
+        for row in rows:
+            self._add(quote_from_row(row))
+
+    def _add(self, quote: Quote) -> None:
+        self._quotes.append(quote)
+        for key in (quote.label, quote.name, quote.code):
+            # first row wins, like the scans this replaces
+            self._by_key.setdefault(key, quote)
+
+    def lookup(self, label: str) -> Optional[Quote]:
+        label = (label or "").strip()
+        quote = self._by_key.get(label)
+        if quote is None and label:
+            # unusual spacing such as "美金(USD)": normalise once and retry by code, then name
+            name, code = split_label(label)
+            quote = self._by_key.get(code) or self._by_key.get(name)
+        return quote
+
+    def __contains__(self, label: str) -> bool:
+        return self.lookup(label) is not None
+
+    def quotes(self, include_twd: bool = False) -> List[Quote]:
+        return list(self._quotes if include_twd else self._quotes[1:])
+
+    def __len__(self) -> int:
+        return len(self._quotes) - 1
+
+
+__all__ = [
+    "Quote",
+    "CurrencyIndex",
+    "TWD_QUOTE",
+    "TWD_CODE",
+    "TWD_NAME",
+    "is_twd",
+    "base_name",
+    "quote_from_row",
+]
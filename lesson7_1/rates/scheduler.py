@@ -1,35 +1,316 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import random
 import threading
 import time
-from typing import Callable, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import JobMetrics, write_metrics
+from .trading_calendar import CalendarRule
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "scheduler_metrics.json")
+
+# timing modes
+FIXED_RATE = "fixed_rate"    # deadlines advance by interval from the previous deadline (no drift)
+FIXED_DELAY = "fixed_delay"  # next run is interval after the previous run finished
+
+# what to do when a job is due while its previous run is still going
+SKIP = "skip"          # drop the tick
+QUEUE = "queue"        # run once more for every missed tick (bounded by max_queued)
+COALESCE = "coalesce"  # collapse any number of missed ticks into a single extra run
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: float,
+        mode: str = FIXED_RATE,
+        jitter: float = 0.0,
+        overlap: str = SKIP,
+        max_queued: int = 10,
+        rule: Optional[CalendarRule] = None,
+    ):
+        if mode not in (FIXED_RATE, FIXED_DELAY):
+            raise ValueError(f"unknown mode: {mode}")
+        if overlap not in (SKIP, QUEUE, COALESCE):
+            raise ValueError(f"unknown overlap policy: {overlap}")
+        self.name = name
+        self.func = func
+        self.interval = float(interval)
+        self.mode = mode
+        self.jitter = float(jitter)
+        self.overlap = overlap
+        self.max_queued = max_queued
+        # calendar-aware jobs take their run times from the rule instead of the interval
+        self.rule = rule
+        self.rule_target = None
+        # deadline without jitter; jitter is applied per tick so it never accumulates
+        self.base_deadline = 0.0
+        self.running = False
+        self.pending = 0
+        self.cancelled = False
+        self.metrics = JobMetrics()
+
+    @property
+    def period(self) -> float:
+        """Nominal time between runs, used to flag overruns."""
+        if self.rule is not None and self.rule.session_interval:
+            return self.rule.session_interval
+        return self.interval
+
+    def __repr__(self) -> str:
+        return f"Job({self.name!r}, interval={self.interval}, mode={self.mode}, overlap={self.overlap})"
 
 
 class Scheduler:
-    def __init__(self, callback: Callable[[], None], interval_seconds: int = 600):
-        self.callback = callback
-        self.interval = interval_seconds
+    """Run many periodic jobs from one timer thread and a bounded worker pool.
+
+    Deadlines live in a heap keyed on ``clock()`` (``time.monotonic`` by
+    default). A slow job only ties up its own worker; other jobs keep firing
+    on time. Passing ``executor`` runs jobs there instead of on a pool owned
+    by the scheduler; ``stop()`` then leaves it running.
+
+    ``Scheduler(callback, interval_seconds)`` still works and registers a
+    single job named ``"default"``.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[], None]] = None,
+        interval_seconds: int = 600,
+        max_workers: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+        executor: Optional[Executor] = None,
+    ):
+        self.max_workers = max_workers
+        self.clock = clock
+        self._own_executor = executor is None
+        self._jobs: Dict[str, Job] = {}
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
         self._thread: Optional[threading.Thread] = None
-        self._stop_event = threading.Event()
+        self._executor: Optional[Executor] = executor
+        self._stopped = False
+        if callback is not None:
+            self.add_job("default", callback, interval_seconds)
+
+    # -- job registry ------------------------------------------------------
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval_seconds: float,
+        mode: str = FIXED_RATE,
+        jitter_seconds: float = 0.0,
+        overlap: str = SKIP,
+        run_immediately: bool = False,
+        max_queued: int = 10,
+        rule: Optional[CalendarRule] = None,
+    ) -> Job:
+        """Register (or replace) a job. The first run is one interval from now unless run_immediately.
+
+        With a ``rule`` (see rates.trading_calendar) run times follow the
+        business calendar and ``interval_seconds`` is informational only.
+        """
+        job = Job(name, func, interval_seconds, mode, jitter_seconds, overlap, max_queued, rule)
+        with self._cond:
+            old = self._jobs.get(name)
+            if old is not None:
+                old.cancelled = True
+            self._jobs[name] = job
+            if rule is not None and not run_immediately:
+                job.base_deadline = self._rule_deadline(job)
+            else:
+                job.base_deadline = self.clock() + (0.0 if run_immediately else job.interval)
+            self._push(job)
+            self._cond.notify()
+        return job
+
+    def remove_job(self, name: str) -> bool:
+        with self._cond:
+            job = self._jobs.pop(name, None)
+            if job is None:
+                return False
+            job.cancelled = True
+            self._cond.notify()
+            return True
+
+    def jobs(self) -> List[Job]:
+        with self._cond:
+            return list(self._jobs.values())
+
+    # -- internals (call with self._cond held) -----------------------------
+
+    def _push(self, job: Job) -> None:
+        deadline = job.base_deadline
+        if job.jitter:
+            deadline += random.uniform(0, job.jitter)
+        heapq.heappush(self._heap, (deadline, next(self._seq), job))
+
+    def _rule_deadline(self, job: Job) -> float:
+        job.rule_target, delay = job.rule.next_delay(job.rule_target)
+        return self.clock() + delay
+
+    def _advance(self, job: Job, now: float) -> None:
+        """Move a fixed-rate job to its next deadline, skipping ticks already in the past."""
+        if job.rule is not None:
+            job.base_deadline = self._rule_deadline(job)
+            return
+        job.base_deadline += job.interval
+        if job.base_deadline <= now:
+            behind = math.ceil((now - job.base_deadline) / job.interval)
+            if job.base_deadline + behind * job.interval <= now:
+                behind += 1
+            job.metrics.count("missed", behind)
+            job.base_deadline += behind * job.interval
+
+    def _dispatch(self, job: Job, now: float) -> None:
+        if job.mode == FIXED_RATE:
+            self._advance(job, now)
+            self._push(job)
+        if job.running:
+            if job.overlap == SKIP:
+                job.metrics.count("skipped")
+            elif job.overlap == QUEUE:
+                if job.pending < job.max_queued:
+                    job.pending += 1
+                else:
+                    job.metrics.count("skipped")
+            else:
+                job.pending = 1
+            return
+        self._submit(job)
+
+    def _submit(self, job: Job) -> None:
+        job.running = True
+        self._executor.submit(self._run_job, job)
+
+    def _run_job(self, job: Job) -> None:
+        job.metrics.started()
+        start = time.perf_counter()
+        error = None
+        try:
+            job.func()
+        except Exception as e:
+            error = e
+            logger.exception("scheduled job %s failed", job.name)
+        job.metrics.record(time.perf_counter() - start, job.period, error)
+        with self._cond:
+            job.running = False
+            if not (self._stopped or job.cancelled):
+                if job.pending > 0:
+                    job.pending -= 1
+                    self._submit(job)
+                elif job.mode == FIXED_DELAY:
+                    if job.rule is not None:
+                        job.base_deadline = self._rule_deadline(job)
+                    else:
+                        job.base_deadline = self.clock() + job.interval
+                    self._push(job)
+                    self._cond.notify()
+
+    def _next_wait(self) -> Optional[float]:
+        """Dispatch every due job; return the seconds until the next deadline (None if idle)."""
+        while self._heap:
+            deadline, _, job = self._heap[0]
+            if job.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            now = self.clock()
+            if deadline > now:
+                return deadline - now
+            heapq.heappop(self._heap)
+            self._dispatch(job, now)
+        return None
+
+    def run_pending(self) -> None:
+        """Dispatch every job whose deadline has passed on ``clock()``.
+
+        The timer thread started by ``start()`` does this on its own. With an
+        injected ``executor`` (and usually a fake ``clock``) a caller can
+        instead drive the scheduler by calling this directly.
+        """
+        if self._executor is None:
+            raise RuntimeError("Scheduler has no executor: call start() or pass executor=")
+        with self._cond:
+            if not self._stopped:
+                self._next_wait()
 
     def _run(self):
-        while not self._stop_event.wait(self.interval):
-            try:
-                self.callback()
-            except Exception:
-                # swallow exceptions to keep scheduler running
-                pass
+        with self._cond:
+            while not self._stopped:
+                self._cond.wait(self._next_wait())
+
+    # -- metrics -----------------------------------------------------------
+
+    def inspect(self) -> Dict[str, Dict[str, Any]]:
+        """Per-job configuration, state and run metrics."""
+        now = self.clock()
+        with self._cond:
+            jobs = list(self._jobs.values())
+            out = {}
+            for job in jobs:
+                out[job.name] = {
+                    "interval": job.interval,
+                    "mode": job.mode,
+                    "overlap": job.overlap,
+                    "calendar": job.rule is not None,
+                    "running": job.running,
+                    "pending": job.pending,
+                    "next_run_in": max(0.0, job.base_deadline - now) if not self._stopped else None,
+                }
+        for job in jobs:
+            out[job.name].update(job.metrics.to_dict())
+        return out
+
+    def dump_metrics(self, path: str = METRICS_FILE) -> None:
+        write_metrics(path, self.inspect())
+
+    def enable_metrics_dump(self, path: str = METRICS_FILE, interval_seconds: float = 60) -> Job:
+        """Write ``inspect()`` to ``path`` every ``interval_seconds`` as a scheduled job."""
+        return self.add_job("_metrics_dump", lambda: self.dump_metrics(path), interval_seconds, mode=FIXED_DELAY)
+
+    # -- lifecycle ---------------------------------------------------------
 
     def start(self):
         if self._thread and self._thread.is_alive():
             return
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._run, daemon=True)
+        with self._cond:
+            self._stopped = False
+            if self._own_executor:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler")
+            # rebuild the heap: fixed-delay jobs interrupted by stop() have no entry left
+            now = self.clock()
+            self._heap = []
+            for job in self._jobs.values():
+                job.running = False
+                job.pending = 0
+                job.base_deadline = max(job.base_deadline, now)
+                self._push(job)
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
         self._thread.start()
 
-    def stop(self):
-        if self._thread is None:
-            return
-        self._stop_event.set()
-        self._thread.join(timeout=2)
+    def stop(self, wait: bool = False):
+        """Stop dispatching. In-flight runs finish on their own unless wait=True blocks for them."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
 
 
-__all__ = ["Scheduler"]
+__all__ = ["Scheduler", "Job", "FIXED_RATE", "FIXED_DELAY", "SKIP", "QUEUE", "COALESCE"]
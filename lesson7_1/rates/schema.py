@@ -0,0 +1,179 @@
+"""Compact on-disk schema for cached rate snapshots.
+
+Board rates and per-bank USD quotes are stored column-wise::
+
+    {"schema": 2, "currencies": ["USD", "JPY"], "buy": [31.4, 0.19], "sell": [31.6, 0.2]}
+
+Chinese names come from the ``CURRENCY_NAMES`` code table, so only codes
+are written per row. Readers accept every older shape (the per-row dicts
+written by streamlit_app, normalize_rates output with ``raw`` copies, and
+raw scraped rows with Chinese keys) and upgrade them on the fly.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA_VERSION = 2
+
+# Bank of Taiwan board currencies: ISO code -> Chinese name
+CURRENCY_NAMES = {
+    "USD": "美金",
+    "HKD": "港幣",
+    "GBP": "英鎊",
+    "AUD": "澳幣",
+    "CAD": "加拿大幣",
+    "SGD": "新加坡幣",
+    "CHF": "瑞士法郎",
+    "JPY": "日圓",
+    "ZAR": "南非幣",
+    "SEK": "瑞典幣",
+    "NZD": "紐元",
+    "THB": "泰幣",
+    "PHP": "菲國比索",
+    "IDR": "印尼幣",
+    "EUR": "歐元",
+    "KRW": "韓元",
+    "VND": "越南盾",
+    "MYR": "馬來幣",
+    "CNY": "人民幣",
+}
+_CODES_BY_NAME = {name: code for code, name in CURRENCY_NAMES.items()}
+
+
+def split_label(label: str) -> Tuple[str, str]:
+    """Split a board label such as ``"美金 (USD)"`` into ``("美金", "USD")``.
+
+    Bare names and bare codes are resolved through the code table.
+    """
+    label = (label or "").strip()
+    if "(" in label and ")" in label:
+        name = label.split("(", 1)[0].strip()
+        code = label.split("(", 1)[1].split(")", 1)[0].strip()
+        return name or CURRENCY_NAMES.get(code, code), code
+    if label in CURRENCY_NAMES:
+        return CURRENCY_NAMES[label], label
+    return label, _CODES_BY_NAME.get(label, label)
+
+
+def make_rate(code: str, buy: Optional[float], sell: Optional[float], name: Optional[str] = None) -> Dict[str, Any]:
+    """Build the canonical in-memory rate row."""
+    name = name or CURRENCY_NAMES.get(code, code)
+    return {
+        "currency": name,
+        "name": f"{name} ({code})",
+        "code": code,
+        "buy": buy,
+        "sell": sell,
+    }
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _upgrade_rate_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    if "code" in row:
+        return make_rate(row["code"], row.get("buy"), row.get("sell"), row.get("currency"))
+    # streamlit_app rows carry "name" = "美金 (USD)"; normalize_rates rows carry
+    # the full label in "currency"; raw scraped rows use the Chinese column names
+    label = row.get("name") or row.get("currency") or row.get("幣別") or ""
+    name, code = split_label(label)
+    buy = row.get("buy", row.get("本行即期買入"))
+    sell = row.get("sell", row.get("本行即期賣出"))
+    return make_rate(code, _to_float(buy), _to_float(sell), name)
+
+
+def encode_rates(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Canonical (or legacy) rate rows -> columnar payload."""
+    rows = [_upgrade_rate_row(r) for r in rows or []]
+    out: Dict[str, Any] = {
+        "schema": SCHEMA_VERSION,
+        "currencies": [r["code"] for r in rows],
+        "buy": [r["buy"] for r in rows],
+        "sell": [r["sell"] for r in rows],
+    }
+    # only codes missing from the built-in table need their names stored
+    extra = {r["code"]: r["currency"] for r in rows if CURRENCY_NAMES.get(r["code"]) != r["currency"]}
+    if extra:
+        out["names"] = extra
+    return out
+
+
+def decode_rates(payload: Any) -> List[Dict[str, Any]]:
+    """Columnar payload (or any legacy list shape) -> canonical rate rows."""
+    if not payload:
+        return []
+    if isinstance(payload, list):
+        return [_upgrade_rate_row(r) for r in payload]
+    names = payload.get("names") or {}
+    return [
+        make_rate(code, buy, sell, names.get(code))
+        for code, buy, sell in zip(payload["currencies"], payload["buy"], payload["sell"])
+    ]
+
+
+def encode_banks(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-bank USD quotes -> columnar payload."""
+    rows = rows or []
+    return {
+        "schema": SCHEMA_VERSION,
+        "banks": [r.get("bank", "") for r in rows],
+        "buy": [_to_float(r.get("buy")) for r in rows],
+        "sell": [_to_float(r.get("sell")) for r in rows],
+    }
+
+
+def decode_banks(payload: Any) -> List[Dict[str, Any]]:
+    if not payload:
+        return []
+    if isinstance(payload, list):
+        return [{"bank": r.get("bank", ""), "buy": _to_float(r.get("buy")), "sell": _to_float(r.get("sell"))} for r in payload]
+    return [
+        {"bank": bank, "buy": buy, "sell": sell}
+        for bank, buy, sell in zip(payload["banks"], payload["buy"], payload["sell"])
+    ]
+
+
+# segment name -> (encode, decode); segments not listed are stored as-is
+CODECS = {
+    "fx": (encode_rates, decode_rates),
+    "banks_usd": (encode_banks, decode_banks),
+}
+
+
+def encode_segment(name: str, data: Any) -> Any:
+    codec = CODECS.get(name)
+    return codec[0](data) if codec else data
+
+
+def decode_segment(name: str, data: Any) -> Any:
+    codec = CODECS.get(name)
+    return codec[1](data) if codec else data
+
+
+def upgrade_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Upgrade a legacy single-file cache payload to canonical rows."""
+    out = dict(payload)
+    out["rates"] = decode_rates(payload.get("rates"))
+    if "all_banks_usd" in payload:
+        out["all_banks_usd"] = decode_banks(payload.get("all_banks_usd"))
+    return out
+
+
+__all__ = [
+    "SCHEMA_VERSION",
+    "CURRENCY_NAMES",
+    "split_label",
+    "make_rate",
+    "encode_rates",
+    "decode_rates",
+    "encode_banks",
+    "decode_banks",
+    "encode_segment",
+    "decode_segment",
+    "upgrade_payload",
+]
@@ -0,0 +1,119 @@
+"""Immutable, per-version view of the merged rates payload for the UI.
+
+``snapshot_for(payload)`` returns the same ``RatesSnapshot`` object for as
+long as the data version stays the same, so a Streamlit rerun loads the
+data once and every section reads the prebuilt fields (tradeable rows,
+the currency index, the per-bank USD comparison, display timestamps, ...) instead of looking the cache up again.
+"""
+
+import threading
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from .banks import REFERENCE_BANK, BankComparison
+from .quotes import CurrencyIndex
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+def _freeze_rows(rows: Any) -> Tuple[Mapping[str, Any], ...]:
+    return tuple(MappingProxyType(dict(r)) for r in rows or ())
+
+
+def format_update_time(source_time: Optional[str], fallback_iso: Optional[str]) -> Optional[str]:
+    """Site time (``2025/12/18 10:00``) if available, else the cache time in local time."""
+    if source_time:
+        try:
+            return datetime.strptime(source_time, "%Y/%m/%d %H:%M").strftime("%Y年%m月%d日 %H:%M:%S")
+        except (TypeError, ValueError):
+            pass
+    if fallback_iso:
+        try:
+            # cache 是 ISO 格式，例如 2025-12-17T05:16:00+00:00
+            dt = datetime.fromisoformat(fallback_iso)
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone().strftime("%Y年%m月%d日 %H:%M:%S")
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+class RatesSnapshot:
+    """Read-only rates data plus everything the page derives from it."""
+
+    __slots__ = (
+        "version",
+        "rates",
+        "tradeable",
+        "index",
+        "all_banks_usd",
+        "usd_banks",
+        "gold_price",
+        "updated_at",
+        "rates_update_time",
+        "rates_updated_display",
+        "gold_updated_display",
+        "__weakref__",
+    )
+
+    def __init__(self, payload: Dict[str, Any], version: str):
+        setattr_ = object.__setattr__
+        rates = _freeze_rows(payload.get("rates"))
+        gold = payload.get("gold_price")
+        setattr_(self, "version", version)
+        setattr_(self, "rates", rates)
+        setattr_(self, "tradeable", tuple(r for r in rates if r.get("buy") and r.get("sell")))
+        setattr_(self, "index", CurrencyIndex(self.tradeable))
+        setattr_(self, "all_banks_usd", _freeze_rows(payload.get("all_banks_usd")))
+        setattr_(self, "usd_banks", BankComparison(self.all_banks_usd or self._board_usd()))
+        setattr_(self, "gold_price", MappingProxyType(dict(gold)) if isinstance(gold, dict) else _EMPTY)
+        setattr_(self, "updated_at", payload.get("updated_at"))
+        setattr_(self, "rates_update_time", payload.get("rates_update_time"))
+        setattr_(self, "rates_updated_display", format_update_time(self.rates_update_time, self.updated_at))
+        setattr_(self, "gold_updated_display", format_update_time(self.gold_price.get("update_time"), self.updated_at))
+
+    def _board_usd(self) -> Tuple[Mapping[str, Any], ...]:
+        # no per-bank quotes: compare with the Bank of Taiwan board rate alone
+        return tuple(
+            {"bank": REFERENCE_BANK, "buy": r.get("buy"), "sell": r.get("sell")}
+            for r in self.rates if r.get("code") == "USD"
+        )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("RatesSnapshot is immutable")
+
+    def __bool__(self) -> bool:
+        # False only when there is no payload at all (an empty rates list still renders)
+        return bool(self.version)
+
+    def __repr__(self) -> str:
+        return f"RatesSnapshot(version={self.version!r}, rates={len(self.rates)})"
+
+
+def payload_version(payload: Optional[Dict[str, Any]]) -> str:
+    """Segment version string, or the timestamp for legacy single-file payloads."""
+    if not payload:
+        return ""
+    return payload.get("version") or f"legacy:{payload.get('updated_at', '')}"
+
+
+_memo_lock = threading.Lock()
+_memo: Dict[str, RatesSnapshot] = {}
+
+
+def snapshot_for(payload: Optional[Dict[str, Any]]) -> RatesSnapshot:
+    """The snapshot for ``payload``'s version, built only when the version changes."""
+    version = payload_version(payload)
+    with _memo_lock:
+        snap = _memo.get("current")
+        if snap is not None and snap.version == version:
+            return snap
+    snap = RatesSnapshot(payload or {}, version)
+    with _memo_lock:
+        _memo["current"] = snap
+    return snap
+
+
+__all__ = ["RatesSnapshot", "snapshot_for", "payload_version", "format_update_time"]
@@ -0,0 +1,50 @@
+"""Per-source fetchers that refresh a single cache segment each."""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .crawler import fetch_rates, fetch_usd_rates_all_banks, fetch_gold_price
+from .normalize import normalize_rates
+from .usd_deposit import fetch_usd_deposit_rates
+from .storage import write_segment
+
+
+def fetch_fx() -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    raw_rates, rates_update_time = fetch_rates()
+    return normalize_rates(raw_rates), rates_update_time
+
+
+def fetch_banks_usd() -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return fetch_usd_rates_all_banks(), None
+
+
+def fetch_gold() -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    gold_price = fetch_gold_price()
+    # all-None while trading is suspended; keep the last real prices rather than overwrite them
+    if gold_price.get("buy") is None and gold_price.get("sell") is None:
+        return None, None
+    return gold_price, gold_price.get("update_time")
+
+
+def fetch_usd_deposit() -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return fetch_usd_deposit_rates(), None
+
+
+# segment name -> fetcher returning (data, source_time)
+SOURCES: Dict[str, Callable[[], Tuple[Any, Optional[str]]]] = {
+    "fx": fetch_fx,
+    "banks_usd": fetch_banks_usd,
+    "gold": fetch_gold,
+    "usd_deposit": fetch_usd_deposit,
+}
+
+
+def refresh_segment(name: str) -> bool:
+    """Fetch one source and write only its segment. Returns False if nothing was fetched."""
+    data, source_time = SOURCES[name]()
+    if not data:
+        return False
+    write_segment(name, data, source_time)
+    return True
+
+
+__all__ = ["SOURCES", "refresh_segment", "fetch_fx", "fetch_banks_usd", "fetch_gold", "fetch_usd_deposit"]
@@ -0,0 +1,118 @@
+"""Lightweight timing spans with fixed-bucket histograms.
+
+Used by streamlit_app to measure what each part of a page run costs (data
+load, conversion, each table). A ``SpanRecorder`` keeps one ``SpanStats``
+per span name; the app holds one recorder per session and one per process
+and dumps the process-wide one to ``RENDER_METRICS_FILE``.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+RENDER_METRICS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "render_metrics.json")
+
+# upper bounds (milliseconds) of the histogram buckets; the last bucket is open-ended
+RENDER_BUCKETS_MS: Sequence[float] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class SpanStats:
+    """Count, total, max and a histogram of one span's durations (ms)."""
+
+    def __init__(self, buckets: Sequence[float] = RENDER_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.histogram = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms: Optional[float] = None
+
+    def record(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.last_ms = ms
+        self.histogram[bisect.bisect_left(self.buckets, ms)] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile (capped at the max seen)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.histogram):
+            seen += n
+            if n and seen >= rank:
+                bound = min(self.buckets[i], self.max_ms) if i < len(self.buckets) else self.max_ms
+                return round(bound, 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b:g}ms" for b in self.buckets] + [f">{self.buckets[-1]:g}ms"]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max_ms, 3),
+            "last_ms": None if self.last_ms is None else round(self.last_ms, 3),
+            "histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class SpanRecorder:
+    """Thread-safe span name -> SpanStats."""
+
+    def __init__(self, buckets: Sequence[float] = RENDER_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._spans: Dict[str, SpanStats] = {}
+        self._last_flush = 0.0
+        self.started_at = datetime.now(timezone.utc).isoformat()
+
+    def record(self, name: str, ms: float) -> None:
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats(self.buckets)
+            stats.record(ms)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def flush_due(self, interval_seconds: float) -> bool:
+        """True at most once per ``interval_seconds`` (callers then write the snapshot)."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_flush < interval_seconds:
+                return False
+            self._last_flush = now
+            return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self.started_at = datetime.now(timezone.utc).isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = {name: stats.to_dict() for name, stats in sorted(self._spans.items())}
+            started_at = self.started_at
+        return {
+            "pid": os.getpid(),
+            "since": started_at,
+            "written_at": datetime.now(timezone.utc).isoformat(),
+            "spans": spans,
+        }
+
+
+__all__ = ["SpanStats", "SpanRecorder", "RENDER_BUCKETS_MS", "RENDER_METRICS_FILE"]
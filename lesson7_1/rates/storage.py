@@ -1,92 +1,449 @@
 import json
-from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from .events import Event, EventBus, EventLog, diff_segment
+from .locking import cache_lock
+from .schema import SCHEMA_VERSION, encode_segment, decode_segment, upgrade_payload
+
+logger = logging.getLogger(__name__)
+
 ROOT = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(ROOT, "data")
 CACHE_FILE = os.path.join(DATA_DIR, "rates_cache.json")
+SEGMENTS_DIR = os.path.join(DATA_DIR, "segments")
 # backup dir inside repository to keep a recent copy
 BACKUP_DIR = os.path.join(ROOT, "backup", "data")
 BACKUP_CACHE_FILE = os.path.join(BACKUP_DIR, "rates_cache.json")
+BACKUP_SEGMENTS_DIR = os.path.join(BACKUP_DIR, "segments")
+
+# Each source is stored in its own segment file with its own freshness window.
+# Board rates move during the day; deposit rates change a few times a year.
+SEGMENT_TTLS = {
+    "fx": 600,
+    "banks_usd": 600,
+    "gold": 600,
+    "usd_deposit": 86400,
+}
+# segments the Streamlit page needs; usd_deposit is refreshed by the updater only
+CORE_SEGMENTS = ("fx", "banks_usd", "gold")
+
+# key in the merged (legacy-shaped) payload for each segment
+_MERGED_KEYS = {
+    "fx": "rates",
+    "banks_usd": "all_banks_usd",
+    "gold": "gold_price",
+    "usd_deposit": "usd_deposit",
+}
+
+# Compact output by default; set RATES_JSON_PRETTY=1 to get indented files for debugging
+PRETTY_JSON = os.environ.get("RATES_JSON_PRETTY", "") not in ("", "0")
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+else:
+    JSON_BACKEND = "json"
+
+# path -> ((mtime_ns, size), decoded payload)
+_file_memo: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+_merged_memo: Dict[str, Any] = {}
 
 
 def _ensure_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
-    os.makedirs(BACKUP_DIR, exist_ok=True)
+    os.makedirs(SEGMENTS_DIR, exist_ok=True)
+    os.makedirs(BACKUP_SEGMENTS_DIR, exist_ok=True)
 
 
-def write_cache(rates: Any, all_banks_usd: Any = None, gold_price: Any = None, rates_update_time: str = None) -> None:
-    _ensure_dir()
-    # store as UTC with explicit tzinfo to avoid ambiguity
-    payload = {"updated_at": datetime.now(timezone.utc).isoformat(), "rates": rates}
-    if all_banks_usd is not None:
-        payload["all_banks_usd"] = all_banks_usd
-    if gold_price is not None:
-        payload["gold_price"] = gold_price
-    if rates_update_time is not None:
-        payload["rates_update_time"] = rates_update_time
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    # Also write a backup copy for resiliency
+def dumps(obj: Any, pretty: Optional[bool] = None) -> bytes:
+    """Serialize to UTF-8 JSON bytes with the fastest available backend."""
+    if pretty is None:
+        pretty = PRETTY_JSON
     try:
-        with open(BACKUP_CACHE_FILE, "w", encoding="utf-8") as bf:
-            json.dump(payload, bf, ensure_ascii=False, indent=2)
-        # also keep a timestamped version for historical debugging
-        ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        ts_file = os.path.join(BACKUP_DIR, f"rates_cache_{ts}.json")
-        with open(ts_file, "w", encoding="utf-8") as tf:
-            json.dump(payload, tf, ensure_ascii=False)
-    except Exception:
-        # best-effort backup; do not raise to avoid breaking callers
+        if JSON_BACKEND == "orjson":
+            option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if pretty else 0)
+            return orjson.dumps(obj, option=option)
+        if JSON_BACKEND == "msgspec":
+            data = msgspec.json.encode(obj)
+            return msgspec.json.format(data, indent=2) if pretty else data
+    except TypeError:
+        # e.g. pandas/numpy scalars from read_html rows; stdlib json copes with those
         pass
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 
-def read_cache() -> Optional[Dict[str, Any]]:
-    # Try primary cache
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
+def loads(data: bytes) -> Any:
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(data)
+    if JSON_BACKEND == "msgspec":
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def _write_json(path: str, payload: Any, pretty: Optional[bool] = None) -> None:
+    # write to a temp file and swap it in so readers never see a torn file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dumps(payload, pretty))
+    os.replace(tmp, path)
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_json(path: str, decode: Optional[Callable[[Any], Any]] = None) -> Optional[Dict[str, Any]]:
+    """Load a JSON file, memoized on its (mtime, size) so unchanged files are parsed once.
+
+    ``decode`` upgrades the on-disk shape; its result is what gets memoized.
+    """
+    key = _stat_key(path)
+    if key is None:
+        return None
+    memo = _file_memo.get(path)
+    if memo is not None and memo[0] == key:
+        return memo[1]
+    try:
+        with open(path, "rb") as f:
+            payload = loads(f.read())
+        if decode is not None:
+            payload = decode(payload)
+    except Exception:
+        return None
+    _file_memo[path] = (key, payload)
+    return payload
 
-    # Fallback to backup cache copy
-    if os.path.exists(BACKUP_CACHE_FILE):
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        t = datetime.fromisoformat(value)
+    except Exception:
+        return None
+    # if naive, assume it's UTC (legacy data)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t
+
+
+def _segment_path(name: str, base_dir: Optional[str] = None) -> str:
+    if name not in SEGMENT_TTLS:
+        raise KeyError(f"unknown cache segment: {name}")
+    return os.path.join(base_dir or SEGMENTS_DIR, f"{name}.json")
+
+
+def _decode_envelope(envelope: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(envelope)
+    out["data"] = decode_segment(envelope.get("segment", ""), envelope.get("data"))
+    return out
+
+
+def _event_checkpoint() -> List[Event]:
+    """Every current value as an event, for the event log's checkpoints (runs under the cache lock)."""
+    events: List[Event] = []
+    for name in SEGMENT_TTLS:
+        envelope = _read_segment_file(name)
+        if envelope is not None:
+            events.extend(diff_segment(name, None, envelope.get("data"), envelope.get("version", 0),
+                                       envelope.get("source_time")))
+    return events
+
+
+# change events: appended under the cache lock in commit order, then published in-process
+_event_log = EventLog(checkpoint=_event_checkpoint)
+_event_bus = EventBus(_event_log)
+
+# callables run after every segment commit as hook(name, old_data, new_data, source_time)
+_commit_hooks: List[Callable[[str, Any, Any, Optional[str]], None]] = []
+
+
+def add_commit_hook(hook: Callable[[str, Any, Any, Optional[str]], None]) -> None:
+    """Call ``hook(name, old_data, new_data, source_time)`` after each ``write_segment``.
+
+    Data is in the canonical decoded shape; ``old_data`` is None for a new
+    segment. Hooks run in the writer's thread, outside the cache lock, and
+    their exceptions are logged instead of failing the write.
+    """
+    if hook not in _commit_hooks:
+        _commit_hooks.append(hook)
+
+
+def remove_commit_hook(hook: Callable[[str, Any, Any, Optional[str]], None]) -> None:
+    if hook in _commit_hooks:
+        _commit_hooks.remove(hook)
+
+
+def _run_commit_hooks(name: str, old_data: Any, new_data: Any, source_time: Optional[str]) -> None:
+    for hook in list(_commit_hooks):
         try:
-            with open(BACKUP_CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            hook(name, old_data, new_data, source_time)
         except Exception:
-            pass
+            logger.exception("commit hook %r failed for segment %s", hook, name)
 
-    # Final fallback to sample bundled data
-    sample = os.path.join(DATA_DIR, "sample_cache.json")
-    if os.path.exists(sample):
+
+def write_segment(name: str, data: Any, source_time: Optional[str] = None) -> int:
+    """Write one source's data to its own segment file and return the new version.
+
+    Only this segment's file is rewritten; other sources are untouched.
+    """
+    path = _segment_path(name)
+    _ensure_dir()
+    with cache_lock(shared=False):
+        previous = _read_json(path, _decode_envelope) or {}
+        payload = {
+            "schema": SCHEMA_VERSION,
+            "segment": name,
+            "version": int(previous.get("version", 0)) + 1,
+            # store as UTC with explicit tzinfo to avoid ambiguity
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "source_time": source_time,
+            "data": encode_segment(name, data),
+        }
+        _write_json(path, payload)
+        # Also write a backup copy for resiliency
         try:
-            with open(sample, "r", encoding="utf-8") as f:
-                return json.load(f)
+            _write_json(_segment_path(name, BACKUP_SEGMENTS_DIR), payload)
         except Exception:
+            # best-effort backup; do not raise to avoid breaking callers
             pass
+        new_data = decode_segment(name, payload["data"])
+        events = diff_segment(name, previous.get("data"), new_data, payload["version"], source_time)
+        try:
+            _event_log.append(events)
+        except OSError:
+            logger.exception("could not append change events for segment %s", name)
+            events = []
+    _event_bus.publish(events)
+    if _commit_hooks:
+        _run_commit_hooks(name, previous.get("data"), new_data, source_time)
+    return payload["version"]
+
 
+def _read_segment_file(name: str) -> Optional[Dict[str, Any]]:
+    for base in (SEGMENTS_DIR, BACKUP_SEGMENTS_DIR):
+        payload = _read_json(_segment_path(name, base), _decode_envelope)
+        if payload is not None:
+            return payload
     return None
 
 
-def is_expired(max_age_seconds: int = 600) -> bool:
-    """Return True if cached data is older than max_age_seconds."""
-    payload = read_cache()
-    if not payload:
-        return True
-    updated = payload.get("updated_at")
-    if not updated:
-        return True
+def read_segment(name: str) -> Optional[Dict[str, Any]]:
+    """Return the stored segment envelope (version, updated_at, source_time, data)."""
+    lock = cache_lock(shared=True)
+    # on timeout read anyway: writes are atomic renames, so the file is consistent
+    locked = lock.acquire()
     try:
-        t = datetime.fromisoformat(updated)
-    except Exception:
+        return _read_segment_file(name)
+    finally:
+        if locked:
+            lock.release()
+
+
+def peek_segment(name: str) -> Optional[Dict[str, Any]]:
+    """``read_segment`` without the shared lock, for polling.
+
+    Costs one ``stat`` while the file is unchanged (the parsed envelope is
+    memoized on mtime and size) and returns the same object each time.
+    Safe without the lock because writes are atomic renames.
+    """
+    return _read_segment_file(name)
+
+
+def segment_age(name: str) -> Optional[float]:
+    """Seconds since the segment was last written, or None if it was never written."""
+    return envelope_age(read_segment(name))
+
+
+def envelope_age(envelope: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Seconds since a segment envelope was written, or None if unknown."""
+    t = _parse_time((envelope or {}).get("updated_at"))
+    if t is None:
+        return None
+    return (datetime.now(timezone.utc) - t).total_seconds()
+
+
+def is_segment_expired(name: str, max_age_seconds: Optional[int] = None) -> bool:
+    """Return True if the segment is missing or older than its TTL (or max_age_seconds)."""
+    age = segment_age(name)
+    if age is None:
         return True
-    # if naive, assume it's UTC (legacy data)
-    if t.tzinfo is None:
-        t = t.replace(tzinfo=timezone.utc)
-    return (datetime.now(timezone.utc) - t) > timedelta(seconds=max_age_seconds)
+    ttl = SEGMENT_TTLS[name] if max_age_seconds is None else max_age_seconds
+    return age > ttl
+
+
+def read_events(offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Event], int]:
+    """Change events at or after ``offset`` and the offset to resume from.
+
+    Cheap to poll: when nothing was committed since ``offset`` this is one
+    ``open`` + ``seek``. Works across processes.
+    """
+    return _event_log.read(offset, limit)
+
+
+def events_offset() -> int:
+    """Current end of the event log; subscribe or poll from here for new changes only."""
+    return _event_log.end_offset()
+
+
+def events_window_start(since: float) -> int:
+    """Offset to read from to see every change since ``since`` (epoch seconds), skipping older segments.
+
+    Seed the reader with ``read_checkpoint`` at the same offset: it holds the
+    values already in force there.
+    """
+    return _event_log.window_start(since)
+
+
+def read_checkpoint(offset: int) -> List[Event]:
+    """Every value in force at a segment start of the event log, as events with ``old`` None."""
+    return _event_log.read_checkpoint(offset)
+
+
+def subscribe(callback: Callable[[List[Event]], None], from_offset: Optional[int] = None) -> Callable[[], None]:
+    """Receive change events committed by this process; returns an unsubscribe function.
+
+    Pass ``from_offset`` to replay the log from there first (including
+    commits made by other processes).
+    """
+    return _event_bus.subscribe(callback, from_offset)
+
+
+def snapshot_version() -> str:
+    """Cheap identity for the current data: changes whenever any segment is rewritten."""
+    return (read_merged() or {}).get("version", "")
+
+
+def merge_segments(envelopes: Dict[str, Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Combine segment envelopes into the legacy payload shape streamlit_app expects."""
+    present = {name: env for name, env in envelopes.items() if env is not None}
+    if not present:
+        return None
+    times = [t for t in (_parse_time(env.get("updated_at")) for env in present.values()) if t]
+    payload: Dict[str, Any] = {
+        "updated_at": max(times).isoformat() if times else None,
+        "version": _version_of(present),
+        "segments": {
+            name: {"version": env.get("version"), "updated_at": env.get("updated_at"), "source_time": env.get("source_time")}
+            for name, env in present.items()
+        },
+    }
+    for name, env in present.items():
+        payload[_MERGED_KEYS[name]] = env.get("data")
+    if "fx" in present:
+        payload["rates_update_time"] = present["fx"].get("source_time")
+    payload.setdefault("rates", [])
+    return payload
+
+
+def _version_of(present: Dict[str, Dict[str, Any]]) -> str:
+    return "|".join(f"{name}:{env.get('version', 0)}" for name, env in present.items())
+
+
+def read_merged() -> Optional[Dict[str, Any]]:
+    """Merge all segments into the payload shape streamlit_app expects.
+
+    The merged dict is rebuilt only when a segment file changed, so this is
+    a handful of ``os.stat`` calls on the hot path. Treat it as read-only.
+    """
+    lock = cache_lock(shared=True)
+    locked = lock.acquire()
+    try:
+        envelopes = {name: _read_segment_file(name) for name in SEGMENT_TTLS}
+    finally:
+        if locked:
+            lock.release()
+    present = {name: env for name, env in envelopes.items() if env is not None}
+    if not present:
+        return None
+    version = _version_of(present)
+    if _merged_memo.get("version") == version:
+        return _merged_memo["payload"]
+    payload = merge_segments(present)
+    _merged_memo["version"] = version
+    _merged_memo["payload"] = payload
+    return payload
+
+
+def write_cache(rates: Any, all_banks_usd: Any = None, gold_price: Any = None, rates_update_time: str = None) -> None:
+    """Legacy entry point: writes each provided source to its own segment."""
+    write_segment("fx", rates, rates_update_time)
+    if all_banks_usd is not None:
+        write_segment("banks_usd", all_banks_usd)
+    if gold_price is not None:
+        write_segment("gold", gold_price, (gold_price or {}).get("update_time"))
+
+
+def read_cache() -> Optional[Dict[str, Any]]:
+    merged = read_merged()
+    if merged is not None:
+        return merged
+
+    # No segments yet: fall back to the legacy single-file cache, its backup
+    # copy, then sample bundled data
+    lock = cache_lock(shared=True)
+    locked = lock.acquire()
+    try:
+        for path in (CACHE_FILE, BACKUP_CACHE_FILE, os.path.join(DATA_DIR, "sample_cache.json")):
+            payload = _read_json(path, upgrade_payload)
+            if payload is not None:
+                return payload
+        return None
+    finally:
+        if locked:
+            lock.release()
+
+
+def is_expired(max_age_seconds: Optional[int] = None, segments: Iterable[str] = CORE_SEGMENTS) -> bool:
+    """Return True if any of the given segments is older than its TTL.
+
+    ``max_age_seconds`` overrides the per-segment TTLs when given.
+    """
+    return any(is_segment_expired(name, max_age_seconds) for name in segments)
 
 
-__all__ = ["write_cache", "read_cache", "is_expired"]
+__all__ = [
+    "write_cache",
+    "read_cache",
+    "is_expired",
+    "write_segment",
+    "read_segment",
+    "peek_segment",
+    "read_merged",
+    "add_commit_hook",
+    "remove_commit_hook",
+    "read_events",
+    "events_offset",
+    "events_window_start",
+    "read_checkpoint",
+    "subscribe",
+    "merge_segments",
+    "envelope_age",
+    "segment_age",
+    "is_segment_expired",
+    "snapshot_version",
+    "SEGMENT_TTLS",
+    "CORE_SEGMENTS",
+    "dumps",
+    "loads",
+    "JSON_BACKEND",
+]
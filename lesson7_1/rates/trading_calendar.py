@@ -0,0 +1,175 @@
+"""Taipei business calendar for scheduling rate refreshes.
+
+Bank of Taiwan boards only move during banking hours on business days, so
+refreshing all night and over the weekend is wasted work. A
+``TradingCalendar`` knows the sessions, weekends and a loadable holiday
+list; a ``CalendarRule`` turns that into "every N seconds during session,
+once at close, never on holidays" run times for ``Scheduler`` and
+``AsyncScheduler``.
+"""
+
+import json
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Taiwan has no DST, so a fixed offset avoids depending on tzdata (missing on Windows)
+TAIPEI_TZ = timezone(timedelta(hours=8), "Asia/Taipei")
+
+# Bank of Taiwan board rates are quoted from opening until the afternoon close
+DEFAULT_SESSIONS: Sequence[Tuple[time, time]] = ((time(9, 0), time(16, 0)),)
+WEEKEND_DAYS = (5, 6)  # Saturday, Sunday
+
+# how far ahead next_run looks for a business day before giving up
+_MAX_LOOKAHEAD_DAYS = 60
+
+
+def _parse_hhmm(value: str) -> time:
+    hour, minute = value.split(":")
+    return time(int(hour), int(minute))
+
+
+class TradingCalendar:
+    def __init__(
+        self,
+        sessions: Sequence[Tuple[time, time]] = DEFAULT_SESSIONS,
+        holidays: Iterable[date] = (),
+        weekend_days: Sequence[int] = WEEKEND_DAYS,
+        tz: timezone = TAIPEI_TZ,
+    ):
+        self.sessions = [tuple(s) for s in sessions]
+        self.holidays = set(holidays)
+        self.weekend_days = set(weekend_days)
+        self.tz = tz
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "TradingCalendar":
+        """Load holidays (and optionally sessions) from a JSON file.
+
+        Format::
+
+            {"holidays": ["2026-01-01", ...], "sessions": [["09:00", "16:00"]]}
+
+        A missing file yields the default calendar with no holidays.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return cls(**kwargs)
+        holidays = [date.fromisoformat(d) for d in payload.get("holidays", [])]
+        if payload.get("sessions") and "sessions" not in kwargs:
+            kwargs["sessions"] = [(_parse_hhmm(a), _parse_hhmm(b)) for a, b in payload["sessions"]]
+        return cls(holidays=holidays, **kwargs)
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def is_business_day(self, d: date) -> bool:
+        return d.weekday() not in self.weekend_days and d not in self.holidays
+
+    def sessions_on(self, d: date) -> List[Tuple[datetime, datetime]]:
+        """(open, close) datetimes for ``d``; empty on weekends and holidays."""
+        if not self.is_business_day(d):
+            return []
+        return [
+            (datetime.combine(d, start, self.tz), datetime.combine(d, end, self.tz))
+            for start, end in self.sessions
+        ]
+
+    def in_session(self, when: Optional[datetime] = None) -> bool:
+        when = (when or self.now()).astimezone(self.tz)
+        return any(start <= when < end for start, end in self.sessions_on(when.date()))
+
+
+class CalendarRule:
+    """When a calendar-aware job should run.
+
+    - ``session_interval``: run every N seconds during sessions, on a grid
+      anchored at the session open (so runs do not drift)
+    - ``at_open`` / ``at_close``: run once exactly at open / close
+    - ``off_session_interval``: optional slower cadence outside sessions on
+      business days (``None`` = never)
+
+    Weekends and holidays never produce runs.
+    """
+
+    def __init__(
+        self,
+        calendar: TradingCalendar,
+        session_interval: Optional[float] = None,
+        at_open: bool = False,
+        at_close: bool = True,
+        off_session_interval: Optional[float] = None,
+    ):
+        if not (session_interval or at_open or at_close or off_session_interval):
+            raise ValueError("CalendarRule would never run")
+        self.calendar = calendar
+        self.session_interval = session_interval
+        self.at_open = at_open
+        self.at_close = at_close
+        self.off_session_interval = off_session_interval
+
+    def _in_any(self, t: datetime, sessions: List[Tuple[datetime, datetime]]) -> Optional[datetime]:
+        for start, end in sessions:
+            if start <= t < end:
+                return end
+        return None
+
+    def _first_on_day(self, d: date, after: datetime) -> Optional[datetime]:
+        sessions = self.calendar.sessions_on(d)
+        if not sessions:
+            return None
+        candidates = []
+        for start, end in sessions:
+            if self.session_interval:
+                if after < start:
+                    candidates.append(start)
+                else:
+                    k = math.floor((after - start).total_seconds() / self.session_interval) + 1
+                    t = start + timedelta(seconds=k * self.session_interval)
+                    if t < end:
+                        candidates.append(t)
+            elif self.at_open and start > after:
+                candidates.append(start)
+            if self.at_close and end > after:
+                candidates.append(end)
+        if self.off_session_interval:
+            day_start = datetime.combine(d, time(0), self.calendar.tz)
+            step = self.off_session_interval
+            k = max(0, math.floor((after - day_start).total_seconds() / step) + 1)
+            t = day_start + timedelta(seconds=k * step)
+            while t.date() == d:
+                end = self._in_any(t, sessions)
+                if end is None:
+                    candidates.append(t)
+                    break
+                # grid point falls inside a session: jump past it
+                k = math.ceil((end - day_start).total_seconds() / step)
+                t = day_start + timedelta(seconds=k * step)
+        return min(candidates) if candidates else None
+
+    def next_run(self, after: Optional[datetime] = None) -> datetime:
+        """First run time strictly after ``after`` (default: now)."""
+        after = (after or self.calendar.now()).astimezone(self.calendar.tz)
+        d = after.date()
+        for _ in range(_MAX_LOOKAHEAD_DAYS):
+            t = self._first_on_day(d, after)
+            if t is not None:
+                return t
+            d += timedelta(days=1)
+        raise ValueError(f"no business day within {_MAX_LOOKAHEAD_DAYS} days of {after:%Y-%m-%d}")
+
+    def next_delay(self, previous: Optional[datetime] = None) -> Tuple[datetime, float]:
+        """Next run time after ``max(now, previous)`` and the seconds until it.
+
+        Passing the previous target keeps a run that fires a hair early (wall
+        clock vs monotonic skew) from being scheduled twice.
+        """
+        now = self.calendar.now()
+        after = max(now, previous) if previous is not None else now
+        target = self.next_run(after)
+        return target, max(0.0, (target - now).total_seconds())
+
+
+__all__ = ["TAIPEI_TZ", "DEFAULT_SESSIONS", "TradingCalendar", "CalendarRule"]
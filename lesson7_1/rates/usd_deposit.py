@@ -3,9 +3,12 @@ import pandas as pd
 from bs4 import BeautifulSoup
 from typing import List, Dict, Any
 
+from .crawler import upstream_url
+
+
 def fetch_usd_deposit_rates(url: str = "https://www.cardu.com.tw/news/detail.php?nt_pk=6&ns_pk=38413") -> List[Dict[str, Any]]:
     """爬取台灣各銀行美元定存利率表格"""
-    resp = requests.get(url, timeout=15)
+    resp = requests.get(upstream_url(url), timeout=15)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
     # 找到標題為「美元定存利率比較表」的表格
@@ -1,8 +1,31 @@
+"""Incremental, compressed backups of the rates cache.
+
+    python scripts/backup_rates.py                    # back up (skips unchanged content), then pack
+    python scripts/backup_rates.py restore --at 2026-10-19T10:00+08:00 [--output f.json | --apply]
+    python scripts/backup_rates.py verify             # one streaming pass over every archive
+    python scripts/backup_rates.py list
+    python scripts/backup_rates.py migrate [--remove] # import old rates_cache_<ts>.json files
+
+Layout under backup/data:
+
+    index.jsonl                 one line per distinct snapshot, sorted by ts: {"ts", "hash", "day"}
+    snapshots/<sha256>.json     today's snapshots (rate data only), content-addressed
+    archives/<YYYY-MM-DD>.jsonl.xz   older days, one {"hash", "payload"} line per distinct snapshot
+    rates_cache.json            latest snapshot (also read by rates.storage as a fallback)
+"""
+
 from pathlib import Path
 from datetime import datetime, timezone
-import shutil
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import lzma
 import os
 import sys
+import time
 
 ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = ROOT / 'data'
@@ -10,37 +33,351 @@ CACHE_FILE = DATA_DIR / 'rates_cache.json'
 BACKUP_DIR = ROOT / 'backup' / 'data'
 
 LOG_FILE = BACKUP_DIR / 'backup.log'
+INDEX_FILE = BACKUP_DIR / 'index.jsonl'
+SNAPSHOT_DIR = BACKUP_DIR / 'snapshots'
+ARCHIVE_DIR = BACKUP_DIR / 'archives'
+LOCK_FILE = BACKUP_DIR / '.backup.lock'
+
+# the rate data that makes up a snapshot; versions and write timestamps are left out of
+# the stored copy (and so of its hash) so rewriting identical rates does not add a backup
+SNAPSHOT_KEYS = ('rates', 'all_banks_usd', 'gold_price', 'usd_deposit', 'rates_update_time')
+
+# archive suffix -> opener; lzma compresses these near-identical snapshots far better
+COMPRESSORS = {
+    '.jsonl.xz': lzma.open,
+    '.jsonl.gz': gzip.open,
+}
+DEFAULT_SUFFIX = '.jsonl.xz'
+
+sys.path.insert(0, str(ROOT))
+from rates.storage import read_merged, write_cache, write_segment  # noqa: E402
+from rates.jsonlog import setup_json_logging  # noqa: E402
+from rates.locking import FileLock  # noqa: E402
+
+logger = logging.getLogger('rates.backup')
+
 
 def ensure_dirs():
     BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def canonical_bytes(payload):
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_ts(value):
+    """ISO timestamps, plus the compact form used in old backup file names (20251219T112016Z)."""
+    value = value.strip()
+    for fmt in ('%Y%m%dT%H%M%S%z', '%Y%m%dT%H%M%SZ', '%Y%m%d'):
+        try:
+            ts = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc) if value.endswith('Z') else ts.astimezone()
+    return ts
+
+
+def read_index():
+    entries = []
+    try:
+        with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _write_atomic(path, data):
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _append_index(entry):
+    with open(INDEX_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _write_index(entries):
+    data = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries)
+    _write_atomic(INDEX_FILE, data.encode('utf-8'))
+
+
+def _latest_before(entries, at):
+    """Entry with the highest ``ts`` at or before ``at`` (whatever the file order)."""
+    best, best_ts = None, None
+    for e in entries:
+        ts = parse_ts(e['ts'])
+        if ts <= at and (best_ts is None or ts >= best_ts):
+            best, best_ts = e, ts
+    return best
+
+
+def snapshot_data(payload):
+    """The backed-up part of a cache payload: rate data only, no bookkeeping fields."""
+    return {key: payload[key] for key in SNAPSHOT_KEYS if key in payload}
+
+
+def _archive_path(day):
+    for suffix in COMPRESSORS:
+        path = ARCHIVE_DIR / f'{day}{suffix}'
+        if path.exists():
+            return path
+    return None
+
+
+def _iter_archive(path):
+    """Stream (hash, payload_bytes) pairs out of one daily archive."""
+    opener = COMPRESSORS[''.join(path.suffixes[-2:])]
+    with opener(path, 'rb') as f:
+        for line in f:
+            record = json.loads(line)
+            yield record['hash'], canonical_bytes(record['payload'])
+
+
+def store_snapshot(payload, ts=None):
+    """Add one snapshot unless it matches the one in effect at ``ts``. Returns (entry or None, hash).
+
+    The index stays sorted by ``ts``: an entry older than the newest one
+    (e.g. an imported legacy backup) is inserted in place.
+    """
+    data = canonical_bytes(snapshot_data(payload))
+    digest = content_hash(data)
+    ts = ts or datetime.now().astimezone()
+    entries = read_index()
+    previous = _latest_before(entries, ts)
+    if previous is not None and previous['hash'] == digest:
+        return None, digest
+    loose = SNAPSHOT_DIR / f'{digest}.json'
+    if not loose.exists():
+        _write_atomic(loose, data)
+    entry = {'ts': ts.isoformat(), 'hash': digest, 'day': ts.astimezone().date().isoformat()}
+    if entries and parse_ts(entries[-1]['ts']) > ts:
+        _write_index(sorted(entries + [entry], key=lambda e: parse_ts(e['ts'])))
+    else:
+        _append_index(entry)
+    return entry, digest
+
+
+def pack(suffix=DEFAULT_SUFFIX, today=None):
+    """Move loose snapshots of past days into one compressed archive per day."""
+    today = today or datetime.now().astimezone().date().isoformat()
+    entries = read_index()
+    # hashes still referenced by today's entries stay loose
+    keep_loose = {e['hash'] for e in entries if e['day'] >= today}
+    by_day = {}
+    for e in entries:
+        if e['day'] < today and (SNAPSHOT_DIR / f"{e['hash']}.json").exists():
+            by_day.setdefault(e['day'], []).append(e['hash'])
+    packed = 0
+    for day, hashes in sorted(by_day.items()):
+        existing = _archive_path(day)
+        records = {}
+        if existing is not None:
+            for digest, data in _iter_archive(existing):
+                records[digest] = data
+        for digest in hashes:
+            if digest not in records:
+                records[digest] = (SNAPSHOT_DIR / f'{digest}.json').read_bytes()
+        buf = io.BytesIO()
+        opener = COMPRESSORS[suffix]
+        with opener(buf, 'wb') as f:
+            for digest, data in records.items():
+                f.write(b'{"hash":"' + digest.encode() + b'","payload":' + data + b'}\n')
+        target = ARCHIVE_DIR / f'{day}{suffix}'
+        _write_atomic(target, buf.getvalue())
+        if existing is not None and existing != target:
+            existing.unlink()
+        packed += len(hashes)
+    # loose files are only removed once every day that references them is archived
+    for e in entries:
+        loose = SNAPSHOT_DIR / f"{e['hash']}.json"
+        if e['hash'] not in keep_loose and loose.exists():
+            loose.unlink()
+    return packed
+
+
+def load_snapshot(entry):
+    loose = SNAPSHOT_DIR / f"{entry['hash']}.json"
+    if loose.exists():
+        return json.loads(loose.read_bytes())
+    archive = _archive_path(entry['day'])
+    if archive is None:
+        raise FileNotFoundError(f"no loose snapshot or archive for {entry['day']} ({entry['hash'][:12]})")
+    for digest, data in _iter_archive(archive):
+        if digest == entry['hash']:
+            return json.loads(data)
+    raise KeyError(f"snapshot {entry['hash'][:12]} missing from {archive.name}")
+
+
+def find_entry(at):
+    """Newest index entry at or before ``at``."""
+    return _latest_before(read_index(), at)
 
 
 def backup():
     ensure_dirs()
-    if not CACHE_FILE.exists():
-        msg = f"{datetime.now().isoformat()} - no source cache file: {CACHE_FILE}\n"
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(msg)
+    setup_json_logging(LOG_FILE, 'rates.backup')
+    start = time.perf_counter()
+    # per-source segments are merged back into one snapshot for the backup; unlike read_cache()
+    # this never falls back to the legacy file, our own latest copy or the bundled sample data
+    payload = read_merged()
+    if not payload or not snapshot_data(payload):
+        logger.warning(f"no source cache data under {DATA_DIR}", extra={'stage': 'backup', 'status': 'empty'})
         return 1
 
-    ts = datetime.now().astimezone().strftime('%Y%m%dT%H%M%S%z')
-    dest = BACKUP_DIR / f"rates_cache_{ts}.json"
     try:
-        shutil.copy2(str(CACHE_FILE), str(dest))
-        # also update a latest copy
-        latest = BACKUP_DIR / 'rates_cache.json'
-        shutil.copy2(str(CACHE_FILE), str(latest))
-        msg = f"{datetime.now().isoformat()} - backed up {CACHE_FILE} -> {dest}\n"
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(msg)
+        with FileLock(str(LOCK_FILE)):
+            entry, digest = store_snapshot(payload)
+            if entry is not None:
+                # also update a latest copy
+                latest = BACKUP_DIR / 'rates_cache.json'
+                _write_atomic(latest, json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8'))
+            # pack even when unchanged so yesterday's snapshots get archived after midnight
+            packed = pack()
+        if entry is None:
+            logger.info('cache unchanged since last backup, skipped', extra={
+                'stage': 'backup',
+                'status': 'unchanged',
+                'hash': digest,
+                'packed': packed,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            })
+            return 0
+        logger.info(f"backed up {DATA_DIR} -> {digest[:12]}", extra={
+            'stage': 'backup',
+            'status': 'ok',
+            'hash': digest,
+            'packed': packed,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+        })
         return 0
     except Exception as e:
-        msg = f"{datetime.now().isoformat()} - backup failed: {e}\n"
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(msg)
+        logger.error(f"backup failed: {e}", exc_info=True, extra={
+            'stage': 'backup',
+            'status': 'error',
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+        })
         return 2
 
 
+def restore(at, output=None, apply=False):
+    entry = find_entry(at)
+    if entry is None:
+        print(f'no backup at or before {at.isoformat()}', file=sys.stderr)
+        return 1
+    payload = load_snapshot(entry)
+    if apply:
+        # rebuild the live per-source segments from the merged snapshot
+        write_cache(payload.get('rates') or [], payload.get('all_banks_usd'), payload.get('gold_price'),
+                    payload.get('rates_update_time'))
+        if payload.get('usd_deposit'):
+            write_segment('usd_deposit', payload['usd_deposit'])
+        print(f"restored {entry['ts']} into the live cache")
+    text = json.dumps(payload, ensure_ascii=False, indent=2)
+    if output:
+        Path(output).write_text(text, encoding='utf-8')
+        print(f"restored {entry['ts']} -> {output}")
+    elif not apply:
+        print(text)
+    return 0
+
+
+def verify():
+    """Decompress every archive once, re-hashing each snapshot; check loose files and the index."""
+    problems = []
+    seen = {}
+    # only finished archives: a pack interrupted mid-write leaves a <day>.jsonl.xz.<pid>.tmp behind
+    archives = [path for suffix in COMPRESSORS for path in ARCHIVE_DIR.glob(f'*{suffix}')]
+    for path in sorted(archives):
+        day = path.name.split('.', 1)[0]
+        try:
+            for digest, data in _iter_archive(path):
+                if content_hash(data) != digest:
+                    problems.append(f'{path.name}: hash mismatch for {digest[:12]}')
+                seen.setdefault(day, set()).add(digest)
+        except (OSError, EOFError, lzma.LZMAError, ValueError, KeyError) as e:
+            problems.append(f'{path.name}: unreadable ({e})')
+    for loose in SNAPSHOT_DIR.glob('*.json'):
+        if content_hash(loose.read_bytes()) != loose.stem:
+            problems.append(f'snapshots/{loose.name}: hash mismatch')
+    entries = read_index()
+    for e in entries:
+        if not (SNAPSHOT_DIR / f"{e['hash']}.json").exists() and e['hash'] not in seen.get(e['day'], ()):
+            problems.append(f"index {e['ts']}: snapshot {e['hash'][:12]} not found")
+    for p in problems:
+        print(p)
+    print(f"{len(entries)} snapshots, {sum(len(v) for v in seen.values())} archived, {len(problems)} problems")
+    return 3 if problems else 0
+
+
+def migrate(remove=False):
+    """Import the old flat rates_cache_<ts>.json backups into the incremental store."""
+    ensure_dirs()
+    legacy = sorted(BACKUP_DIR.glob('rates_cache_*.json'), key=lambda p: parse_ts(p.stem[len('rates_cache_'):]))
+    imported = 0
+    with FileLock(str(LOCK_FILE)):
+        for path in legacy:
+            ts = parse_ts(path.stem[len('rates_cache_'):])
+            entry, _ = store_snapshot(json.loads(path.read_text(encoding='utf-8')), ts)
+            imported += entry is not None
+        pack()
+    if remove:
+        for path in legacy:
+            path.unlink()
+    print(f'imported {imported} of {len(legacy)} legacy backups')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incremental backups of the rates cache')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('backup', help='back up the current cache (default)')
+    p_restore = sub.add_parser('restore', help='rebuild the snapshot in effect at a timestamp')
+    p_restore.add_argument('--at', default=None, help='ISO timestamp (default: latest)')
+    p_restore.add_argument('--output', help='write the snapshot to this file instead of stdout')
+    p_restore.add_argument('--apply', action='store_true', help='write it back into the live cache segments')
+    sub.add_parser('verify', help='check every archive and loose snapshot in one streaming pass')
+    sub.add_parser('list', help='list indexed snapshots')
+    p_pack = sub.add_parser('pack', help='archive loose snapshots of past days')
+    p_pack.add_argument('--gzip', action='store_true', help='use gzip instead of lzma')
+    p_migrate = sub.add_parser('migrate', help='import old rates_cache_<ts>.json backups')
+    p_migrate.add_argument('--remove', action='store_true', help='delete the imported files')
+    args = parser.parse_args(argv)
+
+    if args.command in (None, 'backup'):
+        return backup()
+    if args.command == 'restore':
+        at = parse_ts(args.at) if args.at else datetime.now().astimezone()
+        return restore(at, args.output, args.apply)
+    if args.command == 'verify':
+        return verify()
+    if args.command == 'list':
+        for e in read_index():
+            where = 'loose' if (SNAPSHOT_DIR / f"{e['hash']}.json").exists() else 'archive'
+            print(f"{e['ts']}  {e['hash'][:12]}  {where}")
+        return 0
+    if args.command == 'pack':
+        ensure_dirs()
+        with FileLock(str(LOCK_FILE)):
+            print(f"packed {pack('.jsonl.gz' if args.gzip else DEFAULT_SUFFIX)} snapshots")
+        return 0
+    if args.command == 'migrate':
+        return migrate(args.remove)
+    return 1
+
+
 if __name__ == '__main__':
-    code = backup()
-    sys.exit(code)
+    sys.exit(main())
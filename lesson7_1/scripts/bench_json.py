@@ -0,0 +1,91 @@
+"""Benchmark cache JSON load/dump latency for each available backend.
+
+Uses the real data/rates_cache.json plus a synthetic multi-year history
+file (hourly snapshots built by random-walking the real board rates).
+
+    python scripts/bench_json.py [--years 3] [--repeat 50]
+"""
+
+from pathlib import Path
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+CACHE_FILE = ROOT / 'data' / 'rates_cache.json'
+
+sys.path.insert(0, str(ROOT))
+from rates import storage  # noqa: E402
+from rates.schema import encode_rates, decode_rates  # noqa: E402
+
+
+def build_history(payload, years):
+    """Hourly columnar snapshots covering ``years`` years."""
+    rows = decode_rates(payload.get('rates'))
+    base = encode_rates(rows)
+    rng = random.Random(0)
+    buy = [b or 0.0 for b in base['buy']]
+    sell = [s or 0.0 for s in base['sell']]
+    snapshots = []
+    t = int(time.time()) - years * 365 * 24 * 3600
+    for _ in range(years * 365 * 24):
+        drift = [1 + rng.gauss(0, 0.001) for _ in buy]
+        buy = [round(b * d, 4) for b, d in zip(buy, drift)]
+        sell = [round(s * d, 4) for s, d in zip(sell, drift)]
+        snapshots.append({'t': t, 'buy': buy, 'sell': sell})
+        t += 3600
+    return {'schema': base['schema'], 'currencies': base['currencies'], 'snapshots': snapshots}
+
+
+def timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def backends():
+    out = {'json (indent=2, legacy)': (
+        lambda o: json.dumps(o, ensure_ascii=False, indent=2).encode('utf-8'),
+        json.loads,
+    ), 'json (compact)': (
+        lambda o: json.dumps(o, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+        json.loads,
+    )}
+    if storage.orjson is not None:
+        out['orjson'] = (storage.orjson.dumps, storage.orjson.loads)
+    if storage.msgspec is not None:
+        out['msgspec'] = (storage.msgspec.json.encode, storage.msgspec.json.decode)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    cache = json.loads(CACHE_FILE.read_text(encoding='utf-8'))
+    docs = {
+        'rates_cache.json': cache,
+        f'history ({args.years}y hourly)': build_history(cache, args.years),
+    }
+    print(f"storage backend in use: {storage.JSON_BACKEND}")
+    print(f"{'document':<26}{'backend':<26}{'size KB':>9}{'dump ms':>10}{'load ms':>10}")
+    for doc_name, doc in docs.items():
+        # the big document gets fewer rounds so the benchmark stays quick
+        repeat = args.repeat if doc is cache else max(3, args.repeat // 10)
+        for name, (dump, load) in backends().items():
+            data = dump(doc)
+            dump_ms = timeit(lambda: dump(doc), repeat)
+            load_ms = timeit(lambda: load(data), repeat)
+            print(f"{doc_name:<26}{name:<26}{len(data) / 1024:>9.1f}{dump_ms:>10.3f}{load_ms:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
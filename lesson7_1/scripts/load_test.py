@@ -0,0 +1,348 @@
+"""Load-test streamlit_app.py with N concurrent AppTest sessions.
+
+The app runs from a temporary copy of the project (the real data/ is never
+touched) and fetches from a local stand-in for the rate sites, reached
+through RATES_UPSTREAM_BASE. Every session loads the page, then performs
+random interactions (amount, slider, currency, cross-rate side, idle
+reruns). The report covers script-run percentiles, memory per session,
+upstream fetches per page and thundering herds: overlapping fetches of one
+page, or refetches sooner than the TTL allows.
+
+AppTest swaps a process-wide Runtime singleton around every run, so script
+runs are serialized here; background refreshes and upstream fetches still
+run concurrently. Under the GIL a real server's script threads mostly
+serialize too, so "latency" (queue wait + run) approximates what a user
+waits for and "run" is the script's own cost.
+
+    python scripts/load_test.py [--sessions 20] [--steps 10] [--ttl 5]
+                                [--upstream-latency 0.3] [--cold] [--json report.json]
+
+--ttl shortens the segment TTLs so the cache expires while under load;
+--cold starts without segment files, so the first page loads find nothing.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_FILES = ('streamlit_app.py', 'config.py', 'rates', 'data')
+COPY_IGNORE = shutil.ignore_patterns('__pycache__', '*.log', '*.lock', '*.sqlite3', 'backups')
+
+# stand-in path -> page name; paths follow rates.crawler.upstream_url
+PAGES = {
+    '/rate.bot.com.tw/xrt': 'fx',
+    '/rate.bot.com.tw/gold': 'gold',
+    '/www.findrate.tw/USD/': 'banks_usd',
+}
+DEFAULT_GOLD = {'buy': 4359.0, 'sell': 4407.0}
+DEFAULT_BANKS = ('臺灣銀行', '兆豐銀行', '第一銀行', '玉山銀行', '國泰世華')
+
+# AppTest.run() is not thread-safe (it installs and removes Runtime._instance)
+RUNTIME_LOCK = threading.Lock()
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def rss_bytes():
+    """Resident memory of this process (peak RSS without psutil), or None."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+
+class StandIn:
+    """Local stand-in for the rate sites; records every fetch per page.
+
+    Each fetch random-walks the prices a little, so every refresh writes a
+    new segment version the way a live board would.
+    """
+
+    def __init__(self, payload, latency, seed=0):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.rates = [(r.get('name') or r.get('currency'), r.get('buy'), r.get('sell'))
+                      for r in payload.get('rates') or []]
+        gold = payload.get('gold_price') or {}
+        self.gold = (gold.get('buy') or DEFAULT_GOLD['buy'], gold.get('sell') or DEFAULT_GOLD['sell'])
+        usd = next((r for r in self.rates if '(USD)' in (r[0] or '')), ('美金 (USD)', 31.5, 31.6))
+        banks = payload.get('all_banks_usd') or []
+        self.banks = [(b.get('bank'), b.get('buy'), b.get('sell')) for b in banks] or [
+            (bank, usd[1], usd[2]) for bank in DEFAULT_BANKS]
+        self.lock = threading.Lock()
+        self.fetches = {page: [] for page in PAGES.values()}
+        self.inflight = {page: 0 for page in PAGES.values()}
+        self.max_inflight = {page: 0 for page in PAGES.values()}
+        self.server = None
+        self.base = None
+
+    def _drift(self, value):
+        return None if value is None else round(value * (1 + self.rng.gauss(0, 0.0005)), 4)
+
+    def render(self, page):
+        now = time.strftime('%Y/%m/%d %H:%M')
+        with self.lock:
+            if page == 'fx':
+                rows = ''.join(
+                    f"<tr><td data-table='幣別'><div class='print_show'>{label}</div></td>"
+                    f"<td data-table='本行即期買入'>{self._drift(buy) or '-'}</td>"
+                    f"<td data-table='本行即期賣出'>{self._drift(sell) or '-'}</td></tr>"
+                    for label, buy, sell in self.rates)
+                return f"<html><body><span class='time'>{now}</span><table title='牌告匯率'>{rows}</table></body></html>"
+            if page == 'gold':
+                buy, sell = (self._drift(v) for v in self.gold)
+                return (f"<html><body><div class='pull-left'>掛牌時間：{now}</div><table>"
+                        '<tr><th>日期</th><th>幣別</th><th>1 公克</th></tr>'
+                        f'<tr><td>本行賣出</td><td>新台幣</td><td>{sell:.0f}</td></tr>'
+                        f'<tr><td>本行買進</td><td>新台幣</td><td>{buy:.0f}</td></tr>'
+                        '</table></body></html>')
+            rows = ''.join(f'<tr><td>{bank}</td><td>{self._drift(buy)}</td><td>{self._drift(sell)}</td></tr>'
+                           for bank, buy, sell in self.banks)
+            return ('<html><body><table><tr><th>幣別</th></tr><tr><td>USD</td></tr></table>'
+                    f'<table><tr><th>銀行名稱</th><th>即期買入</th><th>即期賣出</th></tr>{rows}</table>'
+                    '</body></html>')
+
+    def _handle(self, handler):
+        page = PAGES.get(handler.path.split('?', 1)[0])
+        if page is None:
+            handler.send_error(404)
+            return
+        started = time.monotonic()
+        with self.lock:
+            self.inflight[page] += 1
+            self.max_inflight[page] = max(self.max_inflight[page], self.inflight[page])
+        try:
+            time.sleep(self.latency)
+            body = self.render(page).encode('utf-8')
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/html; charset=utf-8')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+        finally:
+            with self.lock:
+                self.inflight[page] -= 1
+                self.fetches[page].append((started, time.monotonic()))
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, name='stand-in', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+    def report(self, ttl):
+        """Fetch counts per page plus herd indicators."""
+        out = {}
+        with self.lock:
+            for page, spans in self.fetches.items():
+                starts = sorted(s for s, _ in spans)
+                # a second fetch of the same page inside one TTL means a refresh was not deduplicated
+                early = sum(1 for prev, cur in zip(starts, starts[1:]) if cur - prev < ttl)
+                out[page] = {
+                    'fetches': len(spans),
+                    'max_concurrent': self.max_inflight[page],
+                    'refetch_within_ttl': early,
+                    'herd': self.max_inflight[page] > 1 or early > 0,
+                }
+        return out
+
+
+def prepare_app(workdir, cold):
+    """Copy the app into ``workdir``; with ``cold`` drop every segment file."""
+    for name in APP_FILES:
+        src = ROOT / name
+        if src.is_dir():
+            shutil.copytree(src, workdir / name, ignore=COPY_IGNORE)
+        elif src.exists():
+            shutil.copy2(src, workdir / name)
+    if cold:
+        for segments in (workdir / 'data' / 'segments', workdir / 'backup' / 'data' / 'segments'):
+            shutil.rmtree(segments, ignore_errors=True)
+    return workdir / 'streamlit_app.py'
+
+
+def find_widget(elements, **attrs):
+    return next((e for e in elements if all(getattr(e, k, None) == v for k, v in attrs.items())), None)
+
+
+def interact(at, rng):
+    """Pick one realistic interaction; returns its name (the caller runs the app)."""
+    action = rng.choice(('amount', 'slider', 'currency', 'matrix', 'idle'))
+    if action == 'amount' and len(at.text_input):
+        at.text_input[0].set_value(f'{rng.randrange(1, 200) * 1000:,}')
+    elif action == 'slider' and find_widget(at.slider, label='金額滑桿') is not None:
+        find_widget(at.slider, label='金額滑桿').set_value(rng.randrange(0, 500) * 1000)
+    elif action == 'currency' and find_widget(at.selectbox, key='source_curr_select') is not None:
+        box = find_widget(at.selectbox, key='source_curr_select')
+        box.set_value(rng.choice(box.options))
+    elif action == 'matrix' and find_widget(at.radio, key='cross_rate_side') is not None:
+        radio = find_widget(at.radio, key='cross_rate_side')
+        radio.set_value(rng.choice(radio.options))
+    else:
+        action = 'idle'
+    return action
+
+
+def run_session(app_file, index, steps, think, timeout, results):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(index)
+    at = AppTest.from_file(str(app_file), default_timeout=timeout)
+    for step in range(steps + 1):
+        action = 'load' if step == 0 else interact(at, rng)
+        queued = time.perf_counter()
+        with RUNTIME_LOCK:
+            started = time.perf_counter()
+            try:
+                at.run()
+                error = '; '.join(e.message for e in at.exception) or None
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            finished = time.perf_counter()
+        results.append({'session': index, 'action': action, 'seconds': finished - started,
+                        'wait': started - queued, 'error': error})
+        if think:
+            time.sleep(rng.uniform(0, think))
+    return at
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20, help='concurrent sessions')
+    parser.add_argument('--steps', type=int, default=10, help='interactions per session after the first load')
+    parser.add_argument('--think', type=float, default=0.5, help='max random pause between interactions (s)')
+    parser.add_argument('--ttl', type=float, default=5, help='soft TTL of the core segments during the test (s)')
+    parser.add_argument('--upstream-latency', type=float, default=0.3, help='stand-in response delay (s)')
+    parser.add_argument('--timeout', type=float, default=60, help='per script run timeout (s)')
+    parser.add_argument('--cold', action='store_true', help='start without any segment files')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--fail-on-herd', action='store_true', help='exit 1 if a thundering herd was seen')
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix='rates_load_'))
+    stand_in = None
+    try:
+        app_file = prepare_app(workdir, args.cold)
+        # the app, the crawlers and this script share one process: import the copy, not the repo
+        sys.path.insert(0, str(workdir))
+        from rates import storage
+
+        for name in storage.CORE_SEGMENTS:
+            storage.SEGMENT_TTLS[name] = args.ttl
+        stand_in = StandIn(storage.read_cache() or {}, args.upstream_latency).start()
+        os.environ['RATES_UPSTREAM_BASE'] = stand_in.base
+
+        # one warm-up session loads modules and process-wide caches, so the
+        # memory figure below is what each additional session costs
+        warm = []
+        run_session(app_file, -1, 0, 0, args.timeout, warm)
+        rss_before = rss_bytes()
+
+        results = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            futures = [pool.submit(run_session, app_file, i, args.steps, args.think, args.timeout, results)
+                       for i in range(args.sessions)]
+            sessions = [f.result() for f in futures]
+        wall = time.perf_counter() - started
+        rss_after = rss_bytes()
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    runs_ms = [r['seconds'] * 1000 for r in results]
+    latency_ms = [(r['seconds'] + r['wait']) * 1000 for r in results]
+    by_action = {}
+    for r in results:
+        by_action.setdefault(r['action'], []).append(r['seconds'] * 1000)
+    upstream = stand_in.report(args.ttl)
+    per_session = None
+    if rss_before is not None and rss_after is not None and sessions:
+        per_session = max(0, rss_after - rss_before) / len(sessions)
+    report = {
+        'sessions': args.sessions,
+        'script_runs': len(results),
+        'errors': sum(1 for r in results if r['error']),
+        'wall_seconds': round(wall, 2),
+        'warmup_ms': round(warm[0]['seconds'] * 1000, 1) if warm else None,
+        'run_ms': {f'p{q}': round(percentile(runs_ms, q), 1) for q in (50, 95, 99)},
+        'latency_ms': {f'p{q}': round(percentile(latency_ms, q), 1) for q in (50, 95, 99)},
+        'run_ms_by_action': {
+            action: {'n': len(v), 'p50': round(percentile(v, 50), 1), 'p95': round(percentile(v, 95), 1)}
+            for action, v in sorted(by_action.items())
+        },
+        'mean_run_ms': round(statistics.fmean(runs_ms), 1) if runs_ms else 0.0,
+        'memory_per_session_kb': None if per_session is None else round(per_session / 1024, 1),
+        'memory_source': 'psutil rss' if psutil is not None else ('peak rss' if resource is not None else None),
+        'upstream': upstream,
+        'upstream_fetches': sum(p['fetches'] for p in upstream.values()),
+        'thundering_herd': any(p['herd'] for p in upstream.values()),
+    }
+
+    print(f"{report['sessions']} sessions, {report['script_runs']} script runs in {report['wall_seconds']}s "
+          f"({report['errors']} with errors)")
+    print('script run ms: ' + '  '.join(f'{k}={v}' for k, v in report['run_ms'].items()))
+    print('latency ms:    ' + '  '.join(f'{k}={v}' for k, v in report['latency_ms'].items()))
+    for action, stats in report['run_ms_by_action'].items():
+        print(f"  {action:<10}n={stats['n']:<5}p50={stats['p50']:<9}p95={stats['p95']}")
+    if report['memory_per_session_kb'] is not None:
+        print(f"memory per session: {report['memory_per_session_kb']:,.1f} KB ({report['memory_source']})")
+    else:
+        print('memory per session: n/a (install psutil)')
+    print(f"upstream fetches: {report['upstream_fetches']}")
+    for page, stats in upstream.items():
+        flag = '  <-- thundering herd' if stats['herd'] else ''
+        print(f"  {page:<10}fetches={stats['fetches']:<4}max_concurrent={stats['max_concurrent']:<3}"
+              f"refetch_within_ttl={stats['refetch_within_ttl']}{flag}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    return 1 if args.fail_on_herd and report['thundering_herd'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
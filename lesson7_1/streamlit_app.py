@@ -3,103 +3,173 @@
 """
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
-from typing import Dict, Any, List
-from datetime import datetime, timezone
-from decimal import Decimal, InvalidOperation
-import json
-import os
+from typing import Dict, Any, Optional
+import time
+from contextlib import contextmanager
 
-from rates.crawler import fetch_rates, fetch_usd_rates_all_banks, fetch_gold_price
-from rates.storage import write_cache, read_cache, is_expired
+from rates.storage import read_cache
+from rates.cache import BackgroundRefresher, TieredCache
+from rates.snapshot import RatesSnapshot, snapshot_for
+from rates.quotes import base_name, is_twd
+from rates.percentiles import PercentileStore
+from rates.history import HISTORY_POINTS, HistoryStore
+from rates.trading_calendar import TAIPEI_TZ
+from rates.pricing import CrossRates, cross_rates_for
+from rates.spans import RENDER_METRICS_FILE, SpanRecorder
+from rates.metrics import write_metrics
+
+
+# 背景更新寫入新資料後，頁面最慢多久跟著重畫（秒）
+VERSION_CHECK_SECONDS = 30
+
+# 行程層級的渲染耗時統計寫入 RENDER_METRICS_FILE 的最短間隔（秒）
+RENDER_METRICS_INTERVAL = 30
+
+# 渲染耗時浮層：區塊 -> (標籤, 由下往上的位置)
+TIMING_OVERLAY = {
+    "page": ("整頁", 0),
+    "converter": ("換算器", 1),
+    "tables": ("表格", 2),
+    "history": ("歷史走勢", 3),
+}
+
+# 歷史走勢可選的區間（天數；None 為全部）
+HISTORY_RANGES = {"1 天": 1, "1 週": 7, "1 個月": 30, "1 年": 365, "3 年": 3 * 365, "全部": None}
+
+
+# 快取相關配置：記憶體 LRU + 磁碟 segment 兩層，過了 soft TTL 先回舊資料並在背景更新
+@st.cache_resource
+def get_rates_cache() -> TieredCache:
+    """整個 Streamlit 行程共用一個快取實例"""
+    return TieredCache()
+
+
+@st.cache_resource
+def get_background_refresher() -> BackgroundRefresher:
+    """整個 Streamlit 行程共用一條背景更新執行緒；常駐更新程式維持資料新鮮時它不會抓取"""
+    return BackgroundRefresher(get_rates_cache()).start()
+
+
+@st.cache_resource
+def get_process_spans() -> SpanRecorder:
+    """整個 Streamlit 行程共用的渲染耗時統計（所有 session 合計）"""
+    return SpanRecorder()
+
+
+@st.cache_resource
+def get_percentile_store() -> PercentileStore:
+    """整個行程共用的滾動歷史百分位（依變更事件追蹤當時匯率、每小時取樣，存於 data/rate_percentiles.json）"""
+    return PercentileStore()
+
+
+def rate_percentile(code: str, buy: Optional[float], sell: Optional[float]) -> Optional[float]:
+    """目前中價在近一年分布中的百分位；先補進新的變更事件（沒有新事件且未到取樣時間時只看一次檔案大小）"""
+    if not buy or not sell:
+        return None
+    store = get_percentile_store()
+    try:
+        store.catch_up()
+    except OSError as e:
+        print(f"Error updating rate percentiles: {e}")
+    return store.percentile(code, (buy + sell) / 2)
+
+
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    """整個行程共用的匯率歷史（由變更事件累加，只存在記憶體）"""
+    return HistoryStore()
+
+
+def get_session_spans() -> SpanRecorder:
+    """本 session 的渲染耗時統計"""
+    return st.session_state.setdefault("render_spans", SpanRecorder())
+
+
+def record_span(name: str, elapsed_ms: float) -> None:
+    get_process_spans().record(name, elapsed_ms)
+    get_session_spans().record(name, elapsed_ms)
+
+
+@contextmanager
+def span(name: str):
+    """量測一段程式的耗時，記入本 session 與整個行程的統計（被 st.rerun 中斷的不計）"""
+    started = time.perf_counter()
+    yield
+    record_span(name, (time.perf_counter() - started) * 1000)
+
+
+def flush_render_metrics() -> None:
+    """定期把整個行程的統計寫成 JSON，方便比對版本間的渲染成本"""
+    spans = get_process_spans()
+    if spans.flush_due(RENDER_METRICS_INTERVAL):
+        try:
+            write_metrics(RENDER_METRICS_FILE, spans.to_dict())
+        except OSError as e:
+            print(f"Error writing render metrics: {e}")
 
 
-# 快取相關配置
-@st.cache_data(ttl=300)
 def get_cached_rates() -> Dict[str, Any]:
-    """獲取快取的匯率資料"""
-    if is_expired(300):
-        raw_rates, rates_update_time = fetch_rates()
-        all_banks_usd = fetch_usd_rates_all_banks()
-        gold_price = fetch_gold_price()
-        
-        if raw_rates:
-            formatted_rates = [
-                {
-                    'currency': rate.get('幣別', '').split('(')[0].strip(),
-                    'name': rate.get('幣別', ''),
-                    'buy': float(rate.get('本行即期買入', '')),
-                    'sell': float(rate.get('本行即期賣出', ''))
-                }
-                for rate in raw_rates
-                if rate.get('本行即期買入', '-') not in ('-', '')
-                and rate.get('本行即期賣出', '-') not in ('-', '')
-                and rate.get('幣別', '')
-            ]
-            if formatted_rates:
-                write_cache(formatted_rates, all_banks_usd, gold_price, rates_update_time)
-    
-    return read_cache() or {}
+    """獲取快取的匯率資料（不等待網路：過期資料先顯示，背景更新後下次重跑即取得新資料）"""
+    # 沒有任何 segment 時退回舊版單檔快取或範例資料
+    with span("data.load"):
+        return get_rates_cache().get_merged(block=False) or read_cache() or {}
+
 
+def get_snapshot() -> RatesSnapshot:
+    """本次重跑使用的唯讀快照；同一資料版本只建立一次，各區塊共用"""
+    return snapshot_for(get_cached_rates())
 
-def calculate_conversion(source_curr: str, target_curr: str, amount: float, 
-                        source_currency: str, target: str, tradeable: List) -> tuple:
-    """計算貨幣轉換"""
+
+def calculate_conversion(source_label: str, target_label: str, amount: float, cross: CrossRates) -> tuple:
+    """計算貨幣轉換（查本版本預先算好的交叉匯率矩陣）"""
     converted = 0
     calc_info = ""
 
-    def _display_code(label: str, fallback: str) -> str:
-        if "(" in label and ")" in label:
-            return label.split("(", 1)[1].split(")", 1)[0].strip()
-        return fallback
-
-    def _matches_rate(rate: Dict[str, Any], option_full: str, option_base: str) -> bool:
-        # cache 可能只有 currency (例: "美金 (USD)")，也可能有 name
-        label = (rate.get("name") or rate.get("currency") or "").strip()
-        if not label:
-            return False
-        if label == option_full or label == option_base:
-            return True
-        # 容忍 "美金" 對上 "美金 (USD)" 之類
-        return label.startswith(option_base + " (")
-
-    # 用於匹配的完整字串（包含中文和代碼）
-    source_match = source_currency
-    target_match = target
-
-    source_display = _display_code(source_currency, "TWD" if source_curr == "新台幣" else source_curr)
-    target_display = _display_code(target, "TWD" if target_curr == "新台幣" else target_curr)
-    
-    if source_curr == "新台幣" and target_curr != "新台幣":
-        target_row = next((r for r in tradeable if _matches_rate(r, target_match, target_curr)), None)
-        if target_row and target_row.get("sell"):
-            converted = amount / target_row["sell"]
-            calc_info = f"計算式: {amount:,} TWD ÷ {target_row['sell']:.2f} = {converted:,.2f} {target_display}"
-    
-    elif source_curr != "新台幣" and target_curr == "新台幣":
-        source_row = next((r for r in tradeable if _matches_rate(r, source_match, source_curr)), None)
-        if source_row and source_row.get("buy"):
-            converted = amount * source_row["buy"]
-            calc_info = f"計算式: {amount:,} × {source_row['buy']:.2f} = {converted:,.2f} TWD"
-    
-    elif source_curr != "新台幣" and target_curr != "新台幣":
-        source_row = next((r for r in tradeable if _matches_rate(r, source_match, source_curr)), None)
-        target_row = next((r for r in tradeable if _matches_rate(r, target_match, target_curr)), None)
-        
-        if source_row and target_row and source_row.get("buy") and target_row.get("sell"):
-            twd_amount = amount * source_row["buy"]
-            converted = twd_amount / target_row["sell"]
-            calc_info = f"計算式: {amount:,} {source_display} × {source_row['buy']:.2f} ÷ {target_row['sell']:.2f} = {converted:,.2f} {target_display}"
-    
-    else:
+    source = cross.quote(source_label)
+    target = cross.quote(target_label)
+    rate = cross.rate(source_label, target_label)
+    if source is None or target is None or rate is None:
+        return converted, calc_info
+
+    if source.code == target.code:
         converted = amount
         calc_info = f"同貨幣無需轉換: {converted:,}"
-    
+    elif source.is_twd:
+        converted = amount * rate
+        calc_info = f"計算式: {amount:,} TWD ÷ {target.sell:.2f} = {converted:,.2f} {target.code}"
+    elif target.is_twd:
+        converted = amount * rate
+        calc_info = f"計算式: {amount:,} × {source.buy:.2f} = {converted:,.2f} TWD"
+    else:
+        converted = amount * rate
+        calc_info = f"計算式: {amount:,} {source.code} × {source.buy:.2f} ÷ {target.sell:.2f} = {converted:,.2f} {target.code}"
+
     return converted, calc_info
 
 
-def render_thermometer(rate_data: Dict[str, Any], currency: str) -> None:
-    """渲染溫度計，樣式與附件保持一致"""
+def render_cross_rate_matrix(cross: CrossRates) -> None:
+    """全幣別（含黃金）交叉匯率表：列為持有貨幣，欄為換得貨幣"""
+    if len(cross) < 2:
+        return
+    with st.expander("全幣別交叉匯率", expanded=False):
+        side = st.radio(
+            "報價", ["賣出持有貨幣 (可換得)", "買入目標貨幣 (需支付)"],
+            horizontal=True, key="cross_rate_side", label_visibility="collapsed"
+        )
+        matrix = cross.bid if side.startswith("賣出") else cross.ask
+        df_cross = pd.DataFrame(matrix, index=cross.codes, columns=cross.codes)
+        st.dataframe(df_cross.style.format("{:,.4g}", na_rep="-"), use_container_width=True)
+        st.caption("每 1 單位列貨幣對應的欄貨幣數量；黃金以每克計價，經新台幣換算")
+
+
+def render_thermometer(rate_data: Dict[str, Any], currency: str, percentile: Optional[float] = None) -> None:
+    """渲染溫度計，樣式與附件保持一致
+
+    percentile 為目前中價在滾動歷史分布中的百分位 (0-100)；歷史資料不足時
+    傳入 None，改以固定區間估算位置。
+    """
     buy_rate = rate_data.get("buy", 0)
     sell_rate = rate_data.get("sell", 0)
     
@@ -108,15 +178,19 @@ def render_thermometer(rate_data: Dict[str, Any], currency: str) -> None:
     
     avg_rate = (buy_rate + sell_rate) / 2
     
-    # 簡化範圍計算
-    ranges = {
-        "USD": (28, 35), "美金": (28, 35),
-        "JPY": (0.15, 0.25), "日圓": (0.15, 0.25),
-        "EUR": (32, 40), "歐元": (32, 40)
-    }
-    
-    min_val, max_val = ranges.get(currency.split()[0], (avg_rate * 0.8, avg_rate * 1.2))
-    percentage = max(0, min(100, (avg_rate - min_val) / (max_val - min_val) * 100))
+    if percentile is not None:
+        percentage = max(0, min(100, percentile))
+        scale = "近一年百分位"
+    else:
+        # 歷史資料累積前的粗略範圍
+        ranges = {
+            "USD": (28, 35), "美金": (28, 35),
+            "JPY": (0.15, 0.25), "日圓": (0.15, 0.25),
+            "EUR": (32, 40), "歐元": (32, 40)
+        }
+        min_val, max_val = ranges.get(currency.split()[0], (avg_rate * 0.8, avg_rate * 1.2))
+        percentage = max(0, min(100, (avg_rate - min_val) / (max_val - min_val) * 100))
+        scale = "歷史資料累積中"
     
     # 快速顏色判斷
     color = "#FF6B35" if percentage > 70 else "#FFB347" if percentage > 30 else "#87CEEB"
@@ -178,7 +252,7 @@ def render_thermometer(rate_data: Dict[str, Any], currency: str) -> None:
             {percentage:.0f}%
         </div>
         <div style="font-size: 10px; opacity: 0.9; margin-bottom: 10px;">
-            🌡️ {status}
+            🌡️ {status} · {scale}
         </div>
         
         <!-- 買賣價格 -->
@@ -207,252 +281,270 @@ def format_display_amount(amount: float, decimals: int) -> str:
     return f"{display_amount:.{decimals}f}"
 
 
-def main():
-    """主應用程式 - 高速版本"""
-    st.set_page_config(
-        page_title="美元黃金轉換", 
-        layout="wide",
-        initial_sidebar_state="collapsed"
-    )
+@contextmanager
+def render_timer(scope: str):
+    """量測區塊渲染耗時並記入統計；側邊欄勾選「顯示渲染耗時」時以右下角浮層顯示"""
+    started = time.perf_counter()
+    yield
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    record_span(scope, elapsed_ms)
+    flush_render_metrics()
+    if st.session_state.get("show_render_timing"):
+        label, slot = TIMING_OVERLAY[scope]
+        st.markdown(f"""
+        <div style="position: fixed; right: 16px; bottom: {16 + slot * 32}px; z-index: 1000;
+                    background: rgba(0, 0, 0, 0.7); color: #fff; font-size: 12px;
+                    padding: 4px 10px; border-radius: 4px;">
+            ⏱️ {label} {elapsed_ms:,.1f} ms
+        </div>
+        """, unsafe_allow_html=True)
 
-    # 主標題再往上移動5行（共6行空白）
-    st.markdown("<div style='font-size:2.5rem;font-weight:800;margin-bottom:0.5em;line-height:1.1;'>美元黃金轉換</div>", unsafe_allow_html=True)
 
-    # 簡化 CSS
-    st.markdown("""
-    <style>
-    .stApp {font-family:'Microsoft JhengHei',sans-serif;}
-    #MainMenu{visibility:hidden;}footer{visibility:hidden;}.stDeployButton{display:none;}
-    </style>
-    """, unsafe_allow_html=True)
-    
-    # 快速載入資料
-    # Ensure cache is fresh
-    with st.spinner("載入中..."):
-        data = get_cached_rates()
-    
-    if not data or 'rates' not in data:
-        st.error("無法取得匯率資料")
-        if st.button("立即更新", type="primary"):
-            st.cache_data.clear()
-            st.rerun()
-        return
-    
-    rates = data['rates']
-    updated_time = data.get('updated_at', '')
-    
-    # 顯示更新時間 - 已隱藏
-    # if updated_time:
-    #     try:
-    #         dt = datetime.fromisoformat(updated_time)
-    #         if dt.tzinfo is None:
-    #             dt = dt.replace(tzinfo=timezone.utc)
-    #         local_time = dt.astimezone().strftime("%H:%M:%S")
-    #         st.caption(f"⏰ 最後更新: {local_time}")
-    #     except:
-    #         pass
-    
-    # 篩選可交易的貨幣
-    tradeable = [r for r in rates if r.get("buy") and r.get("sell")]
-    
-    # 僅保留美金
-    currencies = []
-    if tradeable:
-        currencies = [
-            r.get("name", r.get("currency", "")).replace(" (USD)", "")
-            for r in tradeable 
-            if "美金" in r.get("name", "") or "USD" in r.get("currency", "")
+def render_debug_panel() -> None:
+    """隱藏的除錯面板（網址加上 ?debug=1 才顯示）：各區塊耗時分布"""
+    with st.sidebar.expander("🛠️ 渲染耗時統計", expanded=True):
+        scope = st.radio("範圍", ["本 session", "整個行程"], horizontal=True, key="debug_span_scope")
+        recorder = get_session_spans() if scope == "本 session" else get_process_spans()
+        snapshot = recorder.to_dict()
+        rows = [
+            {
+                "區塊": name,
+                "次數": stats["count"],
+                "平均 ms": stats["avg_ms"],
+                "p50 ms": stats["p50_ms"],
+                "p95 ms": stats["p95_ms"],
+                "最大 ms": stats["max_ms"],
+                "上次 ms": stats["last_ms"],
+            }
+            for name, stats in snapshot["spans"].items()
         ]
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+            selected = st.selectbox("分布", list(snapshot["spans"]), key="debug_span_histogram")
+            histogram = snapshot["spans"][selected]["histogram"]
+            st.bar_chart(pd.Series(histogram, name="次數"))
+        else:
+            st.caption("尚無資料")
+        st.caption(f"統計起點 {snapshot['since']}；整個行程的統計每 {RENDER_METRICS_INTERVAL} 秒寫入 {RENDER_METRICS_FILE}")
+        if st.button("重設本 session 統計", key="debug_span_reset"):
+            get_session_spans().reset()
+
+
+def rerun_converter() -> None:
+    """同步輸入框與滑桿後重跑：片段重跑中只重跑換算器，整頁執行中則整頁重跑"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+@st.fragment(run_every=VERSION_CHECK_SECONDS)
+def watch_snapshot_version() -> None:
+    """定期檢查資料版本；有新版本才整頁重跑，表格也只在這時重畫"""
+    if get_snapshot().version != st.session_state.get("rendered_version"):
+        st.rerun()
+
+
+@st.fragment
+def render_converter(col1_width: int, col2_width: int) -> None:
+    """換算器與金額滑桿：輸入金額、切換貨幣只重跑這個片段，不重畫右欄表格"""
+    with render_timer("converter"):
+        snap = get_snapshot()
+        tradeable = snap.tradeable
+        cross = cross_rates_for(snap)
+
+        # 僅保留美金
+        currencies = [q.name for q in snap.index.quotes() if q.code == "USD"]
     
-    currency_options = ["新台幣"] + currencies
+        currency_options = ["新台幣"] + currencies
 
-    # 初始化 session state
-    if "source_curr_select" not in st.session_state:
-        st.session_state.source_curr_select = currency_options[0]
+        # 初始化 session state
+        if "source_curr_select" not in st.session_state:
+            st.session_state.source_curr_select = currency_options[0]
     
-    if "target_curr_select" not in st.session_state:
-        # Default to USD if available
-        usd_opt = next((c for c in currency_options if "美金" in c or "USD" in c), None)
-        st.session_state.target_curr_select = usd_opt if usd_opt else currency_options[0]
-
-    def on_source_change():
-        val = st.session_state.source_curr_select
-        if "新台幣" in val or "TWD" in val:
+        if "target_curr_select" not in st.session_state:
+            # Default to USD if available
             usd_opt = next((c for c in currency_options if "美金" in c or "USD" in c), None)
-            if usd_opt:
-                st.session_state.target_curr_select = usd_opt
-        else:
-            twd_opt = next((c for c in currency_options if "新台幣" in c or "TWD" in c), None)
-            if twd_opt:
-                st.session_state.target_curr_select = twd_opt
+            st.session_state.target_curr_select = usd_opt if usd_opt else currency_options[0]
+
+        def on_source_change():
+            val = st.session_state.source_curr_select
+            if "新台幣" in val or "TWD" in val:
+                usd_opt = next((c for c in currency_options if "美金" in c or "USD" in c), None)
+                if usd_opt:
+                    st.session_state.target_curr_select = usd_opt
+            else:
+                twd_opt = next((c for c in currency_options if "新台幣" in c or "TWD" in c), None)
+                if twd_opt:
+                    st.session_state.target_curr_select = twd_opt
+
+        def on_target_change():
+            val = st.session_state.target_curr_select
+            if "新台幣" in val or "TWD" in val:
+                usd_opt = next((c for c in currency_options if "美金" in c or "USD" in c), None)
+                if usd_opt:
+                    st.session_state.source_curr_select = usd_opt
+            else:
+                twd_opt = next((c for c in currency_options if "新台幣" in c or "TWD" in c), None)
+                if twd_opt:
+                    st.session_state.source_curr_select = twd_opt
 
-    def on_target_change():
-        val = st.session_state.target_curr_select
-        if "新台幣" in val or "TWD" in val:
-            usd_opt = next((c for c in currency_options if "美金" in c or "USD" in c), None)
-            if usd_opt:
-                st.session_state.source_curr_select = usd_opt
-        else:
-            twd_opt = next((c for c in currency_options if "新台幣" in c or "TWD" in c), None)
-            if twd_opt:
-                st.session_state.source_curr_select = twd_opt
-
-    # 添加欄位寬度調整控制
-    st.sidebar.markdown("---")
-    st.sidebar.subheader("版面設定")
-    col1_width = st.sidebar.slider("左欄寬度", min_value=1, max_value=10, value=1, step=1)
-    col2_width = st.sidebar.slider("中欄寬度", min_value=1, max_value=10, value=1, step=1)
-    col3_width = st.sidebar.slider("右欄寬度", min_value=1, max_value=10, value=2, step=1)
-
-    # 三欄布局：換算器、溫度計、表格
-    col1, col2, col3 = st.columns([col1_width, col2_width, col3_width])
-    
-    with col1:
-        st.markdown("""
-        <div style='font-size:1.5rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>匯率換算器</div>
-        """, unsafe_allow_html=True)
+        col1, col2 = st.columns([col1_width, col2_width])
+
+        with col1:
+            st.markdown("""
+            <div style='font-size:1.5rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>匯率換算器</div>
+            """, unsafe_allow_html=True)
         
-        if not tradeable:
-            st.info("目前無可交易的貨幣")
-        else:
-            # 初始化金額狀態
-            if 'current_amount' not in st.session_state:
-                st.session_state.current_amount = 10000
+            if not tradeable:
+                st.info("目前無可交易的貨幣")
+            else:
+                # 初始化金額狀態
+                if 'current_amount' not in st.session_state:
+                    st.session_state.current_amount = 10000
             
-            st.markdown('<p style="color: red; font-weight: bold; margin-bottom: 0;">轉換前貨幣</p>', unsafe_allow_html=True)
-            source_currency = st.selectbox(
-                "轉換前貨幣", 
-                currency_options, 
-                key="source_curr_select",
-                on_change=on_source_change,
-                label_visibility="collapsed"
-            )
+                st.markdown('<p style="color: red; font-weight: bold; margin-bottom: 0;">轉換前貨幣</p>', unsafe_allow_html=True)
+                source_currency = st.selectbox(
+                    "轉換前貨幣", 
+                    currency_options, 
+                    key="source_curr_select",
+                    on_change=on_source_change,
+                    label_visibility="collapsed"
+                )
             
-            # ver1 原始輸入格式（與中間欄滑桿雙向同步，支持千位分隔符）
-            formatted_value = f"{st.session_state.current_amount:,}"
-            amount_input = st.text_input(
-                "金額", 
-                value=formatted_value,
-                help="請輸入數字，支持千位分隔符顯示"
-            )
+                # ver1 原始輸入格式（與中間欄滑桿雙向同步，支持千位分隔符）
+                formatted_value = f"{st.session_state.current_amount:,}"
+                amount_input = st.text_input(
+                    "金額", 
+                    value=formatted_value,
+                    help="請輸入數字，支持千位分隔符顯示"
+                )
             
-            # 處理文字輸入轉換為數值
-            try:
-                # 移除千位分隔符並轉為整數
-                amount = int(amount_input.replace(",", "").replace(" ", ""))
-                if amount < 0:
-                    amount = 0
-            except (ValueError, AttributeError):
-                amount = st.session_state.current_amount
+                # 處理文字輸入轉換為數值
+                try:
+                    # 移除千位分隔符並轉為整數
+                    amount = int(amount_input.replace(",", "").replace(" ", ""))
+                    if amount < 0:
+                        amount = 0
+                except (ValueError, AttributeError):
+                    amount = st.session_state.current_amount
             
-            # 檢查輸入框是否變更
-            if amount != st.session_state.current_amount:
-                st.session_state.current_amount = amount
-                st.rerun()
+                # 檢查輸入框是否變更
+                if amount != st.session_state.current_amount:
+                    st.session_state.current_amount = amount
+                    rerun_converter()
             
-            # 轉換貨幣和預估金額已移至中間欄
+                # 轉換貨幣和預估金額已移至中間欄
         
-        # 手動更新按鈕
-        decimals = st.number_input("顯示小數位數", min_value=0, max_value=6, value=0, step=1)
+            # 手動更新按鈕
+            decimals = st.number_input("顯示小數位數", min_value=0, max_value=6, value=0, step=1)
     
-    with col2:
-        # 中間欄：可拖拉金額拉桿
-        if tradeable:
-            # 調整間距使轉換貨幣選擇器與左側轉換前貨幣選擇器對齊
-            st.markdown("<div style='margin-top: 0.5em;'></div>", unsafe_allow_html=True)
-            st.markdown("<div style='margin-top: 0.75em;'></div>", unsafe_allow_html=True)
-            st.markdown("<br>", unsafe_allow_html=True)
+        with col2:
+            # 中間欄：可拖拉金額拉桿
+            if tradeable:
+                # 調整間距使轉換貨幣選擇器與左側轉換前貨幣選擇器對齊
+                st.markdown("<div style='margin-top: 0.5em;'></div>", unsafe_allow_html=True)
+                st.markdown("<div style='margin-top: 0.75em;'></div>", unsafe_allow_html=True)
+                st.markdown("<br>", unsafe_allow_html=True)
             
-            st.markdown('<p style="color: red; font-weight: bold; margin-bottom: 0;">轉換貨幣</p>', unsafe_allow_html=True)
-            target = st.selectbox(
-                "轉換貨幣", 
-                currency_options, 
-                key="target_curr_select",
-                on_change=on_target_change,
-                label_visibility="collapsed"
-            )
+                st.markdown('<p style="color: red; font-weight: bold; margin-bottom: 0;">轉換貨幣</p>', unsafe_allow_html=True)
+                target = st.selectbox(
+                    "轉換貨幣", 
+                    currency_options, 
+                    key="target_curr_select",
+                    on_change=on_target_change,
+                    label_visibility="collapsed"
+                )
             
-            # 從左欄取得decimals值
-            if 'decimals' not in locals():
-                decimals = 0
+                # 從左欄取得decimals值
+                if 'decimals' not in locals():
+                    decimals = 0
             
-            # 貨幣轉換邏輯
-            source_curr = "新台幣" if "新台幣" in source_currency or "TWD" in source_currency else source_currency.split('(')[0].strip()
-            target_curr = "新台幣" if "新台幣" in target or "TWD" in target else target.split('(')[0].strip()
-            input_amount = st.session_state.current_amount
+                # 貨幣轉換邏輯
+                source_curr = base_name(source_currency)
+                target_curr = base_name(target)
+                input_amount = st.session_state.current_amount
             
-            converted_amount, calculation_info = calculate_conversion(
-                source_curr, target_curr, input_amount, source_currency, target, tradeable
-            )
+                with span("converter.conversion"):
+                    converted_amount, calculation_info = calculate_conversion(
+                        source_currency, target, input_amount, cross
+                    )
             
-            display_str = format_display_amount(converted_amount, decimals)
+                display_str = format_display_amount(converted_amount, decimals)
             
-            # 顯示轉換結果和計算式
-            if converted_amount > 0 and calculation_info:
-                st.markdown(f"""
-                <div style="background: #f0f2f6; padding: 15px; border-radius: 8px; margin: 10px 0;">
-                    <div style="font-size: 18px; font-weight: bold; color: #333;">預估金額</div>
-                    <div style="font-size: 18px; font-weight: bold; color: #333;">{display_str}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # 隱藏計算過程
-                # st.markdown(f"""
-                # <div style="background: #e8f5e8; padding: 10px; border-radius: 5px; margin: 5px 0;">
-                #     <div style="font-size: 12px; color: #2e7d32;">{calculation_info}</div>
-                # </div>
-                # """, unsafe_allow_html=True)
-            elif converted_amount == 0 and source_curr == target_curr:
-                st.markdown(f"""
-                <div style="background: #f0f2f6; padding: 15px; border-radius: 8px; margin: 10px 0;">
-                    <div style="font-size: 12px; color: #666;">同貨幣轉換</div>
-                    <div style="font-size: 18px; font-weight: bold; color: #333;">{f'{input_amount:,}'}</div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.write("無法交易或找不到匯率資訊，請檢查匯率資料")
-            
-            # 整個拉桿區域上移（減少間距）
-            # st.markdown("<br><br><br>", unsafe_allow_html=True)
+                # 顯示轉換結果和計算式
+                if converted_amount > 0 and calculation_info:
+                    st.markdown(f"""
+                    <div style="background: #f0f2f6; padding: 15px; border-radius: 8px; margin: 10px 0;">
+                        <div style="font-size: 18px; font-weight: bold; color: #333;">預估金額</div>
+                        <div style="font-size: 18px; font-weight: bold; color: #333;">{display_str}</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                elif converted_amount == 0 and source_curr == target_curr:
+                    st.markdown(f"""
+                    <div style="background: #f0f2f6; padding: 15px; border-radius: 8px; margin: 10px 0;">
+                        <div style="font-size: 12px; color: #666;">同貨幣轉換</div>
+                        <div style="font-size: 18px; font-weight: bold; color: #333;">{f'{input_amount:,}'}</div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                else:
+                    st.write("無法交易或找不到匯率資訊，請檢查匯率資料")
             
-            # 在滑桿前顯示當前值和對應美金金額
-            current_val = st.session_state.current_amount
-            if 'target' in locals() and target:
-                # 使用 calculate_conversion 計算正確的轉換金額
-                converted_slider, _ = calculate_conversion(
-                    source_curr, target_curr, current_val, source_currency, target, tradeable
-                )
+                # 在滑桿前顯示當前值和對應美金金額
+                current_val = st.session_state.current_amount
+                if 'target' in locals() and target:
+                    # 使用 calculate_conversion 計算正確的轉換金額
+                    with span("converter.conversion"):
+                        converted_slider, _ = calculate_conversion(
+                            source_currency, target, current_val, cross
+                        )
                 
-                st.markdown(f"""
-                <div style="text-align: left; font-size: 18px; font-weight: bold; color: #333; margin-bottom: 5px;">
-                    {current_val:,} ({int(converted_slider):,})
-                </div>
-                """, unsafe_allow_html=True)
-
-            # 可拖拉的金額滑桿（與左欄輸入框雙向同步）
-            slider_amount = st.slider(
-                "金額滑桿",
-                min_value=0,
-                max_value=500000,
-                value=st.session_state.current_amount,
-                step=1000,
-                format=" ",
-                help="拖動調整金額，會同步更新左欄輸入框",
-                label_visibility="collapsed"
-            )
+                    st.markdown(f"""
+                    <div style="text-align: left; font-size: 18px; font-weight: bold; color: #333; margin-bottom: 5px;">
+                        {current_val:,} ({int(converted_slider):,})
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                # 可拖拉的金額滑桿（與左欄輸入框雙向同步）
+                slider_amount = st.slider(
+                    "金額滑桿",
+                    min_value=0,
+                    max_value=500000,
+                    value=st.session_state.current_amount,
+                    step=1000,
+                    format=" ",
+                    help="拖動調整金額，會同步更新左欄輸入框",
+                    label_visibility="collapsed"
+                )
             
-            # 檢查滑桿是否變更
-            if slider_amount != st.session_state.current_amount:
-                st.session_state.current_amount = slider_amount
-                st.rerun()
+                # 檢查滑桿是否變更
+                if slider_amount != st.session_state.current_amount:
+                    st.session_state.current_amount = slider_amount
+                    rerun_converter()
+
+                # 溫度計：外幣那一邊目前匯率在近一年歷史中的位置
+                foreign = cross.quote(source_currency if is_twd(target) else target)
+                if foreign is not None and not foreign.is_twd:
+                    with span("converter.thermometer"):
+                        render_thermometer(
+                            {"buy": foreign.buy, "sell": foreign.sell},
+                            foreign.label,
+                            rate_percentile(foreign.code, foreign.buy, foreign.sell),
+                        )
             
 
             
 
-        else:
-            st.markdown("<div style='text-align: center; padding: 50px; color: #999;'>等待匯率資料...</div>", unsafe_allow_html=True)
-    
-    with col3:
+            else:
+                st.markdown("<div style='text-align: center; padding: 50px; color: #999;'>等待匯率資料...</div>", unsafe_allow_html=True)
+
+
+@st.fragment
+def render_tables() -> None:
+    """右欄表格：只在整頁重跑（資料版本變更、版面調整）時重畫"""
+    with render_timer("tables"):
+        snap = get_snapshot()
+
         # Add Chinese font styling for table
         st.markdown("""
         <style>
@@ -462,241 +554,246 @@ def main():
         </style>
         """, unsafe_allow_html=True)
         
-        st.markdown("""
-        <div style='font-size:2rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>美元</div>
-        """, unsafe_allow_html=True)
-        
-        # Prepare table data in ver1 format
-        all_banks_usd = data.get('all_banks_usd', [])
-        display_data = []
+        with span("tables.usd_banks"):
+            st.markdown("""
+            <div style='font-size:2rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>美元</div>
+            """, unsafe_allow_html=True)
         
-        if all_banks_usd:
-            display_data = []
-            # Map for bank names
-            name_map = {
-                "臺灣銀行": "臺灣銀行"
-            }
-            
-            # Filter for target banks - 僅保留臺灣銀行
-            target_banks = ["臺灣銀行"]
-            
-            for rate in all_banks_usd:
-                bank_name = rate.get("bank", "")
-                if bank_name not in target_banks:
-                    continue
-                    
-                display_name = name_map.get(bank_name, bank_name)
-                buy = rate.get("buy")
-                sell = rate.get("sell")
-                
-                # 計算匯損比例：(賣出價-買入價)/買入價 * 100%
-                if buy is not None and sell is not None and buy > 0:
-                    loss_ratio = ((sell - buy) / buy) * 100
-                    loss_ratio_str = f"{loss_ratio:.2f}%"
-                    loss_ratio_num = loss_ratio  # 用於排序的數值
-                else:
-                    loss_ratio_str = "N/A"
-                    loss_ratio_num = float('inf')  # N/A 排在最後
-                
-                display_data.append({
-                    "銀行": display_name,
-                    "幣別": "美金",
-                    "即期買入": str(buy) if buy is not None else "-",
-                    "即期賣出": str(sell) if sell is not None else "-",
-                    "匯損比例": loss_ratio_str,
-                    "外匯匯率更新": "↓",
-                    "_sort_key": loss_ratio_num  # 隱藏的排序鍵
+            # 各銀行的匯損比例、買賣排名與相對臺灣銀行的價差已隨快照算好（依匯損比例由低到高）
+            banks = snap.usd_banks
+
+            if len(banks):
+                df_display = pd.DataFrame({
+                    "銀行": banks.bank,
+                    "即期買入": banks.buy,
+                    "即期賣出": banks.sell,
+                    "匯損比例": banks.spread_pct,
+                    "買入排名": banks.buy_rank,
+                    "賣出排名": banks.sell_rank,
+                    f"買入 vs {banks.reference}": banks.buy_vs_ref,
+                    f"賣出 vs {banks.reference}": banks.sell_vs_ref,
                 })
+                delta_cols = [f"買入 vs {banks.reference}", f"賣出 vs {banks.reference}"]
+
+                # 最佳買入 / 最佳賣出 / 最低匯損以紅色粗體標示
+                def highlight_best(column):
+                    if column.name == "即期買入":
+                        best = banks.buy_rank == 1
+                    elif column.name == "即期賣出":
+                        best = banks.sell_rank == 1
+                    else:
+                        best = column == column.min()
+                    return ['color: red; font-weight: bold' if flag else '' for flag in best]
+
+                styled_df = df_display.style.format(
+                    {
+                        "即期買入": "{:g}", "即期賣出": "{:g}", "匯損比例": "{:.2f}%",
+                        "買入排名": "{:.0f}", "賣出排名": "{:.0f}",
+                        **{col: "{:+.3f}" for col in delta_cols},
+                    },
+                    na_rep="-",
+                ).set_properties(
+                    subset=df_display.columns[1:], **{'text-align': 'center'}
+                ).apply(highlight_best, subset=["即期買入", "即期賣出", "匯損比例"])
+
+                st.dataframe(
+                    styled_df,
+                    use_container_width=True,
+                    column_config={
+                        "銀行": st.column_config.TextColumn("銀行", width="small"),
+                        "即期買入": st.column_config.NumberColumn("即期買入", width="small"),
+                        "即期賣出": st.column_config.NumberColumn("即期賣出", width="small"),
+                        "匯損比例": st.column_config.NumberColumn("匯損比例", width="small"),
+                        "買入排名": st.column_config.NumberColumn("買入排名", width="small"),
+                        "賣出排名": st.column_config.NumberColumn("賣出排名", width="small"),
+                    },
+                    hide_index=True
+                )
             
-            # 按匯損比例從低到高排序
-            display_data.sort(key=lambda x: x["_sort_key"])
-            
-            # 移除排序鍵，只保留顯示欄位
-            for item in display_data:
-                del item["_sort_key"]
-
-        elif rates:
-            display_data = []
-            for rate in rates:
-                # 只保留美金
-                if "美金" not in rate.get("currency", "") and "USD" not in rate.get("currency", ""):
-                    continue
-
-                buy = rate.get("buy")
-                sell = rate.get("sell")
-                
-                # 計算匯損比例：(賣出價-買入價)/買入價 * 100%
-                if buy is not None and sell is not None and buy > 0:
-                    loss_ratio = ((sell - buy) / buy) * 100
-                    loss_ratio_str = f"{loss_ratio:.2f}%"
-                    loss_ratio_num = loss_ratio  # 用於排序的數值
-                else:
-                    loss_ratio_str = "N/A"
-                    loss_ratio_num = float('inf')  # N/A 排在最後
-                
-                display_data.append({
-                    "銀行": "臺灣銀行",
-                    "幣別": "美金",
-                    "即期買入": str(buy) if buy is not None else "暫停交易",
-                    "即期賣出": str(sell) if sell is not None else "暫停交易",
-                    "匯損比例": loss_ratio_str,
-                    "外匯匯率更新": "↓",
-                    "_sort_key": loss_ratio_num  # 隱藏的排序鍵
-                })
-            
-            # 按匯損比例從低到高排序
-            display_data.sort(key=lambda x: x["_sort_key"])
-            
-            # 移除排序鍵，只保留顯示欄位
-            for item in display_data:
-                del item["_sort_key"]
-
-        if display_data:
-            # 使用 dataframe 顯示表格 (與黃金表格相同方式)
-            df = pd.DataFrame(display_data)
-            # 移除「外匯匯率更新」欄位,改用按鈕
-            df_display = df.drop(columns=['外匯匯率更新'])
-            
-            # 設定置中對齊
-            def highlight_red_bold(val):
-                return 'color: red; font-weight: bold; font-size: 1.5em' if val not in [None, '', '-'] else ''
-
-            styled_df = df_display.style.set_properties(
-                subset=["幣別", "即期買入", "即期賣出", "匯損比例"], 
-                **{'text-align': 'center'}
-            ).applymap(highlight_red_bold, subset=["即期買入", "即期賣出", "匯損比例"])
-            
-            st.dataframe(
-                styled_df,
-                use_container_width=True,
-                column_config={
-                    "銀行": st.column_config.TextColumn("銀行", width="small"),
-                    "幣別": st.column_config.TextColumn("幣別", width="small"),
-                    "即期買入": st.column_config.TextColumn("即期買入", width="small"),
-                    "即期賣出": st.column_config.TextColumn("即期賣出", width="small"),
-                    "匯損比例": st.column_config.TextColumn("匯損比例", width="small"),
-                },
-                hide_index=True
-            )
-            
-            # 在表格下方顯示匯率資料更新時間（使用匯率網站的更新時間）
-            current_data = get_cached_rates()
-            rates_update_time_str = current_data.get('rates_update_time', '')
-            # 優先使用網站提供的更新時間，若無則回退到快取的 `updated_at`
-            shown = None
-            from datetime import datetime
-            if rates_update_time_str:
-                try:
-                    dt = datetime.strptime(rates_update_time_str, '%Y/%m/%d %H:%M')
-                    shown = dt.strftime('%Y年%m月%d日 %H:%M:%S')
-                except Exception:
-                    shown = None
-
-            if not shown:
-                cache_updated = current_data.get('updated_at')
-                if cache_updated:
-                    try:
-                        # cache 是 ISO 格式，例如 2025-12-17T05:16:00+00:00
-                        dt = datetime.fromisoformat(cache_updated)
-                        # 轉為本機時區並格式化
-                        if dt.tzinfo is None:
-                            dt = dt.replace(tzinfo=timezone.utc)
-                        local_time = dt.astimezone().strftime('%Y年%m月%d日 %H:%M:%S')
-                        shown = local_time
-                    except Exception:
-                        shown = None
-
-            if shown:
-                st.markdown(f"<p style='color: blue; font-size: 14px;'>更新時間: {shown}</p>", unsafe_allow_html=True)
-        else:
-            st.warning("暫無匯率資料")
-        
-        # ...已移除定存利率假資料表格...
+                # 在表格下方顯示匯率資料更新時間（使用匯率網站的更新時間）
+                # 優先使用網站提供的更新時間，若無則回退到快取的 `updated_at`
+                shown = snap.rates_updated_display
+                if shown:
+                    st.markdown(f"<p style='color: blue; font-size: 14px;'>更新時間: {shown}</p>", unsafe_allow_html=True)
+            else:
+                st.warning("暫無匯率資料")
         
         # 黃金價格表格
-        st.markdown("""
-        <div style='font-size:2rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>黃金存摺</div>
-        """, unsafe_allow_html=True)
+        with span("tables.gold"):
+            st.markdown("""
+            <div style='font-size:2rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>黃金存摺</div>
+            """, unsafe_allow_html=True)
         
-        # 準備黃金數據 - 重新獲取最新資料
-        current_data = get_cached_rates()
-        gold_data = []
+            # 準備黃金數據
+            gold_data = []
         
-        # 從快取中獲取黃金價格
-        gold_price = current_data.get('gold_price', {})
-        buy = gold_price.get('buy')
-        sell = gold_price.get('sell')
+            # 從快照中獲取黃金價格
+            gold_price = snap.gold_price
+            buy = gold_price.get('buy')
+            sell = gold_price.get('sell')
         
-        # 計算價差：賣出價 - 買入價
-        if buy is not None and sell is not None:
-            price_diff = sell - buy
-            price_diff_str = f"{price_diff:,.0f}"
-        else:
-            price_diff_str = "N/A"
+            # 計算價差：賣出價 - 買入價
+            if buy is not None and sell is not None:
+                price_diff = sell - buy
+                price_diff_str = f"{price_diff:,.0f}"
+            else:
+                price_diff_str = "N/A"
         
-        # 使用可讀的替代文字填補空值，避免 UI 顯示空白格
-        buy_display = f"{buy:,.0f}" if buy is not None else "暫停交易"
-        sell_display = f"{sell:,.0f}" if sell is not None else "暫停交易"
-        price_diff_display = price_diff_str if buy is not None and sell is not None else "N/A"
-
-        gold_data.append({
-            "銀行": "臺灣銀行",
-            "每克黃金": "黃金 (GOLD)",
-            "買入": buy_display,
-            "賣出": sell_display,
-            "價差": price_diff_display
-        })
+            # 使用可讀的替代文字填補空值，避免 UI 顯示空白格
+            buy_display = f"{buy:,.0f}" if buy is not None else "暫停交易"
+            sell_display = f"{sell:,.0f}" if sell is not None else "暫停交易"
+            price_diff_display = price_diff_str if buy is not None and sell is not None else "N/A"
+
+            gold_data.append({
+                "銀行": "臺灣銀行",
+                "每克黃金": "黃金 (GOLD)",
+                "買入": buy_display,
+                "賣出": sell_display,
+                "價差": price_diff_display
+            })
         
-        if gold_data:
-            df_gold = pd.DataFrame(gold_data)
-            def highlight_gold_red_bold(val):
-                return 'color: red; font-weight: bold; font-size: 1.5em' if val not in [None, '', '-'] else ''
-
-            styled_df_gold = df_gold.style.set_properties(
-                subset=["每克黃金", "買入", "賣出", "價差"], 
-                **{'text-align': 'center'}
-            ).applymap(highlight_gold_red_bold, subset=["買入", "賣出", "價差"])
+            if gold_data:
+                df_gold = pd.DataFrame(gold_data)
+                def highlight_gold_red_bold(val):
+                    return 'color: red; font-weight: bold; font-size: 1.5em' if val not in [None, '', '-'] else ''
+
+                styled_df_gold = df_gold.style.set_properties(
+                    subset=["每克黃金", "買入", "賣出", "價差"], 
+                    **{'text-align': 'center'}
+                ).map(highlight_gold_red_bold, subset=["買入", "賣出", "價差"])
             
-            st.dataframe(
-                styled_df_gold,
-                use_container_width=True,
-                column_config={
-                    "銀行": st.column_config.TextColumn("銀行", width="small"),
-                    "每克黃金": st.column_config.TextColumn("每克黃金", width="small"),
-                    "買入": st.column_config.TextColumn("買入", width="small"),
-                    "賣出": st.column_config.TextColumn("賣出", width="small"),
-                    "價差": st.column_config.TextColumn("價差", width="small"),
-                },
-                hide_index=True
-            )
+                st.dataframe(
+                    styled_df_gold,
+                    use_container_width=True,
+                    column_config={
+                        "銀行": st.column_config.TextColumn("銀行", width="small"),
+                        "每克黃金": st.column_config.TextColumn("每克黃金", width="small"),
+                        "買入": st.column_config.TextColumn("買入", width="small"),
+                        "賣出": st.column_config.TextColumn("賣出", width="small"),
+                        "價差": st.column_config.TextColumn("價差", width="small"),
+                    },
+                    hide_index=True
+                )
             
-            # 在黃金更新按鈕下方顯示資料更新時間（使用黃金網站的更新時間）
-            gold_update_time_str = gold_price.get('update_time', '')
-            # 同樣優先使用黃金網站時間，否則顯示快取時間
-            shown_gold = None
-            from datetime import datetime
-            if gold_update_time_str:
-                try:
-                    dt = datetime.strptime(gold_update_time_str, '%Y/%m/%d %H:%M')
-                    shown_gold = dt.strftime('%Y年%m月%d日 %H:%M:%S')
-                except Exception:
-                    shown_gold = None
-
-            if not shown_gold:
-                cache_updated = current_data.get('updated_at')
-                if cache_updated:
-                    try:
-                        dt = datetime.fromisoformat(cache_updated)
-                        if dt.tzinfo is None:
-                            dt = dt.replace(tzinfo=timezone.utc)
-                        local_time = dt.astimezone().strftime('%Y年%m月%d日 %H:%M:%S')
-                        shown_gold = local_time
-                    except Exception:
-                        shown_gold = None
-
-            if shown_gold:
-                st.markdown(f"<p style='color: blue; font-size: 14px;'>更新時間: {shown_gold}</p>", unsafe_allow_html=True)
+                # 在黃金更新按鈕下方顯示資料更新時間（優先使用黃金網站的更新時間，否則顯示快取時間）
+                shown_gold = snap.gold_updated_display
+                if shown_gold:
+                    st.markdown(f"<p style='color: blue; font-size: 14px;'>更新時間: {shown_gold}</p>", unsafe_allow_html=True)
+
+        with span("tables.cross_rates"):
+            render_cross_rate_matrix(cross_rates_for(snap))
+
+
+@st.fragment
+def render_history() -> None:
+    """歷史走勢：切換幣別或區間只重跑此片段；每條線先在伺服器端以 LTTB 降到固定點數再送到瀏覽器"""
+    with render_timer("history"):
+        store = get_history_store()
+        with span("history.load"):
+            try:
+                store.catch_up()
+            except OSError as e:
+                print(f"Error reading rate history: {e}")
+        codes = store.keys()
+        if not codes:
+            return
+
+        st.markdown("""
+        <div style='font-size:2rem;font-weight:700;margin-bottom:0.5em;line-height:1.2;'>歷史走勢</div>
+        """, unsafe_allow_html=True)
+
+        cross = cross_rates_for(get_snapshot())
+        labels = {code: (cross.quote(code).label if cross.quote(code) else code) for code in codes}
+        pick_col, range_col = st.columns([1, 2])
+        with pick_col:
+            code = st.selectbox(
+                "幣別", codes, index=codes.index("USD") if "USD" in codes else 0,
+                format_func=labels.get, key="history_code", label_visibility="collapsed"
+            )
+        with range_col:
+            range_label = st.radio(
+                "區間", list(HISTORY_RANGES), index=2, horizontal=True,
+                key="history_range", label_visibility="collapsed"
+            )
+
+        with span("history.chart"):
+            end = time.time()
+            days = HISTORY_RANGES[range_label]
+            start = None if days is None else end - days * 86400
+            frames = []
+            for field, name in (("buy", "買入"), ("sell", "賣出")):
+                ts, values = store.series(code, field, start, end, HISTORY_POINTS)
+                if len(ts):
+                    frames.append(pd.DataFrame({
+                        "時間": pd.to_datetime(ts, unit="s", utc=True).tz_convert(TAIPEI_TZ),
+                        "匯率": values,
+                        "報價": name,
+                    }))
+            if not frames:
+                st.caption("此區間沒有資料")
+                return
+            st.line_chart(pd.concat(frames, ignore_index=True), x="時間", y="匯率", color="報價")
+            st.caption(f"依變更事件記錄繪製，每條線最多 {HISTORY_POINTS} 點")
+
+
+def main():
+    """主應用程式 - 高速版本"""
+    st.set_page_config(
+        page_title="美元黃金轉換", 
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
+
+    with render_timer("page"):
+        # 主標題再往上移動5行（共6行空白）
+        st.markdown("<div style='font-size:2.5rem;font-weight:800;margin-bottom:0.5em;line-height:1.1;'>美元黃金轉換</div>", unsafe_allow_html=True)
+
+        # 簡化 CSS
+        st.markdown("""
+        <style>
+        .stApp {font-family:'Microsoft JhengHei',sans-serif;}
+        #MainMenu{visibility:hidden;}footer{visibility:hidden;}.stDeployButton{display:none;}
+        </style>
+        """, unsafe_allow_html=True)
+
+        # 直接以磁碟上的快照繪製頁面，網路更新交給背景執行緒
+        refresher = get_background_refresher()
+        snap = get_snapshot()
+        st.session_state.rendered_version = snap.version
+        watch_snapshot_version()
+
+        if not snap:
+            st.error("無法取得匯率資料")
+            if get_rates_cache().refreshing():
+                st.caption("資料更新中，請稍後重新整理")
+            if st.button("立即更新", type="primary"):
+                get_rates_cache().invalidate()
+                refresher.poke(force=True)
+                st.rerun()
+            return
+
+        # 添加欄位寬度調整控制
+        st.sidebar.markdown("---")
+        st.sidebar.subheader("版面設定")
+        col1_width = st.sidebar.slider("左欄寬度", min_value=1, max_value=10, value=1, step=1)
+        col2_width = st.sidebar.slider("中欄寬度", min_value=1, max_value=10, value=1, step=1)
+        col3_width = st.sidebar.slider("右欄寬度", min_value=1, max_value=10, value=2, step=1)
+        st.sidebar.checkbox("顯示渲染耗時", key="show_render_timing")
+
+        # 版面：換算器（左、中欄）與表格（右欄）各自是獨立重跑的片段
+        converter_col, table_col = st.columns([col1_width + col2_width, col3_width])
+
+        with converter_col:
+            render_converter(col1_width, col2_width)
+
+        with table_col:
+            render_tables()
+
+        render_history()
+
+        if st.query_params.get("debug") == "1":
+            render_debug_panel()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
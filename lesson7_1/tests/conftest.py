@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rates import events, locking, storage  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point the cache, lock and event-log paths at a temp directory."""
+    for mod in (storage, locking, events):
+        for name, value in list(vars(mod).items()):
+            if isinstance(value, str) and value.startswith(ROOT):
+                monkeypatch.setattr(mod, name, str(tmp_path) + value[len(ROOT):])
+    storage._file_memo.clear()
+    storage._merged_memo.clear()
+    yield tmp_path
+    storage._file_memo.clear()
+    storage._merged_memo.clear()
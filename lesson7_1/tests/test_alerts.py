@@ -0,0 +1,96 @@
+from rates import storage
+from rates.alerts import AlertEngine, AlertRule
+from rates.storage import events_offset, read_events, write_segment
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _engine(*rules, **kwargs):
+    sent = []
+    engine = AlertEngine([sent.append], **kwargs)
+    for text, extra in rules:
+        engine.add_rule(AlertRule.parse(text, **extra))
+    return engine, sent
+
+
+def test_rule_fires_only_when_value_crosses_threshold():
+    engine, sent = _engine(("USD sell < 31.2", {"rule_id": "cheap"}))
+    engine.evaluate({("USD", "sell"): 31.5}, {("USD", "sell"): 31.3})
+    assert sent == []
+    engine.evaluate({("USD", "sell"): 31.3}, {("USD", "sell"): 31.1})
+    assert [a["rule_id"] for a in sent] == ["cheap"]
+    # staying below the threshold is not a new crossing
+    engine.evaluate({("USD", "sell"): 31.1}, {("USD", "sell"): 31.0})
+    assert len(sent) == 1
+
+
+def test_only_thresholds_between_old_and_new_are_visited():
+    engine, sent = _engine(*[(f"USD sell > {t}", {"rule_id": f"r{t}"}) for t in (31, 32, 33, 34)])
+    engine.evaluate({("USD", "sell"): 31.5}, {("USD", "sell"): 33.5})
+    assert sorted(a["rule_id"] for a in sent) == ["r32", "r33"]
+    assert engine.stats["rules_visited"] == 2
+
+
+def test_debounce_suppresses_flapping():
+    clock = Clock()
+    engine, sent = _engine(("GOLD spread > 60", {"debounce_seconds": 600}), clock=clock)
+    engine.evaluate({("GOLD", "spread"): 50}, {("GOLD", "spread"): 70})
+    engine.evaluate({("GOLD", "spread"): 70}, {("GOLD", "spread"): 50})
+    clock.now += 60
+    engine.evaluate({("GOLD", "spread"): 50}, {("GOLD", "spread"): 70})
+    assert len(sent) == 1 and engine.stats["debounced"] == 1
+    clock.now += 600
+    engine.evaluate({("GOLD", "spread"): 70}, {("GOLD", "spread"): 50})
+    engine.evaluate({("GOLD", "spread"): 50}, {("GOLD", "spread"): 70})
+    assert len(sent) == 2
+
+
+def test_catch_up_sees_commits_from_any_writer(data_dir):
+    state = str(data_dir / "alerts_state.json")
+    write_segment("fx", [{"code": "USD", "buy": 31.3, "sell": 31.45}])
+    engine, sent = _engine(("USD sell < 31.2", {"rule_id": "cheap"}), ("USD spread > 0.3", {"rule_id": "wide"}),
+                           state_path=state)
+    assert engine.catch_up() == []  # first run starts at the current data
+
+    # e.g. Streamlit's background refresher commits; no hook in this process is involved
+    write_segment("fx", [{"code": "USD", "buy": 30.8, "sell": 31.15}])
+    assert sorted(a["rule_id"] for a in engine.catch_up()) == ["cheap", "wide"]
+    assert engine.catch_up() == []
+
+    # a fresh process resumes from the saved offset instead of re-firing or missing commits
+    write_segment("fx", [{"code": "USD", "buy": 31.3, "sell": 31.45}])
+    write_segment("fx", [{"code": "USD", "buy": 31.0, "sell": 31.1}])
+    engine2, sent2 = _engine(("USD sell < 31.2", {"rule_id": "cheap"}), state_path=state)
+    assert [a["rule_id"] for a in engine2.catch_up()] == ["cheap"]
+    assert sent2[0]["old"] == 31.45 and sent2[0]["new"] == 31.1
+
+
+def test_checkpoint_replay_after_compaction_only_seeds_values(data_dir, monkeypatch):
+    monkeypatch.setattr(storage._event_log, "segment_bytes", 600)
+    monkeypatch.setattr(storage._event_log, "max_segments", 2)
+    state = str(data_dir / "alerts_state.json")
+    write_segment("fx", [{"code": "USD", "buy": 31.3, "sell": 31.45}])
+    engine, _ = _engine(("USD sell < 31.2", {"rule_id": "cheap"}), state_path=state)
+    engine.catch_up()
+
+    # the engine is down while the crossing and enough later commits go by to compact it away
+    write_segment("fx", [{"code": "USD", "buy": 31.0, "sell": 31.1}])
+    for i in range(1, 30):
+        write_segment("fx", [{"code": "USD", "buy": 31.0 - i / 100, "sell": 31.1}])
+    events, _ = read_events(engine.offset)
+    assert events[0].get("checkpoint")
+
+    restarted, sent = _engine(("USD sell < 31.2", {"rule_id": "cheap"}), state_path=state)
+    assert restarted.catch_up() == [] and sent == []
+    assert restarted.offset == events_offset()
+    # the seeded value is the baseline for the next real commit
+    write_segment("fx", [{"code": "USD", "buy": 30.5, "sell": 31.5}])
+    write_segment("fx", [{"code": "USD", "buy": 30.5, "sell": 31.0}])
+    assert [a["rule_id"] for a in restarted.catch_up()] == ["cheap"]
+    assert sent[0]["old"] == 31.5
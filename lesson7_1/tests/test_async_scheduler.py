@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+from conftest import ROOT  # noqa: F401
+from rates.async_scheduler import AsyncScheduler
+
+
+def test_timeouts_are_counted_and_the_job_keeps_running():
+    calls = []
+
+    async def hang():
+        calls.append(1)
+        await asyncio.Event().wait()
+
+    async def main():
+        sched = AsyncScheduler()
+        job = sched.add_job("hang", hang, 0.01, timeout=0.01, run_immediately=True)
+        runner = asyncio.create_task(sched.run())
+        while job.metrics.timeouts < 2:
+            await asyncio.sleep(0.005)
+        await sched.shutdown(grace_seconds=1)
+        await runner
+        return job
+
+    job = asyncio.run(main())
+    assert job.metrics.timeouts >= 2 and job.metrics.failures == job.metrics.runs
+    assert len(calls) >= 2 and "TimeoutError" in job.metrics.last_error
+
+
+def test_blocking_jobs_run_off_the_loop_thread():
+    threads = []
+    done = threading.Event()
+
+    def blocking():
+        threads.append(threading.current_thread().name)
+        done.set()
+
+    sched = AsyncScheduler()
+    sched.add_blocking_job("fetch", blocking, 3600, run_immediately=True)
+    sched.start()
+    try:
+        assert done.wait(5)
+        assert sched.submit(sched.run_blocking(lambda x: x * 2, 21)).result(5) == 42
+    finally:
+        sched.stop(grace_seconds=1)
+    assert threads[0].startswith("async-scheduler") and threads[0] != "async-scheduler"
+    assert sched.inspect()["fetch"]["runs"] == 1
+
+
+def test_shutdown_cancels_runs_that_outlive_the_grace_period():
+    started = threading.Event()
+    cancelled = []
+
+    async def slow():
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    sched = AsyncScheduler()
+    sched.add_job("slow", slow, 3600, run_immediately=True)
+    sched.start()
+    assert started.wait(5)
+    sched.stop(grace_seconds=0.05)
+    assert cancelled == [True]
+    assert sched.loop is None
@@ -0,0 +1,98 @@
+import importlib.util
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import ROOT
+from rates.storage import write_segment
+
+_spec = importlib.util.spec_from_file_location("backup_rates", os.path.join(ROOT, "scripts", "backup_rates.py"))
+backup_rates = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(backup_rates)
+
+T0 = datetime(2026, 10, 19, 9, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    backup_dir = tmp_path / "backup"
+    monkeypatch.setattr(backup_rates, "BACKUP_DIR", backup_dir)
+    monkeypatch.setattr(backup_rates, "INDEX_FILE", backup_dir / "index.jsonl")
+    monkeypatch.setattr(backup_rates, "SNAPSHOT_DIR", backup_dir / "snapshots")
+    monkeypatch.setattr(backup_rates, "ARCHIVE_DIR", backup_dir / "archives")
+    monkeypatch.setattr(backup_rates, "LOCK_FILE", backup_dir / ".backup.lock")
+    monkeypatch.setattr(backup_rates, "setup_json_logging", lambda *args, **kwargs: None)
+    backup_rates.ensure_dirs()
+    return backup_rates
+
+
+def payload(usd_buy, version=1, updated_at="2026-10-19T09:00:00+00:00"):
+    return {
+        "version": version,
+        "updated_at": updated_at,
+        "segments": {"fx": {"version": version}},
+        "rates": [{"code": "USD", "buy": usd_buy, "sell": usd_buy + 0.15}],
+        "gold_price": {"buy": 4000, "sell": 4050},
+    }
+
+
+def test_rewrite_with_same_rates_is_deduplicated(store):
+    first, digest = store.store_snapshot(payload(31.4), T0)
+    again, same = store.store_snapshot(payload(31.4, version=2, updated_at="later"), T0 + timedelta(minutes=10))
+    assert first is not None and again is None
+    assert same == digest
+    changed, other = store.store_snapshot(payload(31.5, version=3), T0 + timedelta(minutes=20))
+    assert changed is not None and other != digest
+    assert len(store.read_index()) == 2
+
+
+def test_stored_snapshot_holds_rate_data_only(store):
+    entry, _ = store.store_snapshot(payload(31.4), T0)
+    snap = store.load_snapshot(entry)
+    assert set(snap) == {"rates", "gold_price"}
+
+
+def test_find_entry_picks_latest_ts_after_legacy_import(store):
+    current, _ = store.store_snapshot(payload(31.5), T0)
+    legacy, _ = store.store_snapshot(payload(30.0), T0 - timedelta(days=300))
+    assert legacy is not None
+
+    entries = store.read_index()
+    assert [e["ts"] for e in entries] == sorted((e["ts"] for e in entries), key=store.parse_ts)
+    assert store.find_entry(T0 + timedelta(hours=1))["hash"] == current["hash"]
+    assert store.find_entry(T0 - timedelta(days=1))["hash"] == legacy["hash"]
+    assert store.find_entry(T0 - timedelta(days=400)) is None
+
+
+def test_dedupe_compares_with_entry_before_insertion_point(store):
+    old, _ = store.store_snapshot(payload(30.0), T0 - timedelta(days=2))
+    store.store_snapshot(payload(31.5), T0)
+    # same rates as the entry in effect two days ago: nothing new to index
+    dup, _ = store.store_snapshot(payload(30.0), T0 - timedelta(days=1))
+    assert dup is None
+    # same rates as the newest entry, but inserted before it: still a change at that time
+    between, _ = store.store_snapshot(payload(31.5), T0 - timedelta(hours=12))
+    assert between is not None
+    assert len(store.read_index()) == 3
+
+
+def test_backup_skips_when_there_are_no_segments(store, data_dir):
+    # read_cache() would fall back to the bundled sample data here
+    (data_dir / "data").mkdir(exist_ok=True)
+    (data_dir / "data" / "sample_cache.json").write_text('{"rates": [{"code": "USD", "buy": 1, "sell": 2}]}')
+    assert store.backup() == 1
+    assert store.read_index() == []
+
+    write_segment("fx", [{"code": "USD", "buy": 31.4, "sell": 31.55}])
+    assert store.backup() == 0
+    (entry,) = store.read_index()
+    assert store.load_snapshot(entry)["rates"][0]["buy"] == 31.4
+
+
+def test_verify_ignores_unfinished_archive_writes(store, capsys):
+    store.store_snapshot(payload(31.4), T0)
+    assert store.pack(today="2026-10-20") == 1
+    (store.ARCHIVE_DIR / "2026-10-19.jsonl.xz.1234.tmp").write_bytes(b"partial")
+    assert store.verify() == 0
+    assert "0 problems" in capsys.readouterr().out
@@ -0,0 +1,58 @@
+import logging
+
+from rates.cache import BackgroundRefresher, TieredCache
+from rates.storage import write_segment
+
+
+def _fx(usd_buy):
+    return [{"code": "USD", "buy": usd_buy, "sell": usd_buy + 0.15}]
+
+
+def test_memory_hit_sees_commit_from_another_process(data_dir):
+    write_segment("fx", _fx(31.4))
+    cache = TieredCache(refresher=lambda name: False)
+    first = cache.get("fx")
+    assert cache.get("fx") is first
+    # e.g. the updater daemon commits while the memory copy is still fresh
+    write_segment("fx", _fx(31.5))
+    second = cache.get("fx")
+    assert second["version"] == first["version"] + 1
+    assert second["data"][0]["buy"] == 31.5
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["disk_hits"] == 2
+
+
+def test_refresh_counts_only_real_writes(data_dir):
+    results = iter([False, True])
+    cache = TieredCache(refresher=lambda name: next(results))
+    cache.refresh("fx")
+    assert cache.stats()["refreshes"] == 0
+    cache.refresh("fx")
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_forced_pass_refetches_fresh_segments(data_dir):
+    write_segment("fx", _fx(31.4))
+    fetched = []
+
+    def refresher(name):
+        fetched.append(name)
+        return True
+
+    refresher_thread = BackgroundRefresher(TieredCache(refresher=refresher), segments=("fx",))
+    refresher_thread.run_once()
+    assert fetched == []
+    refresher_thread.run_once(force=True)
+    assert fetched == ["fx"]
+
+
+def test_refresh_errors_are_logged_with_traceback(data_dir, caplog):
+    def refresher(name):
+        raise ConnectionError("down")
+
+    cache = TieredCache(refresher=refresher)
+    with caplog.at_level(logging.ERROR, logger="rates.cache"):
+        cache.refresh("fx")
+    assert cache.stats()["refresh_errors"] == 1
+    (record,) = caplog.records
+    assert "fx" in record.getMessage() and record.exc_info[0] is ConnectionError
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates import storage
+from rates.events import EventLog
+from rates.history import HistoryStore
+from rates.storage import events_offset, read_events, write_segment
+
+
+def _event(i):
+    return {"version": i, "segment": "fx", "currency": "USD", "field": "sell", "old": None, "new": 31.0 + i / 100}
+
+
+@pytest.fixture
+def log(tmp_path):
+    state = {"values": []}
+    log = EventLog(str(tmp_path / "events.log"), checkpoint=lambda: list(state["values"]), segment_bytes=400)
+    log.state = state
+    return log
+
+
+def _append(log, n, start=0):
+    for i in range(start, start + n):
+        # like write_segment: the data is committed before its events are appended
+        log.state["values"] = [_event(i)]
+        log.append([_event(i)])
+
+
+def test_offsets_are_contiguous_and_resumable(tmp_path):
+    log = EventLog(str(tmp_path / "events.log"))
+    assert log.end_offset() == 0 and log.read(0) == ([], 0)
+    log.append([_event(1), _event(2)])
+    events, end = log.read(0)
+    assert [e["version"] for e in events] == [1, 2]
+    assert end == log.end_offset() == os.path.getsize(tmp_path / "events.log")
+    # each offset points at its own line
+    assert log.read(events[1]["offset"])[0] == [events[1]]
+    log.append([_event(3)])
+    assert [e["version"] for e in log.read(end)[0]] == [3]
+
+
+def test_offsets_keep_counting_across_rolled_segments(log, tmp_path):
+    _append(log, 12)
+    assert len(os.listdir(tmp_path / "events")) > 2  # rolled segments and their checkpoints
+
+    events, end = log.read(0)
+    assert [e["version"] for e in events] == list(range(12))
+    assert end == log.end_offset()
+    assert all(a["offset"] < b["offset"] for a, b in zip(events, events[1:]))
+    # resume from any event, in small batches that cross segment boundaries
+    seen, offset = [], events[3]["offset"]
+    while True:
+        batch, offset = log.read(offset, limit=2)
+        if not batch:
+            break
+        seen.extend(e["version"] for e in batch)
+    assert seen == list(range(3, 12)) and offset == end
+
+
+def test_compaction_drops_old_segments_and_serves_the_checkpoint(log):
+    log.max_segments = 2
+    _append(log, 20)
+    start = log.start_offset()
+    assert start > 0
+
+    events, end = log.read(0)
+    checkpoint = [e for e in events if e.get("checkpoint")]
+    assert checkpoint and all(e["offset"] == start for e in checkpoint)
+    assert events[:len(checkpoint)] == checkpoint
+    rest = [e["version"] for e in events[len(checkpoint):]]
+    assert rest == sorted(rest) and rest[-1] == 19
+    # the checkpoint holds the value in force just before the oldest kept event
+    assert checkpoint[-1]["version"] == rest[0] - 1
+    assert end == log.end_offset()
+
+
+def test_window_start_skips_segments_older_than_the_window(log, tmp_path):
+    _append(log, 12)
+    checkpoints = sorted(n for n in os.listdir(tmp_path / "events") if n.endswith(".checkpoint.json"))
+    old, recent = checkpoints[0], checkpoints[-1]
+    os.utime(tmp_path / "events" / old, (1000, 1000))
+    os.utime(tmp_path / "events" / recent, (5000, 5000))
+    assert log.window_start(since=100) == 0
+    assert log.window_start(since=2000) == int(old.split(".")[0])
+    assert log.window_start(since=9000) == int(recent.split(".")[0])
+
+
+def test_reader_recovers_when_the_active_file_is_missing(log, tmp_path):
+    # a crash between the two renames of a roll leaves no events.log
+    _append(log, 6)
+    end = log.end_offset()
+    os.remove(tmp_path / "events.log")
+    assert log.end_offset() <= end
+    _append(log, 1, start=6)
+    events, _ = log.read(0)
+    assert [e["version"] for e in events][-1] == 6
+    assert all(a["offset"] < b["offset"] for a, b in zip(events, events[1:]))
+
+
+def test_history_loads_from_the_window_checkpoint(data_dir, monkeypatch):
+    monkeypatch.setattr(storage._event_log, "segment_bytes", 600)
+    for i in range(10):
+        write_segment("fx", [{"code": "USD", "buy": 31.0 + i / 10, "sell": 31.5 + i / 10}])
+    events_dir = data_dir / "data" / "events"
+    checkpoints = sorted(n for n in os.listdir(events_dir) if n.endswith(".checkpoint.json"))
+    assert len(checkpoints) >= 3
+    # every roll but the last happened "long ago"
+    for name in checkpoints[:-1]:
+        os.utime(events_dir / name, (1000, 1000))
+    window = int(checkpoints[-2].split(".")[0])
+
+    store = HistoryStore(window_days=1)
+    store.catch_up()
+    assert store.offset == events_offset()
+    # seeded with the checkpoint's value, then the events after it; older segments were never read
+    after = [e for e in read_events(window)[0] if e["field"] == "sell"]
+    assert store.count("USD", "sell") == 1 + len(after)
+    ts, values = store.series("USD", "sell", points=100)
+    assert values[-1] == pytest.approx(32.4)
+    assert store.catch_up() == 0
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates.history import HistoryStore, lttb
+from rates.storage import write_segment
+
+
+def test_lttb_keeps_endpoints_and_length():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 300) + np.random.default_rng(3).normal(0, 0.05, len(x))
+    sx, sy = lttb(x, y, 500)
+    assert len(sx) == len(sy) == 500
+    assert (sx[0], sy[0]) == (x[0], y[0]) and (sx[-1], sy[-1]) == (x[-1], y[-1])
+    assert np.all(np.diff(sx) > 0)
+    # every kept point is a real sample
+    assert np.array_equal(y[sx.astype(int)], sy)
+
+
+def test_lttb_keeps_a_lone_spike():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 5.0
+    assert 5.0 in lttb(x, y, 50)[1]
+
+
+@pytest.mark.parametrize("threshold", [0, 2, 10, 11])
+def test_lttb_returns_short_series_unchanged(threshold):
+    x, y = np.arange(10, dtype=float), np.arange(10, dtype=float) ** 2
+    sx, sy = lttb(x, y, threshold)
+    assert sx is x and sy is y
+
+
+def _event(sell, ts):
+    iso = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+    return {"segment": "fx", "currency": "USD", "field": "sell", "new": sell, "ts": iso}
+
+
+def test_series_carries_values_to_the_range_edges():
+    store = HistoryStore()
+    store._fold([_event(31.5, 1000.0), _event(31.6, 2000.0), _event(31.4, 3000.0)])
+    ts, values = store.series("USD", "sell", start=1500.0, end=2500.0)
+    # 31.5 was still in force at the start; 31.6 holds until the end
+    assert list(ts) == [1500.0, 2000.0, 2500.0]
+    assert list(values) == [31.5, 31.6, 31.6]
+    assert store.series("EUR", "sell")[0].size == 0
+
+
+def test_catch_up_reads_only_new_events(data_dir):
+    write_segment("fx", [{"code": "USD", "buy": 31.0, "sell": 31.5}])
+    store = HistoryStore()
+    assert store.catch_up() == 2
+    assert store.catch_up() == 0
+    write_segment("fx", [{"code": "USD", "buy": 31.0, "sell": 31.6}])
+    assert store.catch_up() == 1
+    assert store.count("USD", "sell") == 2 and store.keys() == ["USD"]
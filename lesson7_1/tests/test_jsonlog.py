@@ -0,0 +1,36 @@
+import logging
+
+from conftest import ROOT  # noqa: F401
+from rates.jsonlog import JsonFormatter, SizeAndDailyRotatingFileHandler
+
+
+def _record(msg):
+    return logging.LogRecord("rates.test", logging.INFO, __file__, 1, msg, None, None)
+
+
+def _handler(path):
+    handler = SizeAndDailyRotatingFileHandler(str(path), max_bytes=1024 * 1024, backup_count=3)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def test_second_writer_reopens_instead_of_rotating_again(tmp_path):
+    path = tmp_path / "update.log"
+    first, second = _handler(path), _handler(path)
+    try:
+        first.emit(_record("a" * 150))
+        second.emit(_record("b" * 150))
+
+        first.doRollover()
+        second.doRollover()  # already rotated by `first`: must not push update.log.1 to .2
+        first.emit(_record("after-first"))
+        second.emit(_record("after-second"))
+    finally:
+        first.close()
+        second.close()
+
+    assert not (tmp_path / "update.log.2").exists()
+    rotated = (tmp_path / "update.log.1").read_text(encoding="utf-8")
+    assert "a" * 150 in rotated and "b" * 150 in rotated
+    current = path.read_text(encoding="utf-8")
+    assert "after-first" in current and "after-second" in current
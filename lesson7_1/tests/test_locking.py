@@ -0,0 +1,49 @@
+import threading
+
+from rates import locking
+from rates.locking import FileLock, single_flight
+
+
+def test_exclusive_lock_times_out_while_held(data_dir):
+    path = str(data_dir / "data" / ".t.lock")
+    with FileLock(path):
+        other = FileLock(path, timeout=0.1)
+        assert other.acquire() is False
+    assert FileLock(path).acquire(timeout=0) is True
+
+
+def test_single_flight_lets_one_caller_fetch(data_dir):
+    entered, release = threading.Event(), threading.Event()
+    results = []
+
+    def leader():
+        with single_flight(name="fx") as should_fetch:
+            results.append(("leader", should_fetch))
+            entered.set()
+            release.wait(5)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    entered.wait(5)
+    with single_flight(wait_seconds=0.1, name="fx") as should_fetch:
+        results.append(("follower", should_fetch))
+    # a different source refreshes independently
+    with single_flight(wait_seconds=0.1, name="gold") as should_fetch:
+        results.append(("gold", should_fetch))
+    release.set()
+    t.join(5)
+
+    assert results == [("leader", True), ("follower", False), ("gold", True)]
+
+
+def test_single_flight_rechecks_staleness_after_waiting(data_dir):
+    calls = []
+
+    def is_stale():
+        calls.append(1)
+        return False  # the previous holder already refreshed
+
+    with single_flight(is_stale=is_stale, name="fx") as should_fetch:
+        assert should_fetch is False
+    assert calls == [1]
+    assert locking.DATA_DIR.startswith(str(data_dir))
@@ -0,0 +1,80 @@
+import random
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates.percentiles import P2Histogram, PercentileStore
+from rates.storage import write_segment
+
+HOUR = 3600
+T0 = 1_750_000_000 // HOUR * HOUR
+
+
+def _event(field, new, ts, code="USD", segment="fx"):
+    iso = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+    return {"segment": segment, "currency": code, "field": field, "new": new, "version": str(ts), "ts": iso}
+
+
+@pytest.mark.parametrize("draw", [
+    lambda rng: rng.gauss(31.5, 0.4),
+    lambda rng: rng.expovariate(1.0),
+    lambda rng: rng.uniform(0.2, 0.25),
+])
+def test_p2_tracks_exact_quantiles(draw):
+    rng = random.Random(7)
+    samples = [draw(rng) for _ in range(20000)]
+    sketch = P2Histogram(cells=20)
+    for x in samples:
+        sketch.add(x)
+
+    spread = np.percentile(samples, 95) - np.percentile(samples, 5)
+    for p in (0.05, 0.25, 0.5, 0.75, 0.95):
+        assert abs(sketch.quantile(p) - np.percentile(samples, p * 100)) < 0.02 * spread
+        assert sketch.cdf(np.percentile(samples, p * 100)) == pytest.approx(p, abs=0.01)
+
+
+def test_p2_is_exact_until_markers_fill():
+    sketch = P2Histogram(cells=4)
+    for x in (3.0, 1.0, 2.0):
+        sketch.add(x)
+    assert sketch.heights == [1.0, 2.0, 3.0]
+    assert sketch.cdf(2.0) == pytest.approx(2 / 3)
+
+
+def test_samples_are_weighted_by_time_not_by_event(tmp_path):
+    store = PercentileStore(str(tmp_path / "p.json"))
+    store._apply([_event("buy", 30.0, T0), _event("sell", 30.2, T0)])
+    # 30.1 stands for ten hours, then a burst of short-lived quotes inside one hour
+    events = [_event("buy", 40.0, T0 + 10 * HOUR)]
+    events += [_event("sell", 40.0 + i / 100, T0 + 10 * HOUR + i * 60) for i in range(1, 30)]
+    store._apply(events)
+    store._sample_until(T0 + 11 * HOUR)
+
+    assert store.count("USD") == 11  # one sample per hour, however many events
+    # the burst is one sample out of eleven, the long-standing rate the other ten
+    assert store.percentile("USD", 30.1, min_samples=1) == pytest.approx(100 * 10 / 11, abs=1)
+
+
+def test_quiet_rate_keeps_building_history_and_rereads_add_nothing(data_dir):
+    store = PercentileStore(str(data_dir / "p.json"))
+    store._apply([_event("buy", 30.0, T0), _event("sell", 30.2, T0)])
+    store._sample_until(T0 + 48 * HOUR)  # no events for two days
+    assert store.count("USD") == 48
+
+    # replaying old events (e.g. after the event log was replaced) changes no weights
+    store._apply([_event("buy", 35.0, T0 + HOUR), _event("buy", 30.0, T0 + 2 * HOUR)])
+    assert store.count("USD") == 48
+
+
+def test_catch_up_persists_and_resumes(data_dir):
+    path = str(data_dir / "p.json")
+    write_segment("fx", [{"code": "USD", "buy": 31.3, "sell": 31.45}])
+    store = PercentileStore(path)
+    store.catch_up()
+    assert store.sampled_at is not None and store.last["fx"]["USD"] == {"buy": 31.3, "sell": 31.45}
+
+    again = PercentileStore(path)
+    assert (again.offset, again.sampled_at) == (store.offset, store.sampled_at)
+    assert again.catch_up() == 0
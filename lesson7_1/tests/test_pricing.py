@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates.pricing import GOLD_CODE, CrossRates
+
+ROWS = [
+    {"code": "USD", "currency": "美金", "buy": 32.0, "sell": 32.5},
+    {"code": "JPY", "currency": "日圓", "buy": 0.20, "sell": 0.25},
+    {"code": "KRW", "currency": "韓元", "buy": None, "sell": 0.026},
+]
+
+
+@pytest.fixture
+def cross():
+    return CrossRates(ROWS, gold_price={"buy": 3000.0, "sell": 3100.0}, version="v1")
+
+
+def test_bid_and_ask_through_twd(cross):
+    usd, jpy = cross.position("USD"), cross.position("日圓 (JPY)")
+    # sell USD to the bank for TWD, buy JPY with it
+    assert cross.bid[usd, jpy] == pytest.approx(32.0 / 0.25)
+    assert cross.ask[usd, jpy] == pytest.approx(32.5 / 0.20)
+    assert cross.rate("美金 (USD)", "JPY") == pytest.approx(128.0)
+    # the spread always costs: a round trip loses money
+    assert cross.bid[usd, jpy] * cross.bid[jpy, usd] < 1.0
+
+
+def test_twd_leg_and_diagonal(cross):
+    twd, usd = cross.position("新台幣"), cross.position("USD")
+    assert cross.bid[usd, twd] == 32.0
+    assert cross.bid[twd, usd] == pytest.approx(1 / 32.5)
+    assert all(cross.bid[i, i] == 1.0 and cross.ask[i, i] == 1.0 for i in range(len(cross.codes)))
+
+
+def test_missing_leg_is_nan_and_gold_is_included(cross):
+    krw = cross.position("KRW")
+    assert math.isnan(cross.bid[krw, cross.position("USD")])
+    assert cross.rate("KRW", "USD") is None
+    assert cross.rate("XYZ", "USD") is None
+    assert cross.rate(GOLD_CODE, "新台幣") == 3000.0
+
+
+def test_matrices_are_read_only(cross):
+    with pytest.raises(ValueError):
+        cross.bid[0, 1] = 2.0
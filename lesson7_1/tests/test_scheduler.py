@@ -0,0 +1,145 @@
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates.scheduler import COALESCE, FIXED_DELAY, QUEUE, SKIP, Scheduler
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class ManualExecutor:
+    """Collects submitted runs; the test decides when each one executes."""
+
+    def __init__(self):
+        self.queue = []
+
+    def submit(self, fn, *args):
+        self.queue.append((fn, args))
+
+    def run_next(self):
+        fn, args = self.queue.pop(0)
+        fn(*args)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(100.0)
+
+
+@pytest.fixture
+def executor():
+    return ManualExecutor()
+
+
+@pytest.fixture
+def sched(clock, executor):
+    sched = Scheduler(clock=clock, executor=executor)
+    yield sched
+    sched.stop()
+
+
+def step(sched, clock, now):
+    clock.now = now
+    sched.run_pending()
+
+
+def test_fixed_rate_deadlines_do_not_drift(sched, clock, executor):
+    sched.add_job("fx", lambda: None, 10, run_immediately=True)
+    # dispatched late every time; the next deadline still comes from the previous one
+    for now in (100.7, 110.3, 120.9):
+        step(sched, clock, now)
+        executor.run_next()
+    info = sched.inspect()["fx"]
+    assert info["next_run_in"] == pytest.approx(130.0 - 120.9)
+    assert info["runs"] == 3 and info["missed"] == 0
+
+
+def test_fixed_rate_skips_ticks_already_in_the_past(sched, clock, executor):
+    sched.add_job("fx", lambda: None, 10, run_immediately=True)
+    step(sched, clock, 135.0)  # 110, 120 and 130 were missed
+    executor.run_next()
+    info = sched.inspect()["fx"]
+    assert info["next_run_in"] == pytest.approx(5.0) and info["missed"] == 3
+    step(sched, clock, 150.0)  # landing exactly on a tick counts it as missed too
+    assert sched.inspect()["fx"]["next_run_in"] == pytest.approx(10.0)
+    assert sched.inspect()["fx"]["missed"] == 4
+
+
+@pytest.mark.parametrize("overlap, pending, skipped", [(SKIP, 0, 3), (QUEUE, 2, 1), (COALESCE, 1, 0)])
+def test_overlap_policies_while_a_run_is_in_flight(sched, clock, executor, overlap, pending, skipped):
+    sched.add_job("slow", lambda: None, 10, overlap=overlap, max_queued=2, run_immediately=True)
+    step(sched, clock, 100.0)
+    assert len(executor.queue) == 1 and sched.inspect()["slow"]["running"]
+    for now in (110.0, 120.0, 130.0):
+        step(sched, clock, now)
+    assert len(executor.queue) == 1
+    info = sched.inspect()["slow"]
+    assert info["pending"] == pending and info["skipped"] == skipped
+
+
+@pytest.mark.parametrize("overlap, catch_up", [(COALESCE, 1), (QUEUE, 2)])
+def test_missed_ticks_run_right_after_the_slow_run(sched, clock, executor, overlap, catch_up):
+    runs = []
+    sched.add_job("slow", lambda: runs.append(clock.now), 10, overlap=overlap, run_immediately=True)
+    step(sched, clock, 100.0)
+    step(sched, clock, 110.0)  # both ticks pass while the first run is still queued
+    step(sched, clock, 120.0)
+    clock.now = 125.0
+    while executor.queue:
+        executor.run_next()
+    # the catch-up runs start as soon as the slow run ends, not on the next tick
+    assert runs == [125.0] * (1 + catch_up)
+    step(sched, clock, 130.0)
+    executor.run_next()
+    assert runs[-1] == 130.0 and not executor.queue
+
+
+def test_fixed_delay_is_rearmed_only_when_the_run_finishes(sched, clock, executor):
+    sched.add_job("delay", lambda: None, 5, mode=FIXED_DELAY, run_immediately=True)
+    step(sched, clock, 100.0)
+    step(sched, clock, 150.0)  # still running: no second dispatch
+    assert len(executor.queue) == 1
+    executor.run_next()
+    assert sched.inspect()["delay"]["next_run_in"] == pytest.approx(5.0)
+    step(sched, clock, 155.0)
+    assert len(executor.queue) == 1
+
+
+def test_failures_are_recorded_and_the_job_keeps_its_schedule(sched, clock, executor):
+    def boom():
+        raise ValueError("boom")
+
+    sched.add_job("boom", boom, 10, mode=FIXED_DELAY, run_immediately=True)
+    step(sched, clock, 100.0)
+    executor.run_next()
+    info = sched.inspect()["boom"]
+    assert info["failures"] == 1 and info["last_error"] == "ValueError: boom"
+    assert info["next_run_in"] == pytest.approx(10.0)
+
+
+def test_base_exceptions_are_not_swallowed(sched, clock, executor):
+    class Fatal(BaseException):
+        pass
+
+    def fatal():
+        raise Fatal()
+
+    sched.add_job("fatal", fatal, 10, run_immediately=True)
+    step(sched, clock, 100.0)
+    with pytest.raises(Fatal):
+        executor.run_next()
+
+
+def test_stopped_scheduler_does_not_rearm_or_dispatch(sched, clock, executor):
+    sched.add_job("delay", lambda: None, 5, mode=FIXED_DELAY, run_immediately=True)
+    step(sched, clock, 100.0)
+    sched.stop()
+    executor.run_next()
+    step(sched, clock, 200.0)
+    assert not executor.queue
+    assert sched.inspect()["delay"]["next_run_in"] is None
@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates.schema import (
+    SCHEMA_VERSION,
+    decode_banks,
+    decode_rates,
+    decode_segment,
+    encode_banks,
+    encode_rates,
+    encode_segment,
+    make_rate,
+    split_label,
+    upgrade_payload,
+)
+
+CANONICAL = [make_rate("USD", 31.4, 31.6), make_rate("JPY", 0.19, 0.2), make_rate("XAU", None, 2500.0, "金條")]
+
+
+def test_rates_round_trip_through_the_columnar_payload():
+    payload = encode_rates(CANONICAL)
+    assert payload["schema"] == SCHEMA_VERSION
+    assert payload["currencies"] == ["USD", "JPY", "XAU"]
+    # only names missing from the code table are stored
+    assert payload["names"] == {"XAU": "金條"}
+    assert decode_rates(payload) == CANONICAL
+    assert decode_segment("fx", encode_segment("fx", CANONICAL)) == CANONICAL
+
+
+@pytest.mark.parametrize("legacy", [
+    # streamlit_app rows
+    [{"name": "美金 (USD)", "currency": "美金", "buy": 31.4, "sell": 31.6}],
+    # normalize_rates rows, full label in "currency"
+    [{"currency": "美金 (USD)", "buy": 31.4, "sell": 31.6, "raw": {"幣別": "美金 (USD)"}}],
+    # raw scraped rows with Chinese keys and string numbers
+    [{"幣別": "美金 (USD)", "本行即期買入": "31.4", "本行即期賣出": "31.6"}],
+])
+def test_legacy_rows_decode_to_canonical(legacy):
+    assert decode_rates(legacy) == [make_rate("USD", 31.4, 31.6)]
+    assert decode_rates(encode_rates(legacy)) == [make_rate("USD", 31.4, 31.6)]
+
+
+def test_missing_and_bad_numbers_become_none():
+    rows = decode_rates([{"幣別": "日圓 (JPY)", "本行即期買入": "-", "本行即期賣出": ""}])
+    assert rows == [make_rate("JPY", None, None)]
+
+
+def test_banks_round_trip():
+    banks = [{"bank": "臺灣銀行", "buy": 31.4, "sell": 31.6}, {"bank": "某銀行", "buy": None, "sell": 31.7}]
+    assert decode_banks(encode_banks(banks)) == banks
+    assert decode_banks([{"bank": "臺灣銀行", "buy": "31.4", "sell": "x"}]) == [
+        {"bank": "臺灣銀行", "buy": 31.4, "sell": None}
+    ]
+    assert decode_banks(None) == [] and decode_rates(None) == []
+
+
+def test_upgrade_payload_converts_every_legacy_field():
+    legacy = {
+        "rates": [{"name": "美金 (USD)", "buy": 31.4, "sell": 31.6}],
+        "all_banks_usd": [{"bank": "臺灣銀行", "buy": "31.4", "sell": "31.6"}],
+        "gold_price": {"buy": 3000, "sell": 3100},
+        "rates_update_time": "2025/01/02 10:00",
+    }
+    out = upgrade_payload(legacy)
+    assert out["rates"] == [make_rate("USD", 31.4, 31.6)]
+    assert out["all_banks_usd"] == [{"bank": "臺灣銀行", "buy": 31.4, "sell": 31.6}]
+    assert out["gold_price"] == legacy["gold_price"] and out["rates_update_time"] == "2025/01/02 10:00"
+    # already-canonical payloads pass through unchanged
+    assert upgrade_payload(out) == out
+    assert "all_banks_usd" not in upgrade_payload({"rates": []})
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("美金 (USD)", ("美金", "USD")),
+    ("美金(USD)", ("美金", "USD")),
+    ("(USD)", ("美金", "USD")),
+    ("美金", ("美金", "USD")),
+    ("USD", ("美金", "USD")),
+    ("不明", ("不明", "不明")),
+])
+def test_split_label(label, expected):
+    assert split_label(label) == expected
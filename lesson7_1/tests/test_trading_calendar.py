@@ -0,0 +1,71 @@
+import json
+from datetime import date, datetime, time
+
+import pytest
+
+from conftest import ROOT  # noqa: F401
+from rates.trading_calendar import TAIPEI_TZ, CalendarRule, TradingCalendar
+
+# Lunar New Year 2026: Monday 16 Feb to Friday 20 Feb
+NEW_YEAR = [date(2026, 2, d) for d in range(16, 21)]
+
+
+def at(y, m, d, hh=0, mm=0):
+    return datetime(y, m, d, hh, mm, tzinfo=TAIPEI_TZ)
+
+
+@pytest.fixture
+def calendar():
+    return TradingCalendar(holidays=NEW_YEAR)
+
+
+def test_weekends_and_holidays_are_closed(calendar):
+    assert date(2026, 2, 13).weekday() == 4 and date(2026, 2, 23).weekday() == 0
+    assert calendar.is_business_day(date(2026, 2, 13))
+    assert not calendar.is_business_day(date(2026, 2, 14))  # Saturday
+    assert all(not calendar.is_business_day(d) and calendar.sessions_on(d) == [] for d in NEW_YEAR)
+    assert not calendar.in_session(at(2026, 2, 17, 10))
+    assert calendar.in_session(at(2026, 2, 23, 10))
+    # the session end is exclusive, and times in other zones are converted first
+    assert not calendar.in_session(at(2026, 2, 23, 16))
+    assert calendar.in_session(datetime.fromisoformat("2026-02-23T02:00:00+00:00"))
+
+
+def test_rule_skips_the_whole_holiday_week(calendar):
+    rule = CalendarRule(calendar, session_interval=600)
+    # after Friday's close the next run is the following Monday's open, past the holidays and two weekends
+    assert rule.next_run(at(2026, 2, 13, 16, 1)) == at(2026, 2, 23, 9)
+    assert rule.next_run(at(2026, 2, 18, 12)) == at(2026, 2, 23, 9)
+
+
+def test_session_grid_is_anchored_at_the_open(calendar):
+    rule = CalendarRule(calendar, session_interval=600, at_close=True)
+    assert rule.next_run(at(2026, 2, 23, 9, 7)) == at(2026, 2, 23, 9, 10)
+    assert rule.next_run(at(2026, 2, 23, 9, 10)) == at(2026, 2, 23, 9, 20)
+    # the last grid point before the close is followed by the close itself
+    assert rule.next_run(at(2026, 2, 23, 15, 55)) == at(2026, 2, 23, 16)
+
+
+def test_off_session_runs_never_land_on_holidays(calendar):
+    rule = CalendarRule(calendar, at_close=False, off_session_interval=4 * 3600)
+    assert rule.next_run(at(2026, 2, 23, 1)) == at(2026, 2, 23, 4)
+    # 08:00 is before the open, the 12:00 grid point is inside the session: next is 16:00
+    assert rule.next_run(at(2026, 2, 23, 8)) == at(2026, 2, 23, 16)
+    assert rule.next_run(at(2026, 2, 13, 21)) == at(2026, 2, 23, 0)
+
+
+def test_load_reads_holidays_and_sessions(tmp_path):
+    path = tmp_path / "holidays.json"
+    path.write_text(json.dumps({"holidays": ["2026-02-17"], "sessions": [["09:30", "15:30"]]}), encoding="utf-8")
+    calendar = TradingCalendar.load(str(path))
+    assert calendar.holidays == {date(2026, 2, 17)}
+    assert calendar.sessions == [(time(9, 30), time(15, 30))]
+    assert TradingCalendar.load(str(tmp_path / "missing.json")).holidays == set()
+
+
+def test_rule_gives_up_without_business_days():
+    closed = TradingCalendar(weekend_days=range(7))
+    with pytest.raises(ValueError):
+        CalendarRule(closed).next_run(at(2026, 1, 1))
+    with pytest.raises(ValueError):
+        CalendarRule(closed, at_close=False)
@@ -0,0 +1,55 @@
+import json
+import threading
+
+import pytest
+
+import update_rates
+from rates import crawler
+from rates.locking import single_flight
+
+
+@pytest.fixture
+def service(data_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(update_rates, "SOURCES", {})
+    monkeypatch.setattr(update_rates, "write_segment", lambda name, data, source_time=None: 1)
+    return update_rates.UpdateService(log_path=tmp_path / "update.log", status_path=tmp_path / "status.json")
+
+
+def _status(service):
+    return json.loads(service.status_path.read_text(encoding="utf-8"))
+
+
+def test_network_failure_is_recorded_as_error(service, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise OSError("Name or service not known")
+
+    monkeypatch.setattr(crawler.pd, "read_html", unreachable)
+    update_rates.SOURCES["banks_usd"] = lambda: (crawler.fetch_usd_rates_all_banks(), None)
+
+    assert service.update_rates(["banks_usd"]) is False
+    assert _status(service)["banks_usd"]["status"] == "error"
+    assert _status(service)["banks_usd"]["last_success_at"] is None
+    assert service.failed_sources() == ["banks_usd"]
+
+
+def test_skipped_stage_keeps_previous_success_time(service):
+    update_rates.SOURCES["gold"] = lambda: ({"buy": 1.0, "sell": 2.0}, None)
+    assert service.run_stage("gold")["status"] == "ok"
+    first_success = _status(service)["gold"]["last_success_at"]
+
+    holding, release = threading.Event(), threading.Event()
+
+    def other_process():
+        with single_flight(name="refresh_gold"):
+            holding.set()
+            release.wait(5)
+
+    t = threading.Thread(target=other_process)
+    t.start()
+    holding.wait(5)
+    try:
+        assert service.run_stage("gold")["status"] == "skipped"
+    finally:
+        release.set()
+        t.join(5)
+    assert _status(service)["gold"]["last_success_at"] == first_success
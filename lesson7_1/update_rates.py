@@ -1,62 +1,369 @@
-"""Simplified standalone updater for exchange rates."""
+"""Simplified standalone updater for exchange rates.
 
+``python update_rates.py`` refreshes once and exits (cron style).
+``python update_rates.py --daemon`` keeps running: it schedules per-source
+refreshes on the business calendar, and when several instances run only
+the elected leader fetches while the others watch the cache.
+``python update_rates.py --check`` prints readiness and exits 0/1.
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
 import sys
-import traceback
-from datetime import datetime, timezone
+import threading
+import time as time_module
+from datetime import datetime, time, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import (
+    ALERT_LOG_FILE,
+    ALERT_STATE_FILE,
+    ALERT_WEBHOOK_URL,
+    ALERTS_FILE,
+    DAEMON_LOG_FILE,
+    DATA_DIR,
+    HOLIDAYS_FILE,
+    LOG_FILE,
+    SCHEDULE_CONFIG,
+)
+from rates.alerts import AlertEngine, FileNotifier, WebhookNotifier
+from rates.async_scheduler import AsyncScheduler
+from rates.cache import HARD_TTL_FACTOR
+from rates.jsonlog import setup_json_logging
+from rates.leader import make_lease
+from rates.locking import single_flight
+from rates.metrics import write_metrics
+from rates.scheduler import FIXED_DELAY
+from rates.sources import SOURCES
+from rates.storage import CORE_SEGMENTS, SEGMENT_TTLS, segment_age, snapshot_version, write_segment
+from rates.trading_calendar import CalendarRule, TradingCalendar
+
+HEALTH_FILE = DATA_DIR / "updater_health.json"
+STATUS_FILE = DATA_DIR / "update_status.json"
+LEASE_TTL_SECONDS = 60
+HEALTH_INTERVAL_SECONDS = 15
+ALERT_CHECK_SECONDS = 30
+# a fetch that hangs longer than this is reported as a timeout; the next tick retries it
+REFRESH_TIMEOUT_SECONDS = 120
+SHUTDOWN_GRACE_SECONDS = 10
+
+
+def _row_count(data: Any) -> int:
+    if isinstance(data, (list, tuple)):
+        return len(data)
+    return 1 if data else 0
+
 
-from rates.crawler import fetch_rates, fetch_usd_rates_all_banks
-from rates.normalize import normalize_rates
-from rates.storage import write_cache
+def load_calendar() -> TradingCalendar:
+    """Business calendar from SCHEDULE_CONFIG and the holiday file."""
+    start, end = (time.fromisoformat(t) for t in SCHEDULE_CONFIG["session"])
+    return TradingCalendar.load(str(HOLIDAYS_FILE), sessions=[(start, end)])
+
+
+def readiness(calendar: Optional[TradingCalendar] = None) -> Dict[str, Any]:
+    """Is the cache usable? Every core segment must exist; during the session
+    it must also be younger than its hard TTL (outside the session nothing
+    refreshes, so age alone does not make it unready)."""
+    calendar = calendar or load_calendar()
+    in_session = calendar.in_session()
+    segments = {}
+    ready = True
+    for name in SEGMENT_TTLS:
+        age = segment_age(name)
+        fresh = age is not None and age <= SEGMENT_TTLS[name] * HARD_TTL_FACTOR
+        segments[name] = {"age_seconds": None if age is None else round(age, 1), "fresh": fresh}
+        if name in CORE_SEGMENTS and (age is None or (in_session and not fresh)):
+            ready = False
+    return {"ready": ready, "in_session": in_session, "segments": segments}
 
 
 class UpdateService:
     """Handles rate update operations with logging."""
     
-    def __init__(self, log_path: Optional[Path] = None):
-        self.log_path = log_path or Path(__file__).parent / "rates" / "data" / "update.log"
-        self._ensure_log_dir()
-    
-    def _ensure_log_dir(self):
-        """Ensure log directory exists."""
-        self.log_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    def log(self, message: str):
-        """Write timestamped log entry."""
-        timestamp = datetime.now(timezone.utc).isoformat()
-        with open(self.log_path, "a", encoding="utf-8") as f:
-            f.write(f"[{timestamp}] {message}\n")
+    def __init__(self, log_path: Optional[Path] = None, status_path: Optional[Path] = None):
+        self.log_path = log_path or LOG_FILE
+        self.status_path = status_path or STATUS_FILE
+        self.last_results: Dict[str, Dict[str, Any]] = {}
+        self._status_lock = threading.Lock()
+        # JSON lines through a queue-backed, rotating handler (see rates.jsonlog);
+        # scheduler errors under the "rates" logger land in the same file
+        setup_json_logging(self.log_path)
+        self.logger = logging.getLogger("rates.update")
+        self.alerts = self._setup_alerts()
+
+    def _setup_alerts(self) -> Optional[AlertEngine]:
+        """Alert rules evaluated against the change-event log (if any rules exist).
+
+        The log covers every writer, including Streamlit's background refresher.
+        """
+        notifiers = [FileNotifier(str(ALERT_LOG_FILE))]
+        if ALERT_WEBHOOK_URL:
+            notifiers.append(WebhookNotifier(ALERT_WEBHOOK_URL))
+        try:
+            engine = AlertEngine.load(str(ALERTS_FILE), notifiers=notifiers, state_path=str(ALERT_STATE_FILE))
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"警示規則載入失敗: {e}", extra={"stage": "alerts"})
+            return None
+        if not engine.rules():
+            return None
+        self.log(f"已載入 {len(engine.rules())} 條警示規則", stage="alerts")
+        return engine
+
+    def check_alerts(self):
+        """Evaluate the commits logged since the last check (by any process)."""
+        if self.alerts is None:
+            return
+        try:
+            fired = self.alerts.catch_up()
+        except Exception as e:
+            self.logger.error(f"警示檢查失敗: {e}", exc_info=True, extra={"stage": "alerts"})
+            return
+        if fired:
+            self.log(f"觸發 {len(fired)} 則警示", stage="alerts", fired=[a["rule_id"] for a in fired])
+
+    def log(self, message: str, **fields: Any):
+        """Log one entry; keyword arguments become JSON fields."""
+        self.logger.info(message, extra=fields)
     
-    def update_rates(self) -> bool:
-        """Update rates and return success status."""
+    def run_stage(self, name: str) -> Dict[str, Any]:
+        """Fetch one source and commit its segment on success.
+
+        Returns the stage result: status (ok / empty / skipped / error),
+        latency in seconds, row count and the error message if any.
+        """
+        result: Dict[str, Any] = {"status": "error", "rows": 0, "latency": 0.0, "error": None}
+        start = time_module.perf_counter()
+        try:
+            # same lock name as TieredCache and the daemon: one fetcher per source at a time
+            with single_flight(wait_seconds=0, name=f"refresh_{name}") as should_fetch:
+                if not should_fetch:
+                    result["status"] = "skipped"
+                else:
+                    data, source_time = SOURCES[name]()
+                    result["rows"] = _row_count(data)
+                    if data:
+                        write_segment(name, data, source_time)
+                        result["status"] = "ok"
+                    else:
+                        # keep the previous segment rather than overwrite it with nothing
+                        result["status"] = "empty"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            self.logger.error(f"{name}: 更新失敗: {e}", exc_info=True, extra={"stage": name})
+        result["latency"] = round(time_module.perf_counter() - start, 3)
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.logger.log(
+            logging.ERROR if result["status"] == "error" else logging.INFO,
+            f"{name}: {result['status']} ({result['rows']} 筆, {result['latency']}s)",
+            extra={
+                "stage": name,
+                "status": result["status"],
+                "rows": result["rows"],
+                "duration_ms": round(result["latency"] * 1000, 1),
+                "error": result["error"],
+            },
+        )
+        self._record_status(name, result)
+        return result
+
+    def _record_status(self, name: str, result: Dict[str, Any]):
+        with self._status_lock:
+            try:
+                with open(self.status_path, "r", encoding="utf-8") as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                status = {}
+            # "skipped" means another process held the fetch lock: its outcome is not ours to record
+            if result["status"] in ("ok", "empty"):
+                result["last_success_at"] = result["finished_at"]
+            else:
+                result["last_success_at"] = status.get(name, {}).get("last_success_at")
+            status[name] = result
+            write_metrics(str(self.status_path), status)
+
+    def failed_sources(self) -> List[str]:
+        """Sources whose last recorded stage failed (see update_status.json)."""
         try:
-            self.log("開始更新匯率")
-            
-            # Fetch and process data
-            raw_data = fetch_rates()
-            all_banks_usd = fetch_usd_rates_all_banks()
-            self.log(f"成功抓取 {len(raw_data or [])} 筆資料")
-            
-            normalized_data = normalize_rates(raw_data)
-            write_cache(normalized_data, all_banks_usd)
-            
-            self.log("更新完成")
+            with open(self.status_path, "r", encoding="utf-8") as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [name for name, result in status.items() if name in SOURCES and result.get("status") == "error"]
+
+    def update_rates(self, sources: Optional[Iterable[str]] = None) -> bool:
+        """Run each source stage independently; True if none of them failed.
+
+        A failing source no longer discards the others: the stages run
+        concurrently on an ``AsyncScheduler`` thread pool and each one
+        commits its own segment as soon as its fetch returns.
+        """
+        names = list(sources) if sources is not None else list(SOURCES)
+        self.log(f"開始更新匯率: {', '.join(names)}", sources=names)
+        start = time_module.perf_counter()
+        self.last_results = self._run_stages(names)
+        self.check_alerts()
+        failed = [name for name, result in self.last_results.items() if result["status"] == "error"]
+        timing = {"stage": "update", "duration_ms": round((time_module.perf_counter() - start) * 1000, 1), "failed": failed}
+
+        if not failed:
+            self.log("更新完成", status="ok", **timing)
             print("更新完成")
             return True
-            
-        except Exception as e:
-            error_msg = f"更新失敗: {str(e)}"
-            self.log(error_msg)
-            self.log(traceback.format_exc())
+        if len(failed) < len(names):
+            self.log(f"部分更新完成，失敗來源: {', '.join(failed)}", status="partial", **timing)
+            print(f"部分更新完成，失敗來源: {', '.join(failed)}；可用 --retry-failed 重試")
+        else:
+            self.logger.error("更新失敗", extra=dict(timing, status="error"))
             print(f"更新失敗，詳見日誌: {self.log_path}")
-            return False
+        return False
+
+    def _run_stages(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        scheduler = AsyncScheduler(max_workers=max(len(names), 1))
+        scheduler.start()
+        try:
+            futures = {name: scheduler.submit(scheduler.run_blocking(self.run_stage, name)) for name in names}
+            # run_stage records its own errors, so result() only re-raises scheduler failures
+            return {name: future.result() for name, future in futures.items()}
+        finally:
+            scheduler.stop()
+
+    # -- daemon mode -------------------------------------------------------
+
+    def run_daemon(
+        self,
+        lease_kind: str = "sqlite",
+        lease_ttl: float = LEASE_TTL_SECONDS,
+        health_path: Path = HEALTH_FILE,
+    ) -> int:
+        """Run until SIGTERM/SIGINT. Returns the process exit code."""
+        self.lease = make_lease(lease_kind, ttl_seconds=lease_ttl)
+        self.is_leader = False
+        self.health_path = health_path
+        self.calendar = load_calendar()
+        self.seen_version = None
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        jobs = SCHEDULE_CONFIG["jobs"]
+        # one worker per fetcher plus the lease, health and alert jobs, so a slow
+        # fetch can never hold up a lease renewal
+        self.scheduler = AsyncScheduler(max_workers=len(jobs) + 3)
+        stop = threading.Event()
+
+        for name, opts in jobs.items():
+            rule = CalendarRule(self.calendar, **opts)
+            self.scheduler.add_blocking_job(name, lambda n=name: self._refresh_job(n),
+                                            opts.get("session_interval") or 86400, mode=FIXED_DELAY, rule=rule,
+                                            timeout=REFRESH_TIMEOUT_SECONDS)
+        # renew well before expiry so a slow tick does not hand leadership away
+        self.scheduler.add_blocking_job("_lease", self._lease_job, lease_ttl / 3, run_immediately=True)
+        self.scheduler.add_blocking_job("_health", self._health_job, HEALTH_INTERVAL_SECONDS, mode=FIXED_DELAY,
+                                        run_immediately=True)
+        if self.alerts is not None:
+            # every instance polls; the alert state lock makes each commit evaluate once
+            self.scheduler.add_blocking_job("_alerts", self.check_alerts, ALERT_CHECK_SECONDS, mode=FIXED_DELAY,
+                                            run_immediately=True)
+
+        def handle_signal(signum, frame):
+            self.log(f"收到訊號 {signum}，準備停止")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+
+        self.log(f"常駐模式啟動 ({self.lease.identity}, lease={lease_kind})")
+        self.scheduler.start()
+        try:
+            stop.wait()
+        finally:
+            self.scheduler.stop(grace_seconds=SHUTDOWN_GRACE_SECONDS)
+            if self.is_leader:
+                self.lease.release()
+                self.is_leader = False
+            self._write_health(status="stopped")
+            self.log("常駐模式已停止")
+        return 0
+
+    def _lease_job(self):
+        was_leader = self.is_leader
+        self.is_leader = self.lease.acquire()
+        if self.is_leader and not was_leader:
+            self.log("取得領導權，開始負責更新")
+            # the previous leader may have died mid-cycle; catch up on another pool
+            # thread so a slow fetch cannot delay the next lease renewal
+            self.scheduler.submit(self.scheduler.run_blocking(self._catch_up))
+        elif was_leader and not self.is_leader:
+            self.log(f"失去領導權，目前由 {self.lease.holder()} 負責更新")
+
+    def _catch_up(self):
+        for name in SCHEDULE_CONFIG["jobs"]:
+            age = segment_age(name)
+            if age is None or age > SEGMENT_TTLS[name]:
+                self._refresh_job(name)
+
+    def _refresh_job(self, name: str):
+        if not self.is_leader:
+            return
+        self.run_stage(name)
+
+    def _health_job(self):
+        version = snapshot_version()
+        if version != self.seen_version:
+            if self.seen_version is not None and not self.is_leader:
+                self.log(f"快取已由領導者更新: {version}")
+            self.seen_version = version
+        self._write_health()
+
+    def _write_health(self, status: str = "running"):
+        payload = {
+            "status": status,
+            "pid": os.getpid(),
+            "identity": self.lease.identity,
+            "role": "leader" if self.is_leader else "follower",
+            "leader": self.lease.holder(),
+            "started_at": self.started_at,
+            "heartbeat_at": datetime.now(timezone.utc).isoformat(),
+            "cache_version": self.seen_version,
+            "jobs": {
+                name: {k: info[k] for k in (
+                    "runs", "failures", "consecutive_failures", "timeouts", "last_success_at", "last_error"
+                )}
+                for name, info in self.scheduler.inspect().items()
+            },
+        }
+        payload.update(readiness(self.calendar))
+        write_metrics(str(self.health_path), payload)
 
 
 def main():
     """Main entry point."""
-    service = UpdateService()
-    success = service.update_rates()
+    parser = argparse.ArgumentParser(description="更新匯率快取")
+    parser.add_argument("--daemon", action="store_true", help="常駐執行，依營業日排程更新")
+    parser.add_argument("--lease", choices=("sqlite", "lock"), default="sqlite", help="多個常駐行程的領導者選舉方式")
+    parser.add_argument("--lease-ttl", type=float, default=LEASE_TTL_SECONDS, help="領導權租約秒數 (sqlite)")
+    parser.add_argument("--health-file", type=Path, default=HEALTH_FILE, help="健康狀態 JSON 輸出路徑")
+    parser.add_argument("--check", action="store_true", help="輸出快取就緒狀態；就緒時結束碼為 0")
+    parser.add_argument("--source", action="append", choices=sorted(SOURCES), help="只更新指定來源 (可重複)")
+    parser.add_argument("--retry-failed", action="store_true", help="只重試上次失敗的來源")
+    args = parser.parse_args()
+
+    if args.check:
+        status = readiness()
+        print(json.dumps(status, ensure_ascii=False, indent=2))
+        sys.exit(0 if status["ready"] else 1)
+
+    service = UpdateService(DAEMON_LOG_FILE if args.daemon else None)
+    if args.daemon:
+        sys.exit(service.run_daemon(args.lease, args.lease_ttl, args.health_file))
+    sources = args.source
+    if args.retry_failed:
+        sources = service.failed_sources()
+        if not sources:
+            print("沒有失敗的來源需要重試")
+            sys.exit(0)
+    success = service.update_rates(sources)
     sys.exit(0 if success else 1)
 
 
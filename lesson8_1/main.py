@@ -13,12 +13,18 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 from typing import Dict, List, Optional, Set
 from datetime import datetime
+import os
+import sys
 import threading
 import queue
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig, CacheMode
 from crawl4ai.extraction_strategy import JsonCssExtractionStrategy
 import twstock
 
+# 與 lesson7_1 的匯率更新共用同一套 asyncio 排程器
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lesson7_1"))
+from rates.async_scheduler import AsyncScheduler  # noqa: E402
+
 
 # ==================== 爬蟲模組 ====================
 
@@ -192,25 +198,72 @@ async def fetch_multiple_stocks(stock_codes: List[str]) -> List[Dict]:
         return successful_results
 
 
-def run_crawler_in_thread(stock_codes: List[str], result_queue: queue.Queue):
+# 單次批次爬取的逾時秒數
+CRAWL_TIMEOUT_SECONDS = 120
+
+# 自動更新在排程器上的工作名稱
+AUTO_UPDATE_JOB = "auto_update"
+
+_crawler_scheduler: Optional[AsyncScheduler] = None
+_crawler_scheduler_lock = threading.Lock()
+
+
+def get_crawler_scheduler() -> AsyncScheduler:
+    """
+    取得共用的 AsyncScheduler（第一次呼叫時在背景執行緒啟動其事件迴圈）
+    
+    Returns:
+        已啟動的排程器，手動更新與自動更新都在它的單一事件迴圈上執行
+    """
+    global _crawler_scheduler
+    with _crawler_scheduler_lock:
+        if _crawler_scheduler is None:
+            _crawler_scheduler = AsyncScheduler()
+            _crawler_scheduler.start()
+        return _crawler_scheduler
+
+
+def submit_crawler_job(stock_codes: List[str], result_queue: queue.Queue):
     """
-    在背景執行緒中執行爬蟲任務
+    將爬蟲任務送到共用排程器的事件迴圈執行，完成後把結果放進佇列
     
     Args:
         stock_codes: 要爬取的股票代碼列表
         result_queue: 用於傳遞結果的佇列
+    
+    Returns:
+        concurrent.futures.Future，可用於取消任務
     """
-    try:
-        # 在執行緒中建立新的事件迴圈
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        results = loop.run_until_complete(fetch_multiple_stocks(stock_codes))
-        result_queue.put(('success', results))
-        
-        loop.close()
-    except Exception as e:
-        result_queue.put(('error', str(e)))
+    coro = asyncio.wait_for(fetch_multiple_stocks(stock_codes), CRAWL_TIMEOUT_SECONDS)
+    future = get_crawler_scheduler().submit(coro)
+
+    def on_done(f):
+        if f.cancelled():
+            result_queue.put(('error', '更新已取消'))
+            return
+        try:
+            result_queue.put(('success', f.result()))
+        except asyncio.TimeoutError:
+            result_queue.put(('error', f'更新逾時 ({CRAWL_TIMEOUT_SECONDS} 秒)'))
+        except Exception as e:
+            result_queue.put(('error', str(e)))
+
+    future.add_done_callback(on_done)
+    return future
+
+
+def shutdown_crawler_scheduler(timeout: float = 5.0):
+    """
+    停止共用排程器：執行中的爬蟲有 timeout 秒可以完成，之後取消
+    
+    Args:
+        timeout: 等待執行中任務結束的秒數
+    """
+    global _crawler_scheduler
+    with _crawler_scheduler_lock:
+        scheduler, _crawler_scheduler = _crawler_scheduler, None
+    if scheduler is not None:
+        scheduler.stop(grace_seconds=timeout)
 
 
 # ==================== GUI 主程式 ====================
@@ -237,11 +290,11 @@ class StockMonitorApp:
         
         # 自動更新相關
         self.auto_update_enabled = False
-        self.update_timer_id = None
         self.is_updating = False
         
         # 爬蟲結果佇列
         self.result_queue = queue.Queue()
+        self.crawl_future = None
         
         # 建立 UI
         self.setup_ui()
@@ -325,8 +378,6 @@ class StockMonitorApp:
     def on_interval_change(self, event=None):
         # 立即套用新的自動更新間隔
         if self.auto_update_enabled:
-            if self.update_timer_id:
-                self.root.after_cancel(self.update_timer_id)
             self.schedule_auto_update()
     
     def setup_left_panel(self, parent):
@@ -566,18 +617,17 @@ class StockMonitorApp:
     
     def start_update(self):
         """開始更新股票資料"""
+        self.on_update_start()
+        
+        # 送到共用排程器的事件迴圈執行爬蟲
+        stock_codes = list(self.watchlist)
+        self.crawl_future = submit_crawler_job(stock_codes, self.result_queue)
+    
+    def on_update_start(self):
+        """更新開始時鎖定按鈕並顯示進度"""
         self.is_updating = True
         self.update_btn.config(state=tk.DISABLED)
         self.status_label.config(text=f"🔄 更新中... (0/{len(self.watchlist)})")
-        
-        # 在背景執行緒中執行爬蟲
-        stock_codes = list(self.watchlist)
-        thread = threading.Thread(
-            target=run_crawler_in_thread,
-            args=(stock_codes, self.result_queue),
-            daemon=True
-        )
-        thread.start()
     
     def check_queue(self):
         """檢查爬蟲結果佇列"""
@@ -585,7 +635,9 @@ class StockMonitorApp:
             while True:
                 msg_type, data = self.result_queue.get_nowait()
                 
-                if msg_type == 'success':
+                if msg_type == 'start':
+                    self.on_update_start()
+                elif msg_type == 'success':
                     self.on_update_complete(data)
                 elif msg_type == 'error':
                     self.on_update_error(data)
@@ -629,30 +681,46 @@ class StockMonitorApp:
         self.auto_update_enabled = self.auto_update_var.get()
         
         if self.auto_update_enabled:
-            print("✓ 啟用自動更新（每 60 秒）")
+            print(f"✓ 啟用自動更新（每 {self.interval_var.get()} 秒）")
             self.schedule_auto_update()
         else:
             print("✗ 停用自動更新")
-            if self.update_timer_id:
-                self.root.after_cancel(self.update_timer_id)
-                self.update_timer_id = None
+            get_crawler_scheduler().remove_job(AUTO_UPDATE_JOB)
     
     def schedule_auto_update(self):
-        """排程自動更新"""
-        # 依選單設定間隔
-        interval = self.interval_var.get()
-        if self.auto_update_enabled and self.watchlist and not self.is_updating:
-            self.start_update()
+        """在共用排程器上註冊自動更新工作（同名工作會被取代，用於套用新間隔）"""
+        get_crawler_scheduler().add_job(
+            AUTO_UPDATE_JOB,
+            self.auto_update_job,
+            self.interval_var.get(),
+            timeout=CRAWL_TIMEOUT_SECONDS,
+            run_immediately=True,
+        )
+    
+    async def auto_update_job(self):
+        """
+        由排程器定期執行的自動更新
         
-        # 每 60 秒執行一次
-        if self.auto_update_enabled:
-            self.update_timer_id = self.root.after(interval * 1000, self.schedule_auto_update)
+        逾時由排程器的 timeout 取消並計入工作的 timeouts；
+        結果與錯誤都經由佇列交回 Tk 主執行緒處理
+        """
+        if self.is_updating or not self.watchlist:
+            return
+        stock_codes = list(self.watchlist)
+        self.result_queue.put(('start', None))
+        try:
+            results = await fetch_multiple_stocks(stock_codes)
+        except asyncio.CancelledError:
+            self.result_queue.put(('error', f'自動更新逾時或已取消 ({CRAWL_TIMEOUT_SECONDS} 秒)'))
+            raise
+        except Exception as e:
+            self.result_queue.put(('error', str(e)))
+            raise
+        self.result_queue.put(('success', results))
     
     def on_closing(self):
         """視窗關閉事件處理"""
-        if self.update_timer_id:
-            self.root.after_cancel(self.update_timer_id)
-        
+        shutdown_crawler_scheduler()
         self.root.destroy()
 
 